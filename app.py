@@ -1,3 +1,4 @@
+import os
 from flask import Flask
 from flask_cors import CORS
 from routes.chat_routes import chat_bp
@@ -5,8 +6,11 @@ from routes.conversation_routes import conversation_bp
 from routes.user_routes import user_bp 
 from routes.voice_routes import voice_bp
 from routes.resume_routes import resume_bp
+from routes.metrics_routes import metrics_bp
+from utils import metrics, admission, json_provider, compression
 
 app = Flask(__name__)
+json_provider.init_app(app)
 CORS(app, 
      origins=["http://localhost:5173", "https://chat-bot-frontend-topaz.vercel.app"],
      methods=["GET", "POST", "PUT", "DELETE"],
@@ -26,8 +30,30 @@ def register_routes(app):
     app.register_blueprint(user_bp, url_prefix="/user") 
     app.register_blueprint(voice_bp, url_prefix='/voice')
     app.register_blueprint(resume_bp, url_prefix="/resume")
+    app.register_blueprint(metrics_bp)
 
 register_routes(app)
+metrics.init_app(app)
+admission.init_app(app)
+compression.init_app(app)
+
+# "eager" builds the RAG chains and indexes while the app is imported (pair with
+# gunicorn --preload); "lazy" defers every heavy import and build to first use.
+STARTUP_MODE = os.getenv("STARTUP_MODE", "eager")
+
+def warm_up():
+    from service.rag_service import get_rag_chain
+    from service.structured_index import get_index
+    from service.job_matcher import get_skill_index
+    from service.empowerment_pool import empowerment_pool
+    get_rag_chain("chat")
+    get_rag_chain("voice")
+    get_index()
+    get_skill_index()
+    empowerment_pool.warm()
+
+if STARTUP_MODE == "eager":
+    warm_up()
 
 if __name__ == "__main__":
     print("🚀 Starting Flask server...")
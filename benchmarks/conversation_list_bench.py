@@ -0,0 +1,128 @@
+"""
+Conversation listing benchmark.
+
+Grows a scratch conversations collection through the given sizes and, at each size,
+times per-user listings (first page and a few keyset pages deep) served by the
+(user_id, updated_at, _id) index, next to the same query forced onto the
+(updated_at, _id) index the way it ran before conversations had owners. Keys and
+documents examined come from explain(); with the compound index they stay at one
+page no matter how large the collection gets.
+
+Needs a real MongoDB (the sqlite stand-in scans everything). The scratch database is
+dropped at the end.
+
+    python benchmarks/conversation_list_bench.py --mongo-uri mongodb://localhost:27017 --sizes 10000,100000,1000000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import MongoClient
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from service import conversation_store  # noqa: E402
+
+INSERT_BATCH = 5000
+
+
+def fake_conversations(count, users, rng, start):
+    for _ in range(count):
+        updated = start + timedelta(seconds=rng.randrange(365 * 24 * 3600))
+        yield {
+            "user_id": rng.choice(users) if rng.random() < 0.8 else None,
+            "messages": [{"type": "human", "content": "Any python jobs in Bengaluru?"},
+                         {"type": "ai", "content": "x" * rng.randrange(200, 1200)}],
+            "created_at": updated.isoformat(),
+            "updated_at": updated.isoformat(),
+        }
+
+
+def grow(collection, target, users, rng, start):
+    missing = target - collection.estimated_document_count()
+    batch = []
+    for doc in fake_conversations(max(missing, 0), users, rng, start):
+        batch.append(doc)
+        if len(batch) >= INSERT_BATCH:
+            collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        collection.insert_many(batch, ordered=False)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] * 1000
+
+
+def time_listing(users, rng, samples, depth):
+    first, deep = [], []
+    for _ in range(samples):
+        user_id = rng.choice(users)
+        started = time.perf_counter()
+        _, cursor = conversation_store.list_conversations(user_id)
+        first.append(time.perf_counter() - started)
+        for _ in range(depth - 1):
+            if not cursor:
+                break
+            started = time.perf_counter()
+            _, cursor = conversation_store.list_conversations(user_id, cursor)
+        deep.append(time.perf_counter() - started)
+    return first, deep
+
+
+def examined(collection, user_id, hint=None):
+    cursor = collection.find({"user_id": user_id}, {"messages": 0}).sort(
+        [("updated_at", -1), ("_id", -1)]).limit(conversation_store.LIST_PAGE_SIZE)
+    if hint:
+        cursor = cursor.hint(hint)
+    stats = cursor.explain()["executionStats"]
+    return stats["totalKeysExamined"], stats["totalDocsExamined"], stats["executionTimeMillis"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-uri", default=os.getenv("BENCH_MONGO_URI", "mongodb://localhost:27017"))
+    parser.add_argument("--database", default="asha_list_bench")
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--depth", type=int, default=5, help="keyset pages to follow for the deep timing")
+    parser.add_argument("--keep", action="store_true", help="don't drop the scratch database")
+    args = parser.parse_args()
+
+    client = MongoClient(args.mongo_uri)
+    collection = client[args.database]["conversations"]
+    collection.drop()
+    # list_conversations reads the module's collection; point it at the scratch one
+    conversation_store.conversations_collection = collection
+    conversation_store._indexes_ready = False
+    conversation_store.ensure_indexes()
+
+    rng = random.Random(42)
+    users = [ObjectId() for _ in range(args.users)]
+    start = datetime(2025, 1, 1)
+    print(f"{'docs':>9s} {'p50 ms':>7s} {'p99 ms':>7s} {'deep p50':>8s} {'deep p99':>8s} "
+          f"{'keys':>6s} {'docs':>6s} | {'no compound index: keys':>24s} {'docs':>8s} {'ms':>6s}")
+    try:
+        for size in (int(s) for s in args.sizes.split(",")):
+            grow(collection, size, users, rng, start)
+            first, deep = time_listing(users, rng, args.samples, args.depth)
+            probe = rng.choice(users)
+            keys, docs, _ = examined(collection, probe)
+            old_keys, old_docs, old_ms = examined(collection, probe, hint=[("updated_at", 1), ("_id", 1)])
+            print(f"{size:9d} {percentile(first, 0.5):7.2f} {percentile(first, 0.99):7.2f} "
+                  f"{percentile(deep, 0.5):8.2f} {percentile(deep, 0.99):8.2f} {keys:6d} {docs:6d} | "
+                  f"{old_keys:24d} {old_docs:8d} {old_ms:6d}")
+    finally:
+        if not args.keep:
+            client.drop_database(args.database)
+
+
+if __name__ == "__main__":
+    main()
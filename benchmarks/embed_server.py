@@ -0,0 +1,216 @@
+"""
+Local stand-in embedding server and index-build embedding benchmark.
+
+The server answers POST /embed {"texts": [...]} with deterministic vectors after a
+configurable latency, and behaves like a rate-limited provider: beyond --max-concurrent
+requests or --rpm it answers 429 with Retry-After, and --error-rate of requests fail
+with 503. HttpEmbeddings is a client with the LangChain embed_documents() interface,
+so service.embedding_builder runs against it exactly as it does against Gemini.
+
+    python benchmarks/embed_server.py serve --port 8765
+    python benchmarks/embed_server.py bench --chunks 2000 --concurrency 1,2,4,8
+    python benchmarks/embed_server.py resume --chunks 2000   # interrupted build, then resumed
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import hashlib
+import argparse
+import tempfile
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from service import embedding_builder  # noqa: E402
+from utils import metrics  # noqa: E402
+
+DIMENSIONS = 768
+
+
+def fake_vector(text):
+    seed = int.from_bytes(hashlib.sha1(text.encode("utf-8")).digest()[:4], "little")
+    vector = np.random.default_rng(seed).standard_normal(DIMENSIONS).astype("float32")
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+class ProviderState:
+    def __init__(self, latency_ms, per_text_ms, max_concurrent, rpm, error_rate, fail_after):
+        self.latency_ms = latency_ms
+        self.per_text_ms = per_text_ms
+        self.slots = threading.BoundedSemaphore(max_concurrent)
+        self.rpm = rpm
+        self.error_rate = error_rate
+        self.fail_after = fail_after   # answer 400 after this many successful requests (0: never)
+        self.lock = threading.Lock()
+        self.window = []
+        self.served = 0
+        self.counts = {"ok": 0, "429": 0, "503": 0, "400": 0}
+
+    def count(self, status):
+        with self.lock:
+            self.counts[status] += 1
+
+    def over_rate(self):
+        if not self.rpm:
+            return False
+        now = time.monotonic()
+        with self.lock:
+            self.window = [t for t in self.window if now - t < 60]
+            if len(self.window) >= self.rpm:
+                return True
+            self.window.append(now)
+            return False
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def reply(self, status, body, headers=None):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            texts = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))["texts"]
+            if state.fail_after and state.served >= state.fail_after:
+                state.count("400")
+                return self.reply(400, {"error": "stand-in configured to fail"})
+            if state.over_rate() or not state.slots.acquire(blocking=False):
+                state.count("429")
+                return self.reply(429, {"error": "rate limited"}, {"Retry-After": "0.5"})
+            try:
+                time.sleep((state.latency_ms + state.per_text_ms * len(texts)) / 1000)
+                if random.random() < state.error_rate:
+                    state.count("503")
+                    return self.reply(503, {"error": "unavailable"})
+                with state.lock:
+                    state.served += 1
+                state.count("ok")
+                self.reply(200, {"embeddings": [fake_vector(t) for t in texts]})
+            finally:
+                state.slots.release()
+
+    return Handler
+
+
+def start_server(port=0, **options):
+    state = ProviderState(**options)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+
+class HttpEmbeddings:
+    """embed_documents() over the stand-in server's HTTP API"""
+
+    def __init__(self, url, timeout=30):
+        self.url = url
+        self.timeout = timeout
+
+    def embed_documents(self, texts):
+        request = urllib.request.Request(self.url, data=json.dumps({"texts": texts}).encode("utf-8"),
+                                         headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read())["embeddings"]
+
+
+def fake_chunks(count, seed=7):
+    rng = random.Random(seed)
+    words = ("career job event skills python remote Bengaluru mentor resume interview conference "
+             "engineer data women leadership flexible apply register").split()
+    return [" ".join(rng.choices(words, k=rng.randrange(80, 400))) for _ in range(count)]
+
+
+def server_options(args, fail_after=0):
+    return dict(latency_ms=args.latency_ms, per_text_ms=args.per_text_ms, max_concurrent=args.max_concurrent,
+                rpm=args.rpm, error_rate=args.error_rate, fail_after=fail_after)
+
+
+def run_bench(args):
+    texts = fake_chunks(args.chunks)
+    embedding_builder.EMBED_BACKOFF_SECONDS = 0.2
+    print(f"{'concurrency':>11s} {'batches':>7s} {'seconds':>8s} {'chunks/s':>9s} {'retries':>8s} {'429':>5s} {'503':>5s}")
+    for concurrency in (int(c) for c in args.concurrency.split(",")):
+        server, state = start_server(**server_options(args))
+        embeddings = HttpEmbeddings(f"http://127.0.0.1:{server.server_port}/embed")
+        retries_before = sum(v for (name, _), v in metrics._counters.items() if name == "embed_retries_total")
+        started = time.perf_counter()
+        vectors = embedding_builder.embed_texts(embeddings, texts, concurrency=concurrency, batch_size=args.batch_size)
+        elapsed = time.perf_counter() - started
+        retries = sum(v for (name, _), v in metrics._counters.items() if name == "embed_retries_total") - retries_before
+        assert vectors.shape == (len(texts), DIMENSIONS)
+        batches = len(embedding_builder.make_batches(texts, args.batch_size))
+        print(f"{concurrency:11d} {batches:7d} {elapsed:8.2f} {len(texts) / elapsed:9.1f} {retries:8.0f} "
+              f"{state.counts['429']:5d} {state.counts['503']:5d}")
+        server.shutdown()
+
+
+def run_resume(args):
+    texts = fake_chunks(args.chunks)
+    batches = len(embedding_builder.make_batches(texts, args.batch_size))
+    checkpoint_dir = tempfile.mkdtemp(prefix="embed_checkpoint_")
+    try:
+        server, _ = start_server(**server_options(args, fail_after=batches // 2))
+        embeddings = HttpEmbeddings(f"http://127.0.0.1:{server.server_port}/embed")
+        try:
+            embedding_builder.embed_texts(embeddings, texts, checkpoint_dir, "stand-in", args.concurrency_one,
+                                          args.batch_size)
+        except Exception as e:
+            saved = len([f for f in os.listdir(checkpoint_dir) if f.endswith(".npy")])
+            print(f"❌ Build interrupted ({str(e)[:60]}); {saved} of {batches} batches checkpointed")
+        server.shutdown()
+
+        server, state = start_server(**server_options(args))
+        embeddings = HttpEmbeddings(f"http://127.0.0.1:{server.server_port}/embed")
+        vectors = embedding_builder.embed_texts(embeddings, texts, checkpoint_dir, "stand-in", args.concurrency_one,
+                                                args.batch_size)
+        fresh = np.asarray(HttpEmbeddings(embeddings.url).embed_documents(texts[:3]), dtype="float32")
+        assert np.allclose(vectors[:3], fresh)
+        print(f"✅ Resumed build finished with {state.counts['ok'] - 1} of {batches} batches re-requested")
+        server.shutdown()
+    finally:
+        shutil.rmtree(checkpoint_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("mode", choices=["serve", "bench", "resume"])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--concurrency", default="1,2,4,8")
+    parser.add_argument("--latency-ms", type=float, default=150)
+    parser.add_argument("--per-text-ms", type=float, default=2)
+    parser.add_argument("--max-concurrent", type=int, default=6, help="requests in flight before 429")
+    parser.add_argument("--rpm", type=int, default=0, help="requests per minute before 429 (0: unlimited)")
+    parser.add_argument("--error-rate", type=float, default=0.02, help="fraction of requests answered 503")
+    args = parser.parse_args()
+    args.concurrency_one = int(args.concurrency.split(",")[-1])
+
+    if args.mode == "serve":
+        server, _ = start_server(args.port, **server_options(args))
+        print(f"🚀 Stand-in embedding server on http://127.0.0.1:{server.server_port}/embed")
+        threading.Event().wait()
+    elif args.mode == "bench":
+        run_bench(args)
+    else:
+        run_resume(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+# Gunicorn config for benchmark runs: installs the offline stand-ins in the
+# master before app:app is imported, so forked workers inherit them.
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import standins  # noqa: E402
+
+standins.install()
+
+bind = os.getenv("BENCH_BIND", "127.0.0.1:8800")
+timeout = int(os.getenv("BENCH_WORKER_TIMEOUT", "120"))
+preload_app = os.getenv("BENCH_PRELOAD", "0") == "1"
+loglevel = "warning"
+
+
+def child_exit(server, worker):
+    from utils.metrics import mark_process_dead
+    mark_process_dead(worker.pid)
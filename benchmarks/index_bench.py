@@ -0,0 +1,157 @@
+"""
+FAISS index benchmark.
+
+Builds every index spec on the same vectors and reports training/build time, index
+memory, single-query latency and recall@k against the exact Flat baseline, for one
+or more corpus sizes. Vectors are synthetic clustered embeddings by default, or the
+real corpus vectors from a written index directory (--from-index).
+
+    python benchmarks/index_bench.py --sizes 2000,20000,200000
+    python benchmarks/index_bench.py --from-index data/index/<version> --specs "Flat" "HNSW32;efSearch=64"
+
+"{nlist}" in a spec is replaced with 4 * sqrt(corpus size), the usual starting point.
+"""
+import os
+import sys
+import json
+import math
+import time
+import argparse
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from service.index_store import INDEX_FILE, build_faiss_index  # noqa: E402
+
+DEFAULT_SPECS = [
+    "Flat",
+    "SQfp16",
+    "HNSW32;efSearch=64",
+    "IVF{nlist},Flat;nprobe=8",
+    "IVF{nlist},Flat;nprobe=32",
+    "IVF{nlist},PQ32x8;nprobe=16",
+]
+EMBEDDING_DIM = 768  # models/embedding-001
+
+
+def synthetic_vectors(size, dim, seed):
+    """Clustered unit vectors, closer to real embeddings than uniform noise"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(8, size // 200), dim)).astype("float32")
+    vectors = centers[rng.integers(len(centers), size=size)] + 0.35 * rng.normal(size=(size, dim)).astype("float32")
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def corpus_vectors(directory):
+    import faiss
+
+    index = faiss.read_index(os.path.join(directory, INDEX_FILE))
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def make_queries(vectors, count, seed):
+    """Perturbed corpus vectors, so each query has meaningful near neighbours"""
+    rng = np.random.default_rng(seed + 1)
+    picks = vectors[rng.integers(len(vectors), size=count)]
+    queries = picks + 0.1 * rng.normal(size=picks.shape).astype("float32")
+    return (queries / np.linalg.norm(queries, axis=1, keepdims=True)).astype("float32")
+
+
+def recall_at_k(found, truth, k):
+    hits = sum(len(set(row[:k]) & set(expected[:k])) for row, expected in zip(found, truth))
+    return hits / (len(truth) * k)
+
+
+def bench_spec(spec, vectors, queries, truth, k):
+    import faiss
+
+    start = time.perf_counter()
+    try:
+        index = build_faiss_index(vectors, spec)
+    except (ValueError, RuntimeError) as e:
+        return {"spec": spec, "error": str(e)}
+    build_seconds = time.perf_counter() - start
+
+    faiss.omp_set_num_threads(1)  # a request searches one query on one thread
+    latencies, found = [], []
+    for query in queries:
+        start = time.perf_counter()
+        _, ids = index.search(query.reshape(1, -1), k)
+        latencies.append(time.perf_counter() - start)
+        found.append(ids[0].tolist())
+    faiss.omp_set_num_threads(0)
+
+    latencies.sort()
+    memory_bytes = len(faiss.serialize_index(index))
+    return {
+        "spec": spec,
+        "build_s": round(build_seconds, 2),
+        "memory_mb": round(memory_bytes / 2 ** 20, 2),
+        "bytes_per_vector": round(memory_bytes / len(vectors), 1),
+        "p50_us": round(latencies[len(latencies) // 2] * 1e6, 1),
+        "p99_us": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1e6, 1),
+        f"recall@{k}": round(recall_at_k(found, truth, k), 4),
+    }
+
+
+def run_size(vectors, specs, args):
+    import faiss
+
+    queries = make_queries(vectors, args.queries, args.seed)
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(queries, args.k)
+    truth = truth.tolist()
+
+    nlist = max(1, int(4 * math.sqrt(len(vectors))))
+    results = []
+    for spec in specs:
+        result = bench_spec(spec.replace("{nlist}", str(nlist)), vectors, queries, truth, args.k)
+        results.append(result)
+        print_row(result, args.k)
+    return results
+
+
+def print_row(result, k):
+    if "error" in result:
+        print(f"  {result['spec']:32s} skipped: {result['error']}")
+        return
+    print(f"  {result['spec']:32s} {result['build_s']:8.2f} {result['memory_mb']:10.2f} "
+          f"{result['bytes_per_vector']:8.1f} {result['p50_us']:9.1f} {result['p99_us']:9.1f} {result[f'recall@{k}']:9.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--specs", nargs="+", default=DEFAULT_SPECS)
+    parser.add_argument("--sizes", default="2000,20000", help="comma-separated synthetic corpus sizes")
+    parser.add_argument("--from-index", help="benchmark the vectors of a written index directory instead")
+    parser.add_argument("--dim", type=int, default=EMBEDDING_DIM)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args()
+
+    if args.from_index:
+        corpora = [(args.from_index, corpus_vectors(args.from_index))]
+    else:
+        corpora = [(f"synthetic-{size}", synthetic_vectors(int(size), args.dim, args.seed))
+                   for size in args.sizes.split(",")]
+
+    report = {}
+    for name, vectors in corpora:
+        print(f"\n{name}: {len(vectors)} vectors x {vectors.shape[1]} dims, {args.queries} queries, k={args.k}")
+        print(f"  {'spec':32s} {'build s':>8s} {'memory MB':>10s} {'B/vec':>8s} {'p50 us':>9s} {'p99 us':>9s} "
+              f"{'recall@' + str(args.k):>9s}")
+        report[name] = run_size(np.ascontiguousarray(vectors, dtype="float32"), args.specs, args)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n📝 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
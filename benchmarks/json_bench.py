@@ -0,0 +1,90 @@
+"""
+JSON serialization and compression benchmark.
+
+Serializes synthetic /chat/ask and /conversation payloads of growing length with the
+stdlib provider (what Flask did before) and with orjson, then compresses them with
+gzip and brotli. Reports serialization time, compression time and bytes on the wire.
+
+    python benchmarks/json_bench.py --turns 5,50,200
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils.json_provider import dumps_bytes  # noqa: E402
+from utils.compression import compress, brotli  # noqa: E402
+
+WORDS = ("career job event skills python remote Bengaluru Mumbai mentor resume interview "
+         "conference engineer data women leadership flexible apply register").split()
+
+
+def fake_answer(rng):
+    structured = {
+        "summary": " ".join(rng.choices(WORDS, k=12)),
+        "sections": [{"title": "Job Details", "icon": "briefcase",
+                      "content": [f"{field}: {' '.join(rng.choices(WORDS, k=4))}"
+                                  for field in ("Position", "Company", "Location", "Posted", "Focus")]}],
+        "links": [{"text": "Company Careers Page", "url": "https://example.com/careers", "type": "career"}],
+        "actions": [{"type": "apply", "text": "Apply Now", "url": "https://example.com/apply"}],
+    }
+    return json.dumps({"text": " ".join(rng.choices(WORDS, k=80)), "structured": structured})
+
+
+def conversation(turns, seed):
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    messages = []
+    for _ in range(turns):
+        messages.append({"type": "human", "content": " ".join(rng.choices(WORDS, k=10))})
+        messages.append({"type": "ai", "content": fake_answer(rng)})
+    return {"_id": ObjectId(), "messages": messages, "created_at": start,
+            "updated_at": start + timedelta(minutes=turns)}
+
+
+def stdlib_dumps(doc):
+    # The old path: stringify ids and dates by hand, then json.dumps like Flask's default provider
+    doc = dict(doc, _id=str(doc["_id"]), created_at=doc["created_at"].isoformat(),
+               updated_at=doc["updated_at"].isoformat())
+    return json.dumps(doc, ensure_ascii=True, sort_keys=True).encode("utf-8")
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", default="5,50,200", help="comma-separated conversation lengths")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    encodings = ["gzip"] + (["br"] if brotli is not None else [])
+    print(f"{'turns':>6s} {'serializer':>10s} {'raw KB':>8s} {'dump ms':>8s} " +
+          " ".join(f"{e + ' KB':>8s} {e + ' ms':>8s}" for e in encodings))
+    for turns in (int(t) for t in args.turns.split(",")):
+        doc = conversation(turns, seed=turns)
+        for name, dumps in (("stdlib", stdlib_dumps), ("orjson", dumps_bytes)):
+            dump_seconds, data = best_of(lambda: dumps(doc), args.repeat)
+            columns = []
+            for encoding in encodings:
+                seconds, compressed = best_of(lambda: compress(data, encoding), max(3, args.repeat // 5))
+                columns.append(f"{len(compressed) / 1024:8.1f} {seconds * 1000:8.2f}")
+            print(f"{turns:6d} {name:>10s} {len(data) / 1024:8.1f} {dump_seconds * 1000:8.3f} " + " ".join(columns))
+
+
+if __name__ == "__main__":
+    main()
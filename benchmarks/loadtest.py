@@ -0,0 +1,347 @@
+"""
+Offline end-to-end load test.
+
+Boots app:app under gunicorn with the stand-ins from benchmarks/standins.py, drives
+multi-turn chat, voice and resume traffic, and writes a results file that can be
+diffed between commits.
+
+    python benchmarks/loadtest.py --configs sync:2,gthread:2:8 --duration 60 --users 16
+    python benchmarks/loadtest.py --configs sync:4 --faiss-mmap-ab   # per-worker RSS with/without mmap
+    python benchmarks/loadtest.py --compare old.json new.json
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import subprocess
+from collections import defaultdict
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+
+FIRST_QUESTIONS = [
+    "What software engineering jobs are open in Bengaluru?",
+    "Tell me about upcoming technology conferences",
+    "What does the JobsForHer Foundation do?",
+    "Any recent tech news about AI?",
+    "How can I restart my career after a break?",
+]
+FOLLOW_UPS = [
+    "Can you tell me more about the first one?",
+    "Which of those is closest to Mumbai?",
+    "What skills do I need for that?",
+    "How do I apply?",
+]
+SCENARIO_WEIGHTS = [("chat", 0.7), ("voice", 0.2), ("resume", 0.1)]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def record(self, endpoint, seconds, ok):
+        with self.lock:
+            self.latencies[endpoint].append(seconds)
+            if not ok:
+                self.errors[endpoint] += 1
+
+
+def timed_request(recorder, endpoint, method, url, **kwargs):
+    start = time.perf_counter()
+    try:
+        response = requests.request(method, url, timeout=120, **kwargs)
+        ok = response.status_code < 400
+    except requests.RequestException:
+        response, ok = None, False
+    recorder.record(endpoint, time.perf_counter() - start, ok)
+    return response
+
+
+def chat_scenario(base_url, recorder, rng):
+    conversation_id = None
+    questions = [rng.choice(FIRST_QUESTIONS)] + rng.sample(FOLLOW_UPS, rng.randint(1, 3))
+    for question in questions:
+        payload = {"question": question}
+        if conversation_id:
+            payload["conversation_id"] = conversation_id
+        response = timed_request(recorder, "/chat/ask", "POST", f"{base_url}/chat/ask", json=payload)
+        if response is None or response.status_code >= 400:
+            return
+        conversation_id = response.json().get("conversation_id") or conversation_id
+
+
+def voice_scenario(base_url, recorder, rng, call_number):
+    call_sid = f"CAbench{os.getpid()}x{call_number}"
+    response = timed_request(recorder, "/voice/voice", "POST", f"{base_url}/voice/voice", data={"CallSid": call_sid})
+    if response is None or response.status_code >= 400:
+        return
+    match = re.search(r"conversation_id=([0-9a-f]+)", response.text)
+    if not match:
+        return
+    conversation_id = match.group(1)
+
+    for _ in range(rng.randint(1, 2)):
+        start = time.perf_counter()
+        response = timed_request(
+            recorder, "/voice/handle_transcription", "POST",
+            f"{base_url}/voice/handle_transcription?conversation_id={conversation_id}",
+            data={"TranscriptionText": rng.choice(FIRST_QUESTIONS), "CallSid": call_sid}
+        )
+        # Follow the hold/redirect loop the way Twilio would
+        while response is not None and "<Redirect" in response.text:
+            redirect_url = re.search(r"<Redirect[^>]*>([^<]+)</Redirect>", response.text).group(1)
+            redirect_url = redirect_url.replace("&amp;", "&")
+            pause = re.search(r'<Pause length="(\d+)"', response.text)
+            if pause:
+                time.sleep(int(pause.group(1)))
+            response = timed_request(recorder, "/voice/poll_answer", "POST", redirect_url, data={"CallSid": call_sid})
+        recorder.record("voice_turn_end_to_end", time.perf_counter() - start, response is not None)
+
+    timed_request(recorder, "/voice/call_status", "POST", f"{base_url}/voice/call_status",
+                  data={"CallSid": call_sid, "CallStatus": "completed"})
+
+
+def resume_scenario(base_url, recorder):
+    with open(os.path.join(ROOT, "data", "faqs.pdf"), "rb") as f:
+        timed_request(recorder, "/resume/analyze_resume", "POST", f"{base_url}/resume/analyze_resume",
+                      files={"file": ("resume.pdf", f, "application/pdf")})
+
+
+def virtual_user(base_url, recorder, stop_at, seed):
+    rng = random.Random(seed)
+    call_number = 0
+    while time.time() < stop_at:
+        roll, cumulative = rng.random(), 0.0
+        for scenario, weight in SCENARIO_WEIGHTS:
+            cumulative += weight
+            if roll <= cumulative:
+                break
+        if scenario == "chat":
+            chat_scenario(base_url, recorder, rng)
+        elif scenario == "voice":
+            call_number += 1
+            voice_scenario(base_url, recorder, rng, f"{seed}x{call_number}")
+        else:
+            resume_scenario(base_url, recorder)
+
+
+def child_pids(parent_pid):
+    pids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            if int(fields[1]) == parent_pid:
+                pids.append(int(entry))
+        except (OSError, IndexError):
+            continue
+    return sorted(pids)
+
+
+def process_stats(pid):
+    """CPU seconds used so far, current RSS and peak RSS in MB"""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    cpu_seconds = (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+    rss_kb = peak_kb = 0
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                rss_kb = int(line.split()[1])
+            elif line.startswith("VmHWM:"):
+                peak_kb = int(line.split()[1])
+    return cpu_seconds, rss_kb / 1024, peak_kb / 1024
+
+
+def memory_stats(pid):
+    """
+    RSS, PSS and anonymous memory in MB. Mapped index pages count fully in every
+    worker's RSS but are shared in PSS; anonymous memory is the worker's own copy.
+    """
+    stats = {"rss_mb": 0.0, "pss_mb": 0.0, "anon_mb": 0.0}
+    names = {"Rss:": "rss_mb", "Pss:": "pss_mb", "Anonymous:": "anon_mb"}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                name = names.get(line.split(maxsplit=1)[0])
+                if name:
+                    stats[name] = round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return stats
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def summarize(recorder, duration):
+    endpoints = {}
+    for endpoint, samples in sorted(recorder.latencies.items()):
+        ordered = sorted(samples)
+        endpoints[endpoint] = {
+            "count": len(ordered),
+            "errors": recorder.errors.get(endpoint, 0),
+            "throughput_rps": round(len(ordered) / duration, 2),
+            "p50_ms": round(percentile(ordered, 0.50) * 1000, 1),
+            "p90_ms": round(percentile(ordered, 0.90) * 1000, 1),
+            "p99_ms": round(percentile(ordered, 0.99) * 1000, 1),
+            "max_ms": round(ordered[-1] * 1000, 1),
+        }
+    return endpoints
+
+
+def wait_until_ready(base_url, process, timeout=300):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("gunicorn exited during startup")
+        try:
+            if requests.get(f"{base_url}/", timeout=2).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError("gunicorn did not become ready in time")
+
+
+def parse_config(spec):
+    parts = spec.split(":")
+    worker_class = parts[0]
+    workers = int(parts[1]) if len(parts) > 1 else 1
+    threads = int(parts[2]) if len(parts) > 2 else 1
+    return {"name": spec, "worker_class": worker_class, "workers": workers, "threads": threads}
+
+
+def expand_configs(specs, faiss_mmap_ab):
+    configs = [parse_config(spec) for spec in specs.split(",")]
+    if not faiss_mmap_ab:
+        return configs
+    # Same configuration with the FAISS index loaded into each worker vs. shared through mmap
+    return [dict(config, name=f"{config['name']}+mmap={flag}", env={"FAISS_MMAP": flag})
+            for config in configs for flag in ("0", "1")]
+
+
+def run_config(config, args, port):
+    from benchmarks import standins
+
+    standins.reset_store()
+    base_url = f"http://127.0.0.1:{port}"
+    env = dict(os.environ, BENCH_BIND=f"127.0.0.1:{port}", BENCH_LLM_LATENCY_MS=str(args.llm_latency_ms),
+               BENCH_LLM_JITTER_MS=str(args.llm_jitter_ms), BENCH_PRELOAD="1" if args.preload else "0",
+               **config.get("env", {}))
+    command = [sys.executable, "-m", "gunicorn", "-c", os.path.join(ROOT, "benchmarks", "gunicorn_conf.py"),
+               "-k", config["worker_class"], "-w", str(config["workers"]), "--threads", str(config["threads"]),
+               "app:app"]
+    print(f"▶️  {config['name']}: starting gunicorn")
+    process = subprocess.Popen(command, cwd=ROOT, env=env)
+    try:
+        boot_start = time.time()
+        wait_until_ready(base_url, process)
+        boot_seconds = time.time() - boot_start
+        workers = child_pids(process.pid)
+        cpu_before = {pid: process_stats(pid)[0] for pid in workers}
+        # Before the first request: with lazy startup the index isn't loaded yet
+        memory_before = {pid: memory_stats(pid) for pid in workers}
+
+        recorder = Recorder()
+        stop_at = time.time() + args.duration
+        users = [threading.Thread(target=virtual_user, args=(base_url, recorder, stop_at, args.seed + i))
+                 for i in range(args.users)]
+        started = time.time()
+        for user in users:
+            user.start()
+        for user in users:
+            user.join()
+        elapsed = time.time() - started
+
+        worker_stats = []
+        for pid in workers:
+            cpu_after, rss_mb, peak_mb = process_stats(pid)
+            worker_stats.append({
+                "cpu_seconds": round(cpu_after - cpu_before[pid], 2),
+                "memory_before": memory_before[pid],
+                "memory_after": memory_stats(pid),
+                "peak_rss_mb": round(peak_mb, 1),
+            })
+        for i, stats in enumerate(worker_stats):
+            before, after = stats["memory_before"], stats["memory_after"]
+            print(f"   worker {i}: rss {before['rss_mb']} -> {after['rss_mb']} MB, "
+                  f"pss {before['pss_mb']} -> {after['pss_mb']} MB, anon {before['anon_mb']} -> {after['anon_mb']} MB")
+        return dict(config, boot_seconds=round(boot_seconds, 2), duration_seconds=round(elapsed, 1),
+                    endpoints=summarize(recorder, elapsed), workers=worker_stats)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = {c["name"]: c for c in json.load(f)["configs"]}
+    with open(new_path) as f:
+        new = {c["name"]: c for c in json.load(f)["configs"]}
+    for name in sorted(set(old) & set(new)):
+        print(f"== {name}")
+        for endpoint in sorted(set(old[name]["endpoints"]) & set(new[name]["endpoints"])):
+            before, after = old[name]["endpoints"][endpoint], new[name]["endpoints"][endpoint]
+            print(f"  {endpoint:32s} rps {before['throughput_rps']:>8} -> {after['throughput_rps']:<8} "
+                  f"p50 {before['p50_ms']:>8} -> {after['p50_ms']:<8} p99 {before['p99_ms']:>8} -> {after['p99_ms']}")
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--configs", default="sync:2,gthread:2:8",
+                        help="comma separated worker_class:workers[:threads] entries")
+    parser.add_argument("--duration", type=float, default=60)
+    parser.add_argument("--users", type=int, default=16)
+    parser.add_argument("--llm-latency-ms", type=float, default=400)
+    parser.add_argument("--llm-jitter-ms", type=float, default=100)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--preload", action="store_true")
+    parser.add_argument("--faiss-mmap-ab", action="store_true",
+                        help="run every config with FAISS_MMAP=0 and FAISS_MMAP=1 to compare per-worker RSS")
+    parser.add_argument("--output", default=os.path.join(ROOT, "benchmarks", "results", "loadtest.json"))
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    sys.path.insert(0, ROOT)
+    results = {
+        "commit": git_commit(),
+        "settings": {"duration": args.duration, "users": args.users, "llm_latency_ms": args.llm_latency_ms,
+                     "llm_jitter_ms": args.llm_jitter_ms, "seed": args.seed, "preload": args.preload},
+        "configs": [run_config(config, args, args.port + i)
+                    for i, config in enumerate(expand_configs(args.configs, args.faiss_mmap_ab))],
+    }
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write("\n")
+    print(f"✅ Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,469 @@
+"""
+Deterministic stand-ins for Gemini, the Google embedder and MongoDB so the app can be
+benchmarked offline. install() must run before `app` (or any service) is imported.
+"""
+import os
+import json
+import time
+import random
+import sqlite3
+import threading
+from copy import deepcopy
+
+BENCH_LLM_LATENCY_MS = float(os.getenv("BENCH_LLM_LATENCY_MS", "400"))
+BENCH_LLM_JITTER_MS = float(os.getenv("BENCH_LLM_JITTER_MS", "100"))
+BENCH_LLM_RECORDINGS = os.getenv("BENCH_LLM_RECORDINGS")
+BENCH_MONGO_URI = os.getenv("BENCH_MONGO_URI")
+BENCH_SQLITE_PATH = os.getenv("BENCH_SQLITE_PATH", "/tmp/asha_bench.sqlite3")
+BENCH_SEED = int(os.getenv("BENCH_SEED", "42"))
+
+DEFAULT_RESPONSES = {
+    "intent": ['{"intent": "general", "data": {"name": null, "email": null, "phone": null, "skills": [], "bio": null}}'],
+    "bias": ["Neutral. The text asks a factual question without loaded language."],
+    "rephrase": None,  # echoes the latest human message
+    "empowerment": ["Every expert was once a beginner. Your pace is yours, and every step counts."],
+    "resume": ['{"skills": ["Python"], "recommended_courses": [], "career_roadmap": [], '
+               '"shortcomings": [], "improvement_tips": []}'],
+    "voice": ["There are a few software roles open in Bengaluru right now. Would you like details on one of them?"],
+    "qa": ['{"summary": "Software Engineer roles in Bengaluru", "sections": [{"title": "Job Details", '
+           '"content": ["Position: Software Engineer", "Company: Capgemini", "Location: Bengaluru"], '
+           '"icon": "briefcase"}], "links": [], "actions": []}'],
+}
+
+PURPOSE_MARKERS = [
+    ("intent", "classifies user intent"),
+    ("bias", "bias detection assistant"),
+    ("rephrase", "rephrase it as a standalone question"),
+    ("empowerment", "inspiring story or message"),
+    ("resume", "AI career mentor"),
+    ("voice", "voice assistant for women's career support, answering a caller"),
+]
+
+
+def _load_recordings():
+    responses = dict(DEFAULT_RESPONSES)
+    if BENCH_LLM_RECORDINGS and os.path.exists(BENCH_LLM_RECORDINGS):
+        with open(BENCH_LLM_RECORDINGS, "r", encoding="utf-8") as f:
+            responses.update(json.load(f))
+    return responses
+
+
+def detect_purpose(prompt_text):
+    for purpose, marker in PURPOSE_MARKERS:
+        if marker in prompt_text:
+            return purpose
+    return "qa"
+
+
+def make_fake_chat_model():
+    """Build the fake chat model class lazily so langchain is only needed when installed"""
+    from langchain_core.language_models.chat_models import BaseChatModel
+    from langchain_core.messages import AIMessage
+    from langchain_core.outputs import ChatGeneration, ChatResult
+
+    responses = _load_recordings()
+    counters = {}
+    rng = random.Random(BENCH_SEED + os.getpid())
+    lock = threading.Lock()
+
+    class FakeChatModel(BaseChatModel):
+        """Chat model that sleeps for a configured latency and returns recorded outputs"""
+
+        latency_ms: float = BENCH_LLM_LATENCY_MS
+        jitter_ms: float = BENCH_LLM_JITTER_MS
+
+        @property
+        def _llm_type(self):
+            return "bench-fake"
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+            prompt_text = "\n".join(str(m.content) for m in messages)
+            purpose = detect_purpose(prompt_text)
+            with lock:
+                delay = max(0.0, rng.gauss(self.latency_ms, self.jitter_ms)) / 1000
+                index = counters.get(purpose, 0)
+                counters[purpose] = index + 1
+            time.sleep(delay)
+
+            choices = responses.get(purpose)
+            if choices is None:
+                text = str(messages[-1].content)
+            else:
+                text = choices[index % len(choices)]
+            usage = {"input_tokens": len(prompt_text) // 4, "output_tokens": len(text) // 4,
+                     "total_tokens": (len(prompt_text) + len(text)) // 4}
+            message = AIMessage(content=text, usage_metadata=usage)
+            return ChatResult(generations=[ChatGeneration(message=message)])
+
+    return FakeChatModel
+
+
+def fake_chat_factory():
+    model_class = make_fake_chat_model()
+
+    def ChatGoogleGenerativeAI(**kwargs):
+        return model_class(callbacks=kwargs.get("callbacks"))
+    return ChatGoogleGenerativeAI
+
+
+def fake_embeddings_factory(**kwargs):
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    return DeterministicFakeEmbedding(size=768)
+
+
+class FakeInsertResult:
+    def __init__(self, inserted_id):
+        self.inserted_id = inserted_id
+
+
+class FakeUpdateResult:
+    def __init__(self, matched, upserted_id=None):
+        self.matched_count = matched
+        self.modified_count = matched
+        self.upserted_id = upserted_id
+
+
+class FakeDeleteResult:
+    def __init__(self, deleted):
+        self.deleted_count = deleted
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, key, direction=1):
+        if isinstance(key, list):
+            for field, order in reversed(key):
+                self.docs.sort(key=lambda d: str(d.get(field, "")), reverse=order < 0)
+        else:
+            self.docs.sort(key=lambda d: str(d.get(key, "")), reverse=direction < 0)
+        return self
+
+    def skip(self, count):
+        self.docs = self.docs[count:]
+        return self
+
+    def limit(self, count):
+        if count:
+            self.docs = self.docs[:count]
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    def __iter__(self):
+        return iter(self.docs)
+
+
+def _get_path(doc, path):
+    for part in path.split("."):
+        if isinstance(doc, list) and part.isdigit():
+            doc = doc[int(part)] if int(part) < len(doc) else None
+        elif isinstance(doc, dict):
+            doc = doc.get(part)
+        else:
+            return None
+    return doc
+
+
+def _set_path(doc, path, value):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        if isinstance(doc, list):
+            doc = doc[int(part)]
+        else:
+            doc = doc.setdefault(part, {})
+    if isinstance(doc, list):
+        doc[int(parts[-1])] = value
+    else:
+        doc[parts[-1]] = value
+
+
+def _matches(doc, query):
+    for key, expected in query.items():
+        if key == "$or":
+            if not any(_matches(doc, sub) for sub in expected):
+                return False
+            continue
+        if key == "$and":
+            if not all(_matches(doc, sub) for sub in expected):
+                return False
+            continue
+        actual = _get_path(doc, key)
+        if isinstance(actual, list) and not isinstance(expected, (dict, list)):
+            # A scalar matches an array field that contains it
+            if expected not in actual:
+                return False
+            continue
+        if isinstance(expected, dict) and any(k.startswith("$") for k in expected):
+            for op, operand in expected.items():
+                if op == "$in" and actual not in operand:
+                    return False
+                if op == "$exists" and (actual is not None) != operand:
+                    return False
+                if op == "$lt" and not (actual is not None and actual < operand):
+                    return False
+                if op == "$lte" and not (actual is not None and actual <= operand):
+                    return False
+                if op == "$gt" and not (actual is not None and actual > operand):
+                    return False
+                if op == "$gte" and not (actual is not None and actual >= operand):
+                    return False
+                if op == "$ne" and actual == operand:
+                    return False
+        elif actual != expected:
+            return False
+    return True
+
+
+def _apply_update(doc, update, inserting=False):
+    for op, fields in update.items():
+        if op == "$set" or (op == "$setOnInsert" and inserting):
+            for path, value in fields.items():
+                _set_path(doc, path, deepcopy(value))
+        elif op == "$inc":
+            for path, value in fields.items():
+                _set_path(doc, path, (_get_path(doc, path) or 0) + value)
+        elif op == "$unset":
+            for path in fields:
+                doc.pop(path, None)
+        elif op == "$push":
+            for path, value in fields.items():
+                items = value["$each"] if isinstance(value, dict) and "$each" in value else [value]
+                target = _get_path(doc, path)
+                if target is None:
+                    _set_path(doc, path, [])
+                    target = _get_path(doc, path)
+                target.extend(deepcopy(items))
+        elif op == "$pull":
+            for path, value in fields.items():
+                target = _get_path(doc, path)
+                if isinstance(target, list):
+                    _set_path(doc, path, [item for item in target if item != value])
+        elif op == "$addToSet":
+            for path, value in fields.items():
+                target = _get_path(doc, path)
+                if target is None:
+                    _set_path(doc, path, [])
+                    target = _get_path(doc, path)
+                if value not in target:
+                    target.append(value)
+
+
+class FakeCollection:
+    """Tiny sqlite-backed collection shared by every worker on the box"""
+
+    def __init__(self, database, name):
+        self.database = database
+        self.name = name
+        with self.database.connect() as conn:
+            conn.execute(f'CREATE TABLE IF NOT EXISTS "{name}" (id TEXT PRIMARY KEY, doc TEXT)')
+
+    def _encode(self, doc):
+        from bson import json_util
+        return json_util.dumps(doc)
+
+    def _decode(self, raw):
+        from bson import json_util
+        return json_util.loads(raw)
+
+    def _all(self, conn):
+        return [self._decode(raw) for (raw,) in conn.execute(f'SELECT doc FROM "{self.name}"')]
+
+    def _candidates(self, conn, query):
+        if set(query) == {"_id"} and not isinstance(query["_id"], dict):
+            row = conn.execute(f'SELECT doc FROM "{self.name}" WHERE id = ?', (str(query["_id"]),)).fetchone()
+            return [self._decode(row[0])] if row else []
+        return [doc for doc in self._all(conn) if _matches(doc, query)]
+
+    def _write(self, conn, doc):
+        conn.execute(f'INSERT OR REPLACE INTO "{self.name}" (id, doc) VALUES (?, ?)', (str(doc["_id"]), self._encode(doc)))
+
+    def _project(self, doc, projection):
+        if not projection:
+            return doc
+        slices = {k: v["$slice"] for k, v in projection.items() if isinstance(v, dict) and "$slice" in v}
+        if slices:
+            doc = dict(doc)
+            for key, spec in slices.items():
+                skip, limit = spec if isinstance(spec, list) else (0, spec)
+                doc[key] = list(doc.get(key) or [])[skip:skip + limit]
+            projection = {k: 1 if k in slices else v for k, v in projection.items()}
+        if any(not v for k, v in projection.items() if k != "_id"):
+            return {k: v for k, v in doc.items() if projection.get(k, 1)}
+        keep = {k.split(".")[0] for k, v in projection.items() if v}   # dotted keys keep the whole field
+        return {k: v for k, v in doc.items() if k in keep or (k == "_id" and projection.get("_id", 1))}
+
+    def create_index(self, *args, **kwargs):
+        return "fake_index"
+
+    def insert_one(self, doc):
+        from bson import ObjectId
+        doc.setdefault("_id", ObjectId())
+        with self.database.connect() as conn:
+            self._write(conn, doc)
+        return FakeInsertResult(doc["_id"])
+
+    def insert_many(self, docs, ordered=True):
+        ids = [self.insert_one(doc).inserted_id for doc in docs]
+        return type("InsertManyResult", (), {"inserted_ids": ids})()
+
+    def find_one(self, query=None, projection=None, **kwargs):
+        with self.database.connect() as conn:
+            docs = self._candidates(conn, query or {})
+        return self._project(docs[0], projection) if docs else None
+
+    def find(self, query=None, projection=None, **kwargs):
+        with self.database.connect() as conn:
+            docs = self._candidates(conn, query or {})
+        return FakeCursor([self._project(doc, projection) for doc in docs])
+
+    def count_documents(self, query=None, **kwargs):
+        with self.database.connect() as conn:
+            return len(self._candidates(conn, query or {}))
+
+    def _update(self, query, update, upsert=False, many=False):
+        from bson import ObjectId
+        with self.database.connect() as conn:
+            docs = self._candidates(conn, query)
+            if not many:
+                docs = docs[:1]
+            for doc in docs:
+                _apply_update(doc, update)
+                self._write(conn, doc)
+            if docs or not upsert:
+                return FakeUpdateResult(len(docs)), docs
+            doc = {k: v for k, v in query.items() if not isinstance(v, dict)}
+            _apply_update(doc, update, inserting=True)
+            doc.setdefault("_id", ObjectId())
+            self._write(conn, doc)
+            return FakeUpdateResult(0, doc["_id"]), [doc]
+
+    def update_one(self, query, update, upsert=False, **kwargs):
+        return self._update(query, update, upsert=upsert)[0]
+
+    def update_many(self, query, update, upsert=False, **kwargs):
+        return self._update(query, update, upsert=upsert, many=True)[0]
+
+    def replace_one(self, query, doc, upsert=False, **kwargs):
+        with self.database.connect() as conn:
+            existing = self._candidates(conn, query)[:1]
+            if existing:
+                doc["_id"] = existing[0]["_id"]
+            elif not upsert:
+                return FakeUpdateResult(0)
+            self._write(conn, doc)
+        return FakeUpdateResult(len(existing))
+
+    def find_one_and_update(self, query, update, upsert=False, return_document=False, projection=None, **kwargs):
+        with self.database.connect() as conn:
+            before = deepcopy(self._candidates(conn, query)[:1])
+        result, docs = self._update(query, update, upsert=upsert)
+        if return_document:
+            return self._project(docs[0], projection) if docs else None
+        return self._project(before[0], projection) if before else None
+
+    def delete_one(self, query):
+        with self.database.connect() as conn:
+            docs = self._candidates(conn, query)[:1]
+            for doc in docs:
+                conn.execute(f'DELETE FROM "{self.name}" WHERE id = ?', (str(doc["_id"]),))
+        return FakeDeleteResult(len(docs))
+
+    def delete_many(self, query):
+        with self.database.connect() as conn:
+            docs = self._candidates(conn, query)
+            for doc in docs:
+                conn.execute(f'DELETE FROM "{self.name}" WHERE id = ?', (str(doc["_id"]),))
+        return FakeDeleteResult(len(docs))
+
+    def bulk_write(self, operations, ordered=True):
+        counts = {"nInserted": 0, "nUpserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0}
+        upserted_ids = {}
+        for index, operation in enumerate(operations):
+            kind = type(operation).__name__
+            if kind == "InsertOne":
+                self.insert_one(operation._doc)
+                counts["nInserted"] += 1
+            elif kind in ("UpdateOne", "UpdateMany"):
+                result, _ = self._update(operation._filter, operation._doc, upsert=bool(operation._upsert),
+                                         many=kind == "UpdateMany")
+                if result.upserted_id is not None:
+                    upserted_ids[index] = result.upserted_id
+                    counts["nUpserted"] += 1
+                counts["nMatched"] += result.matched_count
+                counts["nModified"] += result.modified_count
+            elif kind == "ReplaceOne":
+                self.replace_one(operation._filter, operation._doc, upsert=bool(operation._upsert))
+                counts["nMatched"] += 1
+            elif kind == "DeleteOne":
+                counts["nRemoved"] += self.delete_one(operation._filter).deleted_count
+        return type("BulkWriteResult", (), {"upserted_ids": upserted_ids, "modified_count": counts["nModified"],
+                                            "bulk_api_result": dict(counts, writeErrors=[])})()
+
+
+class FakeDatabase:
+    def __init__(self, path):
+        self.path = path
+        self.collections = {}
+        self.lock = threading.Lock()
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return _Transaction(conn)
+
+    def __getitem__(self, name):
+        with self.lock:
+            if name not in self.collections:
+                self.collections[name] = FakeCollection(self, name)
+            return self.collections[name]
+
+
+class _Transaction:
+    """Serialises a read-modify-write across workers with BEGIN IMMEDIATE"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        self.conn.close()
+        return False
+
+
+class FakeMongoClient:
+    def __init__(self, *args, **kwargs):
+        self.databases = {}
+
+    def __getitem__(self, name):
+        if name not in self.databases:
+            self.databases[name] = FakeDatabase(f"{BENCH_SQLITE_PATH}.{name}")
+        return self.databases[name]
+
+
+def reset_store():
+    """Remove the sqlite files left over from a previous run"""
+    directory = os.path.dirname(BENCH_SQLITE_PATH) or "."
+    prefix = os.path.basename(BENCH_SQLITE_PATH)
+    for name in os.listdir(directory):
+        if name.startswith(prefix):
+            os.remove(os.path.join(directory, name))
+
+
+def install():
+    """Patch Gemini, the embedder and (unless BENCH_MONGO_URI is set) pymongo"""
+    import langchain_google_genai
+    langchain_google_genai.ChatGoogleGenerativeAI = fake_chat_factory()
+    langchain_google_genai.GoogleGenerativeAIEmbeddings = fake_embeddings_factory
+
+    if BENCH_MONGO_URI:
+        os.environ["MONGO_URI"] = BENCH_MONGO_URI
+    else:
+        import pymongo
+        pymongo.MongoClient = FakeMongoClient
@@ -0,0 +1,93 @@
+"""
+Startup benchmark for the lazy startup mode.
+
+Imports app:app in fresh interpreters with STARTUP_MODE=lazy, reports the slowest
+modules from `python -X importtime`, and exits non-zero when the import exceeds the
+time budget or a heavy dependency is imported eagerly. Run it in CI:
+
+    python benchmarks/startup_bench.py --budget-ms 1500
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must only load on first use of the feature that needs them
+LAZY_MODULES = [
+    "langchain",
+    "langchain_community",
+    "langchain_google_genai",
+    "langchain_core",
+    "faiss",
+    "textblob",
+    "nltk",
+    "fitz",
+    "twilio.rest",
+    "phonenumbers",
+]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "modules": sorted(sys.modules)}))
+"""
+
+
+def run_probe(env):
+    output = subprocess.check_output([sys.executable, "-c", PROBE], cwd=ROOT, env=env, text=True)
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def import_breakdown(env, top):
+    """Cumulative import time per top-level package from -X importtime"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"], cwd=ROOT, env=env,
+                            capture_output=True, text=True)
+    totals = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        root = name.strip().split(".")[0]
+        totals[root] = max(totals.get(root, 0), int(cumulative_us))
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("STARTUP_BUDGET_MS", "1500")))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    env = dict(os.environ, STARTUP_MODE="lazy")
+    run_probe(env)  # warm the bytecode cache
+    probes = [run_probe(env) for _ in range(args.runs)]
+    best_ms = min(p["seconds"] for p in probes) * 1000
+
+    print(f"import app (STARTUP_MODE=lazy): best {best_ms:.0f} ms over {args.runs} runs, budget {args.budget_ms:.0f} ms")
+    print("Slowest top-level imports (cumulative):")
+    for name, micros in import_breakdown(env, args.top):
+        print(f"  {name:30s} {micros / 1000:8.1f} ms")
+
+    loaded = set(probes[0]["modules"])
+    eager = [m for m in LAZY_MODULES if m in loaded]
+    failures = []
+    if eager:
+        failures.append(f"heavy modules imported at startup: {', '.join(eager)}")
+    if best_ms > args.budget_ms:
+        failures.append(f"startup took {best_ms:.0f} ms, over the {args.budget_ms:.0f} ms budget")
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        sys.exit(1)
+    print("✅ Startup within budget")
+
+
+if __name__ == "__main__":
+    main()
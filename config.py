@@ -9,3 +9,9 @@ client = MongoClient(MONGO_URI)
 db = client["ragAsha"]
 users_collection = db["users"]
 conversations_collection = db["conversations"]
+conversations_archive_collection = db["conversations_archive"]
+search_postings_collection = db["conversation_search_postings"]
+search_terms_collection = db["conversation_search_terms"]
+search_docs_collection = db["conversation_search_docs"]
+empowerment_collection = db["empowerment_messages"]
+voice_turns_collection = db["voice_turns"]
@@ -0,0 +1,7 @@
+# Loaded by gunicorn from the working directory (see Procfile)
+
+
+def child_exit(server, worker):
+    # An exited worker's metrics snapshot would otherwise keep adding its last gauges
+    from utils.metrics import mark_process_dead
+    mark_process_dead(worker.pid)
@@ -1,22 +1,40 @@
-from flask import Blueprint, request, jsonify
+import os
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 from bson import ObjectId
 from datetime import datetime
 import json
+import hmac
 import logging
 
 from config import conversations_collection
-from service.rag_service import initialize_rag_system
+from service.archive_service import rehydrate_conversation
+from service.conversation_search import index_messages_later
+from service.conversation_store import resolve_user_id
+from service.rag_service import invoke_rag, get_profile_latency_stats, request_reload, corpus_status
 from utils.serialization import serialize_messages, deserialize_messages
-from service.bias_service import nlp_based_bias_detector, gemini_bias_detector
-from service.intent_service import detect_intent_and_data
+from service.bias_service import nlp_based_bias_detector
+from service import bias_worker
+from service.intent_service import detect_intent_within_budget
 from service.sentiment_service import detect_sentiment
-from service.gemini_service import get_empowering_response
-
-from langchain_core.messages import HumanMessage, AIMessage
+from service.empowerment_pool import get_pooled_empowering_response
+from service.structured_index import answer_structured_query
+from utils.metrics import span
+from utils.admission import admission_controlled, LoadShed
+from utils.single_flight import SingleFlight
+from utils.deadline import skipped_stages, mongo_timeout, DeadlineExceeded
 
 chat_bp = Blueprint('chat', __name__)
-rag_chain = initialize_rag_system()
+# Inside gunicorn's 30 s worker timeout, so a slow Gemini degrades the answer instead
+CHAT_DEADLINE_SECONDS = float(os.getenv("CHAT_DEADLINE_SECONDS", "25"))
+# Optional stages (intent LLM, history rephrasing) only run while the answer still has this long
+CHAT_ANSWER_RESERVE_SECONDS = float(os.getenv("CHAT_ANSWER_RESERVE_SECONDS", "12"))
+TIMED_OUT_MESSAGE = "Sorry, that is taking longer than expected. Please try again in a moment."
+# /rag/reload requires "Authorization: Bearer <token>"; it is disabled while this is unset
+RAG_ADMIN_TOKEN = os.getenv("RAG_ADMIN_TOKEN")
+# How long a /bias/... event stream waits for a late Gemini bias result
+BIAS_STREAM_SECONDS = float(os.getenv("BIAS_STREAM_SECONDS", "60"))
+BIAS_KEEPALIVE_SECONDS = 15
 
 import re
 
@@ -222,113 +240,312 @@ def generate_fallback_text(structured_data):
 
     return "\n".join(text_parts) if text_parts else "Please see the structured response."
 
+def load_or_create_conversation(conversation_id, user_id=None):
+    """Return (conversation_id, chat_history), creating a conversation when no id is given"""
+    if conversation_id:
+        with span("mongo_read"), mongo_timeout():
+            conversation = conversations_collection.find_one({'_id': ObjectId(conversation_id)})
+        if not conversation:
+            conversation = rehydrate_conversation(conversation_id)
+        if not conversation:
+            return None, None
+        return conversation_id, deserialize_messages(conversation['messages'])
+
+    conversation = {
+        'messages': [],
+        'user_id': user_id,
+        'created_at': datetime.now().isoformat(),
+        'updated_at': datetime.now().isoformat()
+    }
+    with span("mongo_write"), mongo_timeout():
+        result = conversations_collection.insert_one(conversation)
+    return str(result.inserted_id), []
+
+def save_conversation(conversation_id, chat_history, new_messages=2, extra=None):
+    """Persist the full chat history (and any extra fields) and return its serialized form"""
+    updated = serialize_messages(chat_history)
+    with span("mongo_write"), mongo_timeout():
+        conversations_collection.update_one(
+            {'_id': ObjectId(conversation_id)},
+            {'$set': {'messages': updated, 'updated_at': datetime.now().isoformat(), **(extra or {})}}
+        )
+    # Only the turn just added needs indexing; earlier messages already are
+    index_messages_later(conversation_id, updated[-new_messages:])
+    return updated
+
+def answer_from_structured_index(question, conversation_id, structured_response, user_id=None):
+    """Build the /ask response for a question answered without the LLM"""
+    from langchain_core.messages import HumanMessage, AIMessage
+    conversation_id, chat_history = load_or_create_conversation(conversation_id, user_id)
+    if conversation_id is None:
+        return jsonify({'error': 'Conversation not found'}), 404
+
+    fallback_text = generate_fallback_text(structured_response)
+    chat_history += [
+        HumanMessage(content=question),
+        AIMessage(content=json.dumps({
+            "text": fallback_text,
+            "structured": structured_response
+        }))
+    ]
+    updated = save_conversation(conversation_id, chat_history)
+
+    return jsonify({
+        "bias_analysis": {
+            "nlp_based": nlp_based_bias_detector(question),
+            "gemini_based": None
+        },
+        "response": fallback_text,
+        "structured_response": structured_response,
+        "conversation_id": conversation_id,
+        "messages": updated,
+        "intent": "general",
+        "source": "structured_index",
+        "sentiment": detect_sentiment(question),
+        "meta": response_meta()
+    })
+
+def normalize_question(question):
+    """Case, whitespace and trailing punctuation don't change the answer"""
+    return " ".join(question.lower().split()).rstrip("?!. ")
+
+def classify_question(question):
+    """Stages that need no conversation: the structured index and intent detection"""
+    # Filter-style job/event questions are answered from the structured index
+    with span("structured_index"):
+        structured_response = answer_structured_query(question)
+    if structured_response:
+        return {"kind": "structured", "structured_response": structured_response}
+
+    # Intent detection
+    with span("intent"):
+        intent_result = detect_intent_within_budget(question, CHAT_ANSWER_RESERVE_SECONDS)
+    intent_type = intent_result.get("intent")
+    if intent_type in ["signup", "update_profile"]:
+        return {"kind": "intent", "intent": intent_type, "extracted_data": intent_result.get("data", {})}
+    return None
+
+def answer_with_history(question, chat_history):
+    """Sentiment, empowerment, bias and RAG stages for a question in its conversation"""
+    from langchain_core.messages import AIMessage
+
+    # Sentiment analysis and empowerment
+    with span("sentiment"):
+        sentiment = detect_sentiment(question)
+    received_empowering_response = any(
+        isinstance(msg, AIMessage) and "believing in yourself" in msg.content.lower()
+        for msg in chat_history
+    )
+
+    if sentiment == "negative" and not received_empowering_response:
+        with span("empowerment"):
+            empowering_message = get_pooled_empowering_response(
+                "women empowerment", [msg.content for msg in chat_history if isinstance(msg, AIMessage)])
+        return {"kind": "uplift", "response": empowering_message, "sentiment": sentiment}
+
+    # Bias detection; the Gemini analysis runs after the response (see bias_worker)
+    with span("bias_nlp"):
+        nlp_result = nlp_based_bias_detector(question)
+
+    # RAG processing
+    result = invoke_rag("chat", {"input": question, "chat_history": chat_history})
+    answer = result["answer"] or TIMED_OUT_MESSAGE
+
+    # Structure the response
+    with span("structure_response"):
+        structured_response = structure_rag_response(answer)
+
+    return {
+        "kind": "rag",
+        "bias_analysis": {
+            "nlp_based": nlp_result
+        },
+        "response": generate_fallback_text(structured_response),
+        "structured_response": structured_response,
+        "sentiment": sentiment,
+        "degraded": result.get("degraded", False)
+    }
+
+def answer_new_question(question):
+    """The whole pipeline for the first question of a new conversation"""
+    outcome = classify_question(question) or answer_with_history(question, [])
+    # Identical questions share this outcome, so it carries what the leader skipped
+    return dict(outcome, skipped=skipped_stages())
+
+def response_meta(outcome=None):
+    """What the request left out to answer inside its deadline"""
+    skipped = skipped_stages()
+    for stage in (outcome or {}).get("skipped", []):
+        if stage not in skipped:
+            skipped.append(stage)
+    return {
+        "deadline_seconds": CHAT_DEADLINE_SECONDS,
+        "skipped_stages": skipped,
+        "degraded": (outcome or {}).get("degraded", False)
+    }
+
+# Identical first questions in flight at the same time (e.g. after a campaign link goes
+# out) share one pipeline run. Questions with history are never coalesced.
+first_questions = SingleFlight("first_question")
+
 @chat_bp.route("/ask", methods=["POST"])
+@admission_controlled("/chat/ask", "rag_chat", CHAT_DEADLINE_SECONDS)
 def ask():
+    from langchain_core.messages import HumanMessage, AIMessage
     data = request.get_json()
     question = data.get("question")
     conversation_id = data.get("conversation_id")
+    # New conversations belong to the signed-in user, if the client says who that is
+    user_id = resolve_user_id(data.get("user_id") or request.headers.get("X-User-Id"))
 
     if not question:
         return jsonify({"error": "No question provided"}), 400
 
     try:
-        # Intent detection
-        intent_result = detect_intent_and_data(question)
-        intent_type = intent_result.get("intent")
-        extracted_data = intent_result.get("data", {})
+        if conversation_id:
+            outcome = classify_question(question)
+        else:
+            outcome, shared = first_questions.do(
+                f"{normalize_question(question)}|no-history",
+                lambda: answer_new_question(question)
+            )
+            if shared:
+                logging.debug(f"Coalesced first question '{normalize_question(question)[:60]}'")
+
+        if outcome and outcome["kind"] == "structured":
+            return answer_from_structured_index(question, conversation_id, outcome["structured_response"], user_id)
 
-        if intent_type in ["signup", "update_profile"]:
+        if outcome and outcome["kind"] == "intent":
             return jsonify({
-                "intent": intent_type,
-                "extracted_data": extracted_data,
-                "message": f"Intent identified as {intent_type.replace('_', ' ').title()}",
+                "intent": outcome["intent"],
+                "extracted_data": outcome["extracted_data"],
+                "message": f"Intent identified as {outcome['intent'].replace('_', ' ').title()}",
                 "conversation_id": conversation_id,
-               
+                "meta": response_meta(outcome)
             })
 
-        # Conversation history management
-        if conversation_id:
-            conversation = conversations_collection.find_one({'_id': ObjectId(conversation_id)})
-            if not conversation:
-                return jsonify({'error': 'Conversation not found'}), 404
-            chat_history = deserialize_messages(conversation['messages'])
-        else:
-            chat_history = []
-            conversation = {
-                'messages': [],
-                'created_at': datetime.now().isoformat(),
-                'updated_at': datetime.now().isoformat()
-            }
-            result = conversations_collection.insert_one(conversation)
-            conversation_id = str(result.inserted_id)
-
-        # Sentiment analysis and empowerment
-        sentiment = detect_sentiment(question)
-        received_empowering_response = any(
-            isinstance(msg, AIMessage) and "believing in yourself" in msg.content.lower()
-            for msg in chat_history
-        )
+        # Conversation history management; every request persists its own conversation
+        conversation_id, chat_history = load_or_create_conversation(conversation_id, user_id)
+        if conversation_id is None:
+            return jsonify({'error': 'Conversation not found'}), 404
 
-        if sentiment == "negative" and not received_empowering_response:
-            empowering_message = get_empowering_response(topic="women empowerment")
-            chat_history += [HumanMessage(content=question), AIMessage(content=empowering_message)]
-            updated = serialize_messages(chat_history)
+        if outcome is None:
+            outcome = answer_with_history(question, chat_history)
 
-            conversations_collection.update_one(
-                {'_id': ObjectId(conversation_id)},
-                {'$set': {'messages': updated, 'updated_at': datetime.now().isoformat()}}
-            )
+        if outcome["kind"] == "uplift":
+            chat_history += [HumanMessage(content=question), AIMessage(content=outcome["response"])]
+            save_conversation(conversation_id, chat_history)
 
             return jsonify({
-                "response": empowering_message,
+                "response": outcome["response"],
                 "conversation_id": conversation_id,
-                "sentiment": sentiment,
-                "intent": "uplift"
+                "sentiment": outcome["sentiment"],
+                "intent": "uplift",
+                "meta": response_meta(outcome)
             })
 
-        # Bias detection
-        nlp_result = nlp_based_bias_detector(question)
-        gemini_result = gemini_bias_detector(question)
-
-        # RAG processing
-        result = rag_chain.invoke({"input": question, "chat_history": chat_history})
-        answer = result["answer"]
-        
-        # Structure the response
-        structured_response = structure_rag_response(answer)
-        fallback_text = generate_fallback_text(structured_response)
-        
         # Update conversation history with both formats
+        turn = len(chat_history)
         chat_history += [
             HumanMessage(content=question),
             AIMessage(content=json.dumps({
-                "text": fallback_text,
-                "structured": structured_response
+                "text": outcome["response"],
+                "structured": outcome["structured_response"]
             }))
         ]
-        updated = serialize_messages(chat_history)
-
-        conversations_collection.update_one(
-            {'_id': ObjectId(conversation_id)},
-            {'$set': {'messages': updated, 'updated_at': datetime.now().isoformat()}}
-        )
+        updated = save_conversation(conversation_id, chat_history,
+                                    extra={f"bias_results.{turn}": bias_worker.pending_result()})
+        # Saved first, so the worker's result can't be overwritten by the pending marker
+        bias_status = bias_worker.submit(conversation_id, turn, question)
 
         return jsonify({
             "bias_analysis": {
-                "nlp_based": nlp_result,
-                "gemini_based": gemini_result
+                **outcome["bias_analysis"],
+                "gemini_based": None,
+                "gemini_status": bias_status,
+                "turn": turn,
+                "url": f"/chat/bias/{conversation_id}/{turn}"
             },
-            "response": fallback_text,
-            "structured_response": structured_response,
+            "response": outcome["response"],
+            "structured_response": outcome["structured_response"],
             "conversation_id": conversation_id,
             "messages": updated,
             "intent": "general",
-            "sentiment": sentiment
+            "sentiment": outcome["sentiment"],
+            "meta": response_meta(outcome)
         })
 
+    except LoadShed:
+        raise
+    except DeadlineExceeded as e:
+        logging.warning(f"Chat request ran out of time in {e.stage or 'an unknown stage'}")
+        return jsonify({
+            "error": TIMED_OUT_MESSAGE,
+            "conversation_id": conversation_id,
+            "meta": response_meta()
+        }), 504
     except Exception as e:
         logging.error(f"Chat error: {str(e)}", exc_info=True)
         return jsonify({
             "error": "Unable to process request",
             "details": str(e)
-        }), 500
\ No newline at end of file
+        }), 500
+
+@chat_bp.route("/bias/<conversation_id>/<int:turn>", methods=["GET"])
+def get_bias_result(conversation_id, turn):
+    """
+    Gemini bias analysis of the question at messages[turn]. Plain GET answers 202 while
+    it is pending; with Accept: text/event-stream (or ?stream=1) the result is sent as a
+    "bias" event once it's ready.
+    """
+    if not ObjectId.is_valid(conversation_id):
+        return jsonify({"error": "Invalid conversation id"}), 400
+    try:
+        result = bias_worker.get_result(conversation_id, turn)
+    except KeyError:
+        return jsonify({"error": "Conversation not found"}), 404
+    if result is None:
+        return jsonify({"error": "No bias analysis for this turn", "status": "unknown"}), 404
+
+    streaming = request.args.get("stream") == "1" or "text/event-stream" in request.headers.get("Accept", "")
+    if not streaming:
+        return jsonify({"conversation_id": conversation_id, "turn": turn, **result}), \
+            202 if result.get("status") == "pending" else 200
+
+    def events(result):
+        waited = 0.0
+        while result.get("status") == "pending" and waited < BIAS_STREAM_SECONDS:
+            yield ": waiting\n\n"
+            step = min(BIAS_KEEPALIVE_SECONDS, BIAS_STREAM_SECONDS - waited)
+            result = bias_worker.wait_for_result(conversation_id, turn, step) or result
+            waited += step
+        payload = {"conversation_id": conversation_id, "turn": turn, **result}
+        yield f"event: bias\ndata: {json.dumps(payload)}\n\n"
+
+    return Response(stream_with_context(events(result)), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@chat_bp.route("/rag_profiles/latency", methods=["GET"])
+def rag_profile_latency():
+    return jsonify(get_profile_latency_stats())
+
+@chat_bp.route("/rag/reload", methods=["POST"])
+def reload_rag_corpus():
+    """
+    Rebuild the index for the current PDFs in the background and swap it in on this
+    worker; the other workers' corpus watchers pick up the same version (or, with
+    ?force=1, the force request) on their next poll.
+    """
+    if not RAG_ADMIN_TOKEN:
+        return jsonify({"error": "Corpus reload is disabled: RAG_ADMIN_TOKEN is not set"}), 403
+    supplied = request.headers.get("Authorization", "").encode("utf-8")
+    if not hmac.compare_digest(supplied, f"Bearer {RAG_ADMIN_TOKEN}".encode("utf-8")):
+        return jsonify({"error": "Unauthorized"}), 401
+
+    started = request_reload(force=request.args.get("force") == "1")
+    return jsonify({"status": "reloading" if started else "already_reloading",
+                    "serving": corpus_status()}), 202
+
+@chat_bp.route("/rag/version", methods=["GET"])
+def rag_corpus_version():
+    return jsonify(corpus_status())
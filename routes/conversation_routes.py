@@ -1,7 +1,10 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request
 from flask_cors import CORS
 from bson import ObjectId
 from config import conversations_collection
+from service.archive_service import rehydrate_conversation, forget_archived
+from service.conversation_search import search_conversations, remove_conversation, SEARCH_PAGE_SIZE
+from service.conversation_store import list_conversations, resolve_user_id, LIST_PAGE_SIZE
 
 conversation_bp = Blueprint('conversation', __name__)
 CORS(conversation_bp)
@@ -9,18 +12,46 @@ CORS(conversation_bp)
 
 @conversation_bp.route('/conversations', methods=['GET'])
 def get_conversations():
-    conversations = list(conversations_collection.find({}, {'messages': 0}).sort('updated_at', -1).limit(20))
-    for conv in conversations:
-        conv['_id'] = str(conv['_id'])
-    return jsonify(conversations)
+    """
+    Latest conversations of ?user_id= (or the X-User-Id header); everyone's when neither
+    is given. Pass the X-Next-Cursor response header back as ?cursor= for the next page.
+    """
+    raw_user_id = request.args.get('user_id') or request.headers.get('X-User-Id')
+    user_id = resolve_user_id(raw_user_id)
+    if raw_user_id and user_id is None:
+        return jsonify({'error': 'Invalid user id'}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', LIST_PAGE_SIZE)), 1), 100)
+        conversations, next_cursor = list_conversations(user_id, request.args.get('cursor'), limit,
+                                                        all_users=user_id is None)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    response = jsonify(conversations)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+@conversation_bp.route('/search', methods=['GET'])
+def search():
+    """Ranked conversations whose messages match ?q=, with snippets; ?page=&page_size="""
+    query = (request.args.get('q') or '').strip()
+    if not query:
+        return jsonify({'error': 'No query provided'}), 400
+    try:
+        page = max(int(request.args.get('page', 1)), 1)
+        page_size = min(max(int(request.args.get('page_size', SEARCH_PAGE_SIZE)), 1), 50)
+    except ValueError:
+        return jsonify({'error': 'page and page_size must be numbers'}), 400
+    return jsonify(search_conversations(query, page, page_size))
 
 @conversation_bp.route('/conversation/<conversation_id>', methods=['GET'])
 def get_conversation(conversation_id):
     try:
         conversation = conversations_collection.find_one({'_id': ObjectId(conversation_id)})
+        if not conversation:
+            conversation = rehydrate_conversation(conversation_id)
         if not conversation:
             return jsonify({'error': 'Conversation not found'}), 404
-        conversation['_id'] = str(conversation['_id'])
         return jsonify(conversation)
     except:
         return jsonify({'error': 'Invalid conversation ID'}), 400
@@ -29,8 +60,9 @@ def get_conversation(conversation_id):
 def delete_conversation(conversation_id):
     try:
         result = conversations_collection.delete_one({'_id': ObjectId(conversation_id)})
-        if result.deleted_count == 0:
+        if result.deleted_count == 0 and not forget_archived(conversation_id):
             return jsonify({'error': 'Conversation not found'}), 404
+        remove_conversation(conversation_id)
         return jsonify({'status': 'success'})
     except:
         return jsonify({'error': 'Invalid conversation ID'}), 400
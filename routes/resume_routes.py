@@ -1,9 +1,13 @@
+import os
 from flask import Blueprint, request, jsonify
 from service.resume_service import extract_text_from_resume, analyze_resume
+from utils.admission import admission_controlled, LoadShed
 
 resume_bp = Blueprint('resume', __name__)
+RESUME_DEADLINE_SECONDS = float(os.getenv("RESUME_DEADLINE_SECONDS", "60"))
 
 @resume_bp.route('/analyze_resume', methods=['POST'])
+@admission_controlled("/resume/analyze_resume", "resume_analysis", RESUME_DEADLINE_SECONDS)
 def analyze_resume_route():
     if 'file' not in request.files:
         return jsonify({'error': 'No resume file uploaded'}), 400
@@ -13,5 +17,7 @@ def analyze_resume_route():
         resume_text = extract_text_from_resume(file)
         analysis = analyze_resume(resume_text)
         return jsonify(analysis)
+    except LoadShed:
+        raise
     except Exception as e:
         return jsonify({'error': str(e)}), 500
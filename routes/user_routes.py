@@ -2,16 +2,24 @@ from flask import Blueprint, request, jsonify
 from config import users_collection, conversations_collection
 from bson import ObjectId
 from datetime import datetime
+import os
 import re
+import hmac
 from flask_cors import CORS
 import logging
+from service.user_store import sign_up_user, update_user_profile, import_users, PhoneInUse
+from service.job_matcher import recommend_jobs, RECOMMENDED_JOBS_LIMIT
+from utils.metrics import span
 
 user_bp = Blueprint("user", __name__)
-CORS(user_bp, origins=["http://localhost:5173"], methods=["POST"], allow_headers=["Content-Type"])
+CORS(user_bp, origins=["http://localhost:5173"], methods=["GET", "POST"], allow_headers=["Content-Type"])
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
 
+# /bulk_import requires "Authorization: Bearer <token>"; it is disabled while this is unset
+BULK_IMPORT_TOKEN = os.getenv("BULK_IMPORT_TOKEN")
+
 def is_valid_email(email):
     return re.match(r"[^@]+@[^@]+\.[^@]+", email)
 
@@ -32,38 +40,23 @@ def sign_up():
             if not data.get(field):
                 return jsonify({"error": f"Missing required field: {field}"}), 400
 
-        # Check existing users
-        phone = data.get("phone", "").strip()
-        if phone and users_collection.find_one({"phone": phone}):
+        # Create the user, or find the existing one, in a single upsert
+        try:
+            user, created = sign_up_user(email, data)
+        except PhoneInUse:
             return jsonify({"error": "Phone number already in use"}), 409
 
-        existing_user = users_collection.find_one({"email": email})
-        if existing_user:
+        if not created:
             return jsonify({
                 "message": "User already exists",
-                "user_id": str(existing_user["_id"]),
-                "user": format_user(existing_user)
+                "user_id": str(user["_id"]),
+                "user": format_user(user)
             }), 200
 
-        # Create new user
-        new_user = {
-            "name": data["name"].strip(),
-            "email": email,
-            "phone": phone,
-            "skills": data.get("skills", []),
-            "bio": data.get("bio", "").strip(),
-            "created_at": datetime.utcnow().isoformat(),
-            "updated_at": datetime.utcnow().isoformat()
-        }
-
-        # Database insertion
-        user_result = users_collection.insert_one(new_user)
-        new_user_data = users_collection.find_one({"_id": user_result.inserted_id})
-
         return jsonify({
             "message": "User signed up successfully",
-            "user_id": str(new_user_data["_id"]),
-            "user": format_user(new_user_data)
+            "user_id": str(user["_id"]),
+            "user": format_user(user)
         }), 201
 
     except Exception as e:
@@ -81,10 +74,6 @@ def update_profile():
         if not email or not is_valid_email(email):
             return jsonify({"error": "Valid email is required to update profile"}), 400
 
-        user = users_collection.find_one({"email": email})
-        if not user:
-            return jsonify({"error": "User not found"}), 404
-
         update_fields = {}
         allowed_fields = ["name", "phone", "skills", "bio"]
         for field in allowed_fields:
@@ -96,8 +85,12 @@ def update_profile():
             return jsonify({"error": "No fields provided for update"}), 400
 
         update_fields["updated_at"] = datetime.utcnow().isoformat()
-        users_collection.update_one({"_id": user["_id"]}, {"$set": update_fields})
-        updated_user = users_collection.find_one({"_id": user["_id"]})
+        try:
+            updated_user = update_user_profile(email, update_fields)
+        except PhoneInUse:
+            return jsonify({"error": "Phone number already in use"}), 409
+        if not updated_user:
+            return jsonify({"error": "User not found"}), 404
 
         return jsonify({
             "message": "Profile updated successfully",
@@ -110,6 +103,68 @@ def update_profile():
         logging.error(f"Update profile error: {str(e)}")
         return jsonify({"error": "Internal server error"}), 500
 
+@user_bp.route("/bulk_import", methods=["POST"])
+def bulk_import():
+    """
+    Import partner-sourced candidates from a CSV (header: name,email,phone,skills,bio)
+    or JSONL body, or from an uploaded "file". Rows are validated and written as they
+    stream in; existing users are left untouched unless ?on_conflict=update.
+    """
+    if not BULK_IMPORT_TOKEN:
+        return jsonify({"error": "Bulk import is disabled: BULK_IMPORT_TOKEN is not set"}), 403
+    supplied = request.headers.get("Authorization", "").encode("utf-8")
+    if not hmac.compare_digest(supplied, f"Bearer {BULK_IMPORT_TOKEN}".encode("utf-8")):
+        return jsonify({"error": "Unauthorized"}), 401
+
+    upload = request.files.get("file") if request.mimetype == "multipart/form-data" else None
+    filename = upload.filename if upload else ""
+    fmt = request.args.get("format") or (
+        "csv" if filename.endswith(".csv") or request.mimetype == "text/csv" else "jsonl"
+    )
+    if fmt not in ("csv", "jsonl"):
+        return jsonify({"error": "format must be csv or jsonl"}), 400
+
+    try:
+        report = import_users(
+            upload.stream if upload else request.stream,
+            fmt,
+            is_valid_email,
+            source=request.args.get("source", "bulk_import"),
+            update_existing=request.args.get("on_conflict") == "update"
+        )
+        return jsonify(report), 200
+    except Exception as e:
+        logging.error(f"Bulk import error: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
+@user_bp.route("/<user_id>/recommended_jobs", methods=["GET"])
+def recommended_jobs(user_id):
+    """
+    Jobs ranked against the user's profile skills and bio from the skill index.
+    ?skills=a,b adds skills not yet on the profile (e.g. extracted from chat); ?limit=N.
+    """
+    try:
+        if not ObjectId.is_valid(user_id):
+            return jsonify({"error": "Invalid user id"}), 400
+        try:
+            limit = min(max(int(request.args.get("limit", RECOMMENDED_JOBS_LIMIT)), 1), 50)
+        except ValueError:
+            return jsonify({"error": "limit must be a number"}), 400
+
+        with span("mongo_read", collection="users"):
+            user = users_collection.find_one({"_id": ObjectId(user_id)},
+                                             {"skills": 1, "bio": 1, "updated_at": 1})
+        if not user:
+            return jsonify({"error": "User not found"}), 404
+
+        with span("job_match"):
+            jobs = recommend_jobs(user, extra_skills=request.args.get("skills"), limit=limit)
+        return jsonify({"user_id": user_id, "jobs": jobs}), 200
+
+    except Exception as e:
+        logging.error(f"Recommended jobs error: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
 def format_user(user):
     return {
         "name": user.get("name", ""),
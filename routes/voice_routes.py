@@ -1,41 +1,66 @@
 import os
+import logging
+from functools import partial
 from flask import Blueprint, request, Response, url_for, jsonify
-from twilio.rest import Client
 from twilio.twiml.voice_response import VoiceResponse, Gather
 from flask_cors import CORS
 from bson import ObjectId
 from datetime import datetime
 from config import conversations_collection
-from service.rag_service import initialize_rag_system
-from utils.serialization import serialize_messages, deserialize_messages
-from service.bias_service import nlp_based_bias_detector, gemini_bias_detector
-from service.intent_service import detect_intent_and_data
+from service.rag_service import invoke_rag
+from utils.serialization import serialize_messages
+from service.intent_service import detect_intent_within_budget
 from service.sentiment_service import detect_sentiment
-from service.gemini_service import get_empowering_response
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
-import phonenumbers
+from service.empowerment_pool import get_pooled_empowering_response
+from service.structured_index import answer_structured_query
+from service.voice_worker import submit_turn, poll_turn, VOICE_POLL_INTERVAL_SECONDS, VOICE_TURN_BUDGET_SECONDS
+from service.call_session_store import call_sessions, TERMINAL_CALL_STATUSES
+from service.conversation_store import resolve_user_id
+from utils.metrics import span
+from utils.admission import check_rate_limit, get_limiter, LoadShed
+from utils.deadline import skipped_stages, mongo_timeout, DeadlineExceeded
 
 voice_bp = Blueprint('voice', __name__)
-rag_chain = initialize_rag_system()
+# The intent LLM only runs while the spoken answer still has this long of the turn budget
+VOICE_ANSWER_RESERVE_SECONDS = float(os.getenv("VOICE_ANSWER_RESERVE_SECONDS", "6"))
 account_sid = os.environ.get("TWILIO_ACCOUNT_SID")
 auth_token = os.environ.get("TWILIO_AUTH_TOKEN")
-client = Client(account_sid, auth_token)
+_client = None
+
+def get_twilio_client():
+    """Create the Twilio REST client on first use"""
+    global _client
+    if _client is None:
+        from twilio.rest import Client
+        _client = Client(account_sid, auth_token)
+    return _client
 
 def validate_phone_number(number):
+    import phonenumbers
     try:
         parsed = phonenumbers.parse(number, None)
         return phonenumbers.is_valid_number(parsed)
     except:
         return False
 
-def create_new_conversation():
-    new_chat = [SystemMessage(content="You are a helpful voice assistant for women's career support.")]
-    inserted = conversations_collection.insert_one({
-        "messages": serialize_messages(new_chat),
+def initial_messages():
+    """Serialized history every new voice conversation starts with"""
+    from langchain_core.messages import SystemMessage
+    return serialize_messages([SystemMessage(content="You are a helpful voice assistant for women's career support.")])
+
+def create_new_conversation(call_sid=None, user_id=None, phone=None):
+    conversation = {
+        "messages": initial_messages(),
+        "user_id": resolve_user_id(user_id, phone=phone),
         "created_at": datetime.now().isoformat(),
         "updated_at": datetime.now().isoformat(),
         "call_status": "in-progress"
-    })
+    }
+    if call_sid:
+        conversation["call_sid"] = call_sid
+    if phone:
+        conversation["phone"] = phone
+    inserted = conversations_collection.insert_one(conversation)
     return str(inserted.inserted_id)
 
 @voice_bp.route("/make_call", methods=["GET"])
@@ -44,8 +69,8 @@ def make_call():
     
 
     try:
-        conversation_id = create_new_conversation()
-        call = client.calls.create(
+        conversation_id = create_new_conversation(user_id=request.args.get('user_id'), phone=to_phone)
+        call = get_twilio_client().calls.create(
             url=url_for('voice.voice', _external=True),
             to=to_phone,
             from_="+15675571541",
@@ -57,6 +82,7 @@ def make_call():
             {'_id': ObjectId(conversation_id)},
             {'$set': {'call_sid': call.sid}}
         )
+        call_sessions.register(call.sid, conversation_id, initial_messages())
         return jsonify({"status": "success", "call_sid": call.sid, "conversation_id": conversation_id})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -65,7 +91,12 @@ def make_call():
 def voice():
     try:
         response = VoiceResponse()
-        conversation_id = create_new_conversation()
+        call_sid = request.form.get('CallSid')
+        # Reuse the conversation make_call created for this CallSid, if any
+        caller = request.form.get('From')
+        session = call_sessions.open(call_sid, lambda: create_new_conversation(call_sid, phone=caller),
+                                     initial_messages())
+        conversation_id = session.conversation_id
         
         action_url = url_for('voice.handle_recording', conversation_id=conversation_id, _external=True)
         transcribe_callback = url_for('voice.handle_transcription', conversation_id=conversation_id, _external=True)
@@ -102,6 +133,72 @@ def handle_recording():
     except Exception as e:
         return Response(str(VoiceResponse().hangup()), mimetype='application/xml')
 
+def record_next_turn(response, conversation_id):
+    """Ask the caller for their next question"""
+    response.record(
+        action=url_for('voice.handle_recording', conversation_id=conversation_id, _external=True),
+        max_length=30,
+        transcribe=True,
+        transcribe_callback=url_for('voice.handle_transcription', conversation_id=conversation_id, _external=True),
+        play_beep=True
+    )
+    return response
+
+def process_voice_turn(conversation_id, transcription, call_sid=None):
+    """Run intent, sentiment and RAG for one caller turn and return the spoken answer"""
+    with mongo_timeout():
+        session = call_sessions.get(call_sid=call_sid, conversation_id=conversation_id)
+    if not session:
+        raise ValueError("Conversation not found")
+
+    # A call that hangs up now is flushed and dropped only after this turn is saved
+    with call_sessions.turn(session):
+        return answer_voice_turn(session, conversation_id, transcription)
+
+def answer_voice_turn(session, conversation_id, transcription):
+    """Intent, sentiment and RAG stages of a voice turn"""
+    from langchain_core.messages import HumanMessage, AIMessage
+    chat_history = call_sessions.history(session)
+
+    # Intent detection
+    with span("intent", channel="voice"):
+        intent_result = detect_intent_within_budget(transcription, VOICE_ANSWER_RESERVE_SECONDS)
+    intent_type = intent_result.get("intent")
+
+    if intent_type in ["signup", "update_profile"]:
+        return f"Let's handle your {intent_type.replace('_', ' ')} request. Please provide more details."
+
+    # Sentiment analysis
+    with span("sentiment", channel="voice"):
+        sentiment = detect_sentiment(transcription)
+    if sentiment == "negative":
+        try:
+            answer = get_pooled_empowering_response(
+                "career support", [msg.content for msg in chat_history if isinstance(msg, AIMessage)])
+        except DeadlineExceeded:
+            answer = quick_answer(transcription)
+    else:
+        # RAG response generation; past the turn budget this is built from the top chunks
+        result = invoke_rag("voice", {"input": transcription, "chat_history": chat_history})
+        answer = result["answer"] or quick_answer(transcription)
+    if skipped_stages():
+        logging.info(f"Voice turn for {conversation_id} skipped {', '.join(skipped_stages())}")
+
+    # Written to Mongo before the caller hears the answer, so any worker can take the next turn
+    call_sessions.append_turn(session, [
+        HumanMessage(content=transcription),
+        AIMessage(content=answer)
+    ])
+    return answer
+
+def quick_answer(transcription):
+    """Degraded answer for a turn that ran out of budget"""
+    structured = answer_structured_query(transcription)
+    if structured:
+        return f"Here is a quick answer. {structured['summary']}."
+    return ("Sorry, that is taking longer than expected. "
+            "I've saved your question, so please ask again in a moment or try another question.")
+
 @voice_bp.route("/handle_transcription", methods=["POST"])
 def handle_transcription():
     conversation_id = request.args.get('conversation_id')
@@ -109,82 +206,79 @@ def handle_transcription():
         return Response(str(VoiceResponse().say("Session error").hangup()), mimetype='application/xml')
 
     try:
-        conversation = conversations_collection.find_one({'_id': ObjectId(conversation_id)})
-        if not conversation:
-            raise ValueError("Conversation not found")
-            
-        chat_history = deserialize_messages(conversation['messages'])
         transcription = request.form.get('TranscriptionText', '')
-        
         response = VoiceResponse()
-        
-        # Process only if there's actual text
+
+        # Process only if there's actual text; the answer is produced in the background
         if transcription.strip():
-            # Intent detection
-            intent_result = detect_intent_and_data(transcription)
-            intent_type = intent_result.get("intent")
-            
-            if intent_type in ["signup", "update_profile"]:
-                response.say(f"Let's handle your {intent_type.replace('_', ' ')} request. Please provide more details.")
-            else:
-                # Sentiment analysis
-                sentiment = detect_sentiment(transcription)
-                if sentiment == "negative":
-                    empowering_msg = get_empowering_response(topic="career support")
-                    response.say(empowering_msg)
-                    chat_history.extend([
-                        HumanMessage(content=transcription),
-                        AIMessage(content=empowering_msg)
-                    ])
-                else:
-                    # RAG response generation
-                    result = rag_chain.invoke({"input": transcription, "chat_history": chat_history})
-                    answer = result["answer"]
-                    response.say(answer)
-                    chat_history.extend([
-                        HumanMessage(content=transcription),
-                        AIMessage(content=answer)
-                    ])
-                
-                # Update conversation history
-                conversations_collection.update_one(
-                    {'_id': ObjectId(conversation_id)},
-                    {'$set': {
-                        'messages': serialize_messages(chat_history),
-                        'updated_at': datetime.now().isoformat()
-                    }}
-                )
+            try:
+                caller = request.form.get('From') or request.form.get('CallSid') or conversation_id
+                check_rate_limit(f"caller:{caller}", "/voice/handle_transcription")
+                get_limiter("rag_voice").check(VOICE_TURN_BUDGET_SECONDS)
+            except LoadShed:
+                # Twilio can't retry a 503, so tell the caller instead
+                response.say("I'm getting a lot of questions right now. Please ask again in a moment.")
+                return Response(str(record_next_turn(response, conversation_id)), mimetype='application/xml')
+
+            process_fn = partial(process_voice_turn, call_sid=request.form.get('CallSid'))
+            turn_id = submit_turn(process_fn, conversation_id, transcription)
+            response.say("Thanks. Give me a moment while I look that up.")
+            response.redirect(
+                url_for('voice.poll_answer', conversation_id=conversation_id, turn_id=turn_id, _external=True),
+                method="POST"
+            )
+            return Response(str(response), mimetype='application/xml')
 
         # Continue conversation
-        response.record(
-            action=url_for('voice.handle_recording', conversation_id=conversation_id, _external=True),
-            max_length=30,
-            transcribe=True,
-            transcribe_callback=url_for('voice.handle_transcription', conversation_id=conversation_id, _external=True),
-            play_beep=True
-        )
-        return Response(str(response), mimetype='application/xml')
+        return Response(str(record_next_turn(response, conversation_id)), mimetype='application/xml')
 
     except Exception as e:
         error_response = VoiceResponse()
         error_response.say("Sorry, I encountered an error processing your request. Please try again.")
-        error_response.record(
-            action=url_for('voice.handle_recording', conversation_id=conversation_id, _external=True),
-            max_length=30,
-            transcribe=True,
-            transcribe_callback=url_for('voice.handle_transcription', conversation_id=conversation_id, _external=True)
-        )
+        record_next_turn(error_response, conversation_id)
         return Response(str(error_response), mimetype='application/xml')
 
+@voice_bp.route("/poll_answer", methods=["POST"])
+def poll_answer():
+    conversation_id = request.args.get('conversation_id')
+    turn_id = request.args.get('turn_id')
+    if not conversation_id or not turn_id:
+        return Response(str(VoiceResponse().say("Session error").hangup()), mimetype='application/xml')
+
+    response = VoiceResponse()
+    status, turn, answer = poll_turn(turn_id)
+
+    if status == "pending":
+        response.pause(length=VOICE_POLL_INTERVAL_SECONDS)
+        response.redirect(
+            url_for('voice.poll_answer', conversation_id=conversation_id, turn_id=turn_id, _external=True),
+            method="POST"
+        )
+        return Response(str(response), mimetype='application/xml')
+
+    if status == "ready":
+        response.say(answer)
+    elif status == "expired":
+        response.say(quick_answer(turn["transcription"]))
+    else:
+        response.say("Sorry, I encountered an error processing your request. Please try again.")
+
+    # Continue conversation
+    return Response(str(record_next_turn(response, conversation_id)), mimetype='application/xml')
+
 @voice_bp.route("/call_status", methods=["POST"])
 def call_status():
     try:
         status = request.form.get('CallStatus')
         call_sid = request.form.get('CallSid')
-        conversations_collection.update_one(
-            {'call_sid': call_sid},
-            {'$set': {'call_status': status}}
-        )
+        if status in TERMINAL_CALL_STATUSES:
+            # Final flush of buffered turns before the session is dropped
+            call_sessions.close(call_sid, status=status)
+        else:
+            conversations_collection.update_one(
+                {'call_sid': call_sid},
+                {'$set': {'call_status': status}}
+            )
         return jsonify({"status": "updated"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
\ No newline at end of file
@@ -35,7 +35,11 @@ def fetch_realtime_data(source):
             params=config["params"],
             timeout=10
         )
-        return response.json().get("data" if source != "jobs" else "jobs", [])
+        results = response.json().get("data" if source != "jobs" else "jobs", [])
+        if source == "jobs":
+            from service.job_matcher import ingest_jobs
+            ingest_jobs(results)
+        return results
     except Exception as e:
         print(f"API Error ({source}): {str(e)}")
         return []
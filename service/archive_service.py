@@ -0,0 +1,299 @@
+"""
+Moves conversations idle for ARCHIVE_AFTER_DAYS out of the conversations collection.
+
+Cold conversations are BSON-encoded and compressed in batches of up to
+ARCHIVE_BATCH_SIZE conversations and ARCHIVE_BATCH_MAX_BYTES (zstd when available,
+gzip otherwise). Each batch is one document in conversations_archive listing the ids
+it holds; with ARCHIVE_BACKEND=files the compressed blob is written under ARCHIVE_DIR
+instead. Reading an archived id through rehydrate_conversation() puts it back.
+
+    python -m service.archive_service            # one pass
+    python -m service.archive_service --loop     # keep archiving every ARCHIVE_INTERVAL_SECONDS
+"""
+import os
+import gzip
+import time
+import logging
+import argparse
+from datetime import datetime, timedelta
+import bson
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import DeleteOne, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from config import conversations_collection, conversations_archive_collection
+from utils.metrics import inc, span
+
+ARCHIVE_AFTER_DAYS = float(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "200"))
+# Batches are also cut by encoded size, so an inline blob stays under Mongo's 16 MB
+# document limit; a blob that is still too large (one huge conversation) goes to a file.
+ARCHIVE_BATCH_MAX_BYTES = int(os.getenv("ARCHIVE_BATCH_MAX_BYTES", str(12 * 1024 * 1024)))
+INLINE_BLOB_MAX_BYTES = 15 * 1024 * 1024
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))
+ARCHIVE_BACKEND = os.getenv("ARCHIVE_BACKEND", "mongo")   # "mongo" or "files"
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "data/archive")
+ARCHIVE_ZSTD_LEVEL = int(os.getenv("ARCHIVE_ZSTD_LEVEL", "10"))
+
+try:
+    import zstandard
+except ImportError:  # optional: gzip only
+    zstandard = None
+
+ARCHIVE_CODEC = os.getenv("ARCHIVE_CODEC") or ("zstd" if zstandard is not None else "gzip")
+CODEC_EXTENSIONS = {"zstd": "zst", "gzip": "gz"}
+
+_indexes_ready = False
+
+
+def ensure_indexes():
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    conversations_collection.create_index([("updated_at", 1), ("_id", 1)])
+    conversations_archive_collection.create_index("conversation_ids")
+    conversations_archive_collection.create_index("status")
+    _indexes_ready = True
+
+
+def compress(data, codec=ARCHIVE_CODEC):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=ARCHIVE_ZSTD_LEVEL).compress(data)
+    return gzip.compress(data, compresslevel=9)
+
+
+def decompress(data, codec):
+    if codec == "zstd":
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def _store_blob(batch_id, blob, codec):
+    """Where the compressed batch lives: inline in the archive document or in a local file"""
+    if ARCHIVE_BACKEND != "files":
+        if len(blob) <= INLINE_BLOB_MAX_BYTES:
+            return {"blob": bson.Binary(blob)}
+        logging.warning(f"Archive batch {batch_id} is {len(blob)} bytes compressed, "
+                        f"too large to store inline; writing it under {ARCHIVE_DIR}")
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    path = os.path.join(ARCHIVE_DIR, f"{batch_id}.bson.{CODEC_EXTENSIONS[codec]}")
+    with open(path + ".tmp", "wb") as f:
+        f.write(blob)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+    return {"path": path}
+
+
+def _load_blob(batch):
+    if batch.get("path"):
+        with open(batch["path"], "rb") as f:
+            return f.read()
+    return bytes(batch["blob"])
+
+
+def _drop_batch(batch):
+    conversations_archive_collection.delete_one({"_id": batch["_id"]})
+    if batch.get("path"):
+        try:
+            os.remove(batch["path"])
+        except OSError:
+            pass
+
+
+def cold_query(cutoff):
+    """Conversations idle since cutoff that weren't rehydrated recently"""
+    return {
+        "updated_at": {"$lt": cutoff},
+        "call_status": {"$ne": "in-progress"},
+        "$or": [{"rehydrated_at": {"$exists": False}}, {"rehydrated_at": {"$lt": cutoff}}],
+    }
+
+
+def size_capped(conversations, max_bytes=ARCHIVE_BATCH_MAX_BYTES):
+    """Split conversations into (conversations, encoded) runs of at most max_bytes of BSON"""
+    run, encoded, size = [], [], 0
+    for conversation in conversations:
+        data = bson.encode(conversation)
+        if run and size + len(data) > max_bytes:
+            yield run, encoded
+            run, encoded, size = [], [], 0
+        run.append(conversation)
+        encoded.append(data)
+        size += len(data)
+    if run:
+        yield run, encoded
+
+
+def archive_batch(conversations, encoded=None):
+    """Compress conversations into one archive batch and remove them; returns (archived, raw, stored)"""
+    encoded = encoded or [bson.encode(conversation) for conversation in conversations]
+    raw_bytes = sum(len(data) for data in encoded)
+    blob = compress(b"".join(encoded))
+    batch_id = ObjectId()
+    ids = [conversation["_id"] for conversation in conversations]
+
+    # 1. The batch is written "pending" first: a crash from here on leaves both copies,
+    #    and repair_pending() keeps whichever one is authoritative.
+    with span("mongo_write", collection="conversations_archive"):
+        conversations_archive_collection.insert_one(dict(
+            _store_blob(batch_id, blob, ARCHIVE_CODEC),
+            _id=batch_id, status="pending", codec=ARCHIVE_CODEC, conversation_ids=ids,
+            raw_bytes=raw_bytes, stored_bytes=len(blob), created_at=datetime.now().isoformat()
+        ))
+
+    # 2. Delete only conversations nobody wrote to since we read them
+    with span("mongo_write", collection="conversations"):
+        conversations_collection.bulk_write(
+            [DeleteOne({"_id": c["_id"], "updated_at": c.get("updated_at")}) for c in conversations],
+            ordered=False
+        )
+    return _settle(batch_id, ids, raw_bytes, len(blob))
+
+
+def _settle(batch_id, ids, raw_bytes, stored_bytes):
+    """Drop ids that are still live from a batch and mark it done"""
+    still_live = {c["_id"] for c in conversations_collection.find({"_id": {"$in": ids}}, {"_id": 1})}
+    archived = [i for i in ids if i not in still_live]
+    if not archived:
+        _drop_batch(conversations_archive_collection.find_one({"_id": batch_id}) or {"_id": batch_id})
+        return 0, 0, 0
+    conversations_archive_collection.update_one(
+        {"_id": batch_id}, {"$set": {"status": "done", "conversation_ids": archived}}
+    )
+    if still_live:
+        # Conversations written to mid-archive stay live; their bytes don't count as reclaimed
+        raw_bytes = raw_bytes * len(archived) // len(ids)
+    return len(archived), raw_bytes, stored_bytes
+
+
+def repair_pending():
+    """Finish batches left pending by an interrupted run"""
+    repaired = 0
+    for batch in conversations_archive_collection.find({"status": "pending"}, {"blob": 0}):
+        _settle(batch["_id"], batch["conversation_ids"], batch["raw_bytes"], batch["stored_bytes"])
+        repaired += 1
+    if repaired:
+        logging.info(f"Archive: settled {repaired} batches left pending by an interrupted run")
+    return repaired
+
+
+def run_archive(max_age_days=ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH_SIZE, dry_run=False):
+    """
+    Archive every cold conversation, one batch at a time. Safe to interrupt and rerun:
+    archived conversations leave the scan, and pending batches are settled first.
+    """
+    ensure_indexes()
+    started = time.perf_counter()
+    report = {"conversations": 0, "batches": 0, "raw_bytes": 0, "stored_bytes": 0}
+    if not dry_run:
+        repair_pending()
+
+    cutoff = (datetime.now() - timedelta(days=max_age_days)).isoformat()
+    query = cold_query(cutoff)
+    # Keyset over (updated_at, _id) so conversations that can't be removed aren't re-read
+    last = None
+    while True:
+        page_query = query if last is None else {"$and": [query, {"$or": [
+            {"updated_at": {"$gt": last[0]}},
+            {"updated_at": last[0], "_id": {"$gt": last[1]}},
+        ]}]}
+        with span("mongo_read", collection="conversations"):
+            conversations = list(conversations_collection.find(page_query)
+                                 .sort([("updated_at", 1), ("_id", 1)]).limit(batch_size))
+        if not conversations:
+            break
+        last = (conversations[-1].get("updated_at"), conversations[-1]["_id"])
+
+        for batch, encoded in size_capped(conversations):
+            if dry_run:
+                archived, raw, stored = len(encoded), sum(map(len, encoded)), len(compress(b"".join(encoded)))
+            else:
+                archived, raw, stored = archive_batch(batch, encoded)
+            report["conversations"] += archived
+            report["batches"] += 1 if archived else 0
+            report["raw_bytes"] += raw
+            report["stored_bytes"] += stored
+            inc("conversations_archived_total", archived)
+            inc("archive_bytes_total", raw, kind="raw")
+            inc("archive_bytes_total", stored, kind="stored")
+
+    report["bytes_reclaimed"] = report["raw_bytes"] - report["stored_bytes"]
+    report["seconds"] = round(time.perf_counter() - started, 3)
+    report["codec"] = ARCHIVE_CODEC
+    report["dry_run"] = dry_run
+    logging.info(f"Archive: {report['conversations']} conversations in {report['batches']} batches, "
+                 f"{report['raw_bytes']} -> {report['stored_bytes']} bytes "
+                 f"({report['bytes_reclaimed']} reclaimed) in {report['seconds']} s")
+    return report
+
+
+def rehydrate_conversation(conversation_id):
+    """Move an archived conversation back into the conversations collection; None if unknown"""
+    try:
+        oid = ObjectId(conversation_id)
+    except (InvalidId, TypeError):
+        return None
+    with span("mongo_read", collection="conversations_archive"):
+        batch = conversations_archive_collection.find_one({"conversation_ids": oid})
+    if not batch:
+        return None
+
+    with span("archive_rehydrate"):
+        docs = bson.decode_all(decompress(_load_blob(batch), batch["codec"]))
+    conversation = next((doc for doc in docs if doc["_id"] == oid), None)
+    if conversation is None:
+        logging.warning(f"Archive batch {batch['_id']} lists {conversation_id} but doesn't hold it")
+        return None
+
+    conversation["rehydrated_at"] = datetime.now().isoformat()
+    try:
+        conversations_collection.insert_one(conversation)
+    except DuplicateKeyError:
+        # A concurrent request rehydrated it first
+        conversation = conversations_collection.find_one({"_id": oid})
+    forget_archived(oid, batch)
+    inc("conversations_rehydrated_total")
+    return conversation
+
+
+def forget_archived(conversation_id, batch=None):
+    """Remove a conversation from its archive batch; returns True if it was archived"""
+    oid = ObjectId(conversation_id)
+    batch = batch or conversations_archive_collection.find_one({"conversation_ids": oid}, {"blob": 0})
+    if not batch:
+        return False
+    updated = conversations_archive_collection.find_one_and_update(
+        {"_id": batch["_id"]}, {"$pull": {"conversation_ids": oid}},
+        projection={"blob": 0}, return_document=ReturnDocument.AFTER
+    )
+    if updated is not None and not updated.get("conversation_ids"):
+        _drop_batch(updated)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--loop", action="store_true", help="keep running every --interval seconds")
+    parser.add_argument("--interval", type=float, default=ARCHIVE_INTERVAL_SECONDS)
+    parser.add_argument("--days", type=float, default=ARCHIVE_AFTER_DAYS, help="idle age to archive")
+    parser.add_argument("--dry-run", action="store_true", help="report what would be archived")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    print(f"🗄️  Archiving conversations idle for {args.days:g} days ({ARCHIVE_CODEC}, {ARCHIVE_BACKEND})")
+    while True:
+        try:
+            report = run_archive(args.days, dry_run=args.dry_run)
+            print(f"✅ {report}")
+        except Exception as e:
+            logging.error(f"Archive run failed: {str(e)}")
+            if not args.loop:
+                raise
+        if not args.loop:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
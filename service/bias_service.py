@@ -1,4 +1,7 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
+from service.llm_provider import get_chat_model
+from utils.metrics import record_llm_usage
+from utils.admission import llm_call
+from utils.deadline import call_with_deadline
 
 
 def nlp_based_bias_detector(text):
@@ -20,7 +23,7 @@ def nlp_based_bias_detector(text):
 
 def gemini_bias_detector(text):
     """Detect bias in text using Gemini AI model"""
-    model = ChatGoogleGenerativeAI(model="gemini-1.5-flash", temperature=0.3)
+    model = get_chat_model("bias", model="gemini-1.5-flash", temperature=0.3)
     prompt = f"""
 You are a bias detection assistant. Analyze the following text and tell if it's biased or neutral. 
 Explain the reason in 2-3 lines.
@@ -28,5 +31,6 @@ Explain the reason in 2-3 lines.
 Text:
 {text}
     """
-    response = model.invoke(prompt)
+    response = call_with_deadline(model.invoke, prompt, stage="bias", hold=llm_call("bias"))
+    record_llm_usage("bias", response)
     return response.content.strip()
@@ -0,0 +1,130 @@
+import os
+import time
+import queue
+import logging
+import threading
+from datetime import datetime
+from bson import ObjectId
+from pymongo.errors import PyMongoError
+from config import conversations_collection
+from service.bias_service import gemini_bias_detector
+from utils.admission import LoadShed
+from utils.metrics import inc, observe, set_gauge, span
+
+# Gemini bias analysis never changes the answer, so it runs after the response is sent.
+# Results land on the conversation under bias_results.<turn>, where turn is the
+# position of the question in its messages.
+BIAS_WORKERS = int(os.getenv("BIAS_WORKERS", "2"))
+BIAS_QUEUE_SIZE = int(os.getenv("BIAS_QUEUE_SIZE", "200"))
+BIAS_MAX_AGE_SECONDS = float(os.getenv("BIAS_MAX_AGE_SECONDS", "300"))  # stale jobs are dropped, not run
+
+_queue = queue.Queue(maxsize=BIAS_QUEUE_SIZE)
+_workers_pid = None
+_start_lock = threading.Lock()
+_finished = {}   # (conversation_id, turn) -> Event, for waiters on this worker process
+_finished_lock = threading.Lock()
+
+
+def pending_result():
+    return {"status": "pending", "queued_at": datetime.now().isoformat()}
+
+
+def submit(conversation_id, turn, text):
+    """Queue analysis of a saved question; returns "pending", or "dropped" when the queue is full"""
+    _start_workers()
+    try:
+        _queue.put_nowait((conversation_id, turn, text, time.monotonic()))
+    except queue.Full:
+        inc("bias_jobs_total", outcome="dropped", reason="queue_full")
+        _store(conversation_id, turn, {"status": "dropped", "reason": "queue_full"})
+        return "dropped"
+    inc("bias_jobs_total", outcome="queued")
+    set_gauge("bias_queue_depth", _queue.qsize())
+    return "pending"
+
+
+def _start_workers():
+    """Worker threads per process (threads don't survive gunicorn's fork)"""
+    global _workers_pid
+    if _workers_pid == os.getpid():
+        return
+    with _start_lock:
+        if _workers_pid == os.getpid():
+            return
+        _workers_pid = os.getpid()
+        for i in range(BIAS_WORKERS):
+            threading.Thread(target=_work, name=f"bias-worker-{i}", daemon=True).start()
+
+
+def _work():
+    while True:
+        conversation_id, turn, text, queued_at = _queue.get()
+        set_gauge("bias_queue_depth", _queue.qsize())
+        try:
+            _analyse(conversation_id, turn, text, queued_at)
+        except Exception as e:
+            logging.error(f"Bias analysis for {conversation_id}/{turn} failed: {str(e)}", exc_info=True)
+        finally:
+            _queue.task_done()
+
+
+def _analyse(conversation_id, turn, text, queued_at):
+    waited = time.monotonic() - queued_at
+    observe("bias_queue_wait_seconds", waited)
+    if waited > BIAS_MAX_AGE_SECONDS:
+        inc("bias_jobs_total", outcome="dropped", reason="stale")
+        _store(conversation_id, turn, {"status": "dropped", "reason": "stale"})
+        return
+    try:
+        with span("bias_gemini"):
+            result = gemini_bias_detector(text)
+    except LoadShed:
+        inc("bias_jobs_total", outcome="dropped", reason="shed")
+        _store(conversation_id, turn, {"status": "dropped", "reason": "shed"})
+        return
+    except Exception as e:
+        inc("bias_jobs_total", outcome="failed")
+        _store(conversation_id, turn, {"status": "failed", "error": str(e)[:200]})
+        raise
+    inc("bias_jobs_total", outcome="done")
+    _store(conversation_id, turn, {"status": "done", "gemini_based": result,
+                                   "completed_at": datetime.now().isoformat()})
+
+
+def _store(conversation_id, turn, result):
+    try:
+        conversations_collection.update_one({"_id": ObjectId(conversation_id)},
+                                            {"$set": {f"bias_results.{turn}": result}})
+    except PyMongoError as e:
+        logging.warning(f"Could not store bias result for {conversation_id}/{turn}: {str(e)}")
+    with _finished_lock:
+        event = _finished.pop((conversation_id, turn), None)
+    if event:
+        event.set()
+
+
+def get_result(conversation_id, turn):
+    """The stored result for a turn, None if the turn was never analysed; raises KeyError for no conversation"""
+    conversation = conversations_collection.find_one({"_id": ObjectId(conversation_id)},
+                                                     {f"bias_results.{turn}": 1})
+    if conversation is None:
+        raise KeyError(conversation_id)
+    return (conversation.get("bias_results") or {}).get(str(turn))
+
+
+def wait_for_result(conversation_id, turn, timeout, poll_seconds=1.0):
+    """
+    Block until the turn's result is no longer pending or timeout passes, and return it.
+    Jobs queued on this process wake the waiter directly; others are polled for.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        with _finished_lock:
+            event = _finished.setdefault((conversation_id, turn), threading.Event())
+        result = get_result(conversation_id, turn)
+        remaining = deadline - time.monotonic()
+        if not result or result.get("status") != "pending" or remaining <= 0:
+            with _finished_lock:
+                _finished.pop((conversation_id, turn), None)
+            return result
+        event.wait(min(poll_seconds, remaining))
@@ -0,0 +1,256 @@
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from bson import ObjectId
+from pymongo import UpdateOne
+from config import conversations_collection
+from service.conversation_search import index_messages_later
+from utils.serialization import serialize_messages, deserialize_messages
+from utils.metrics import inc, span
+
+CALL_SESSION_IDLE_SECONDS = int(os.getenv("CALL_SESSION_IDLE_SECONDS", "900"))
+CALL_SESSION_FLUSH_SECONDS = float(os.getenv("CALL_SESSION_FLUSH_SECONDS", "2"))
+TERMINAL_CALL_STATUSES = {"completed", "busy", "failed", "no-answer", "canceled"}
+MAX_CALL_MESSAGES = 100000   # $slice limit when reading turns another worker stored
+
+
+class CallSession:
+    """Live state of one phone call"""
+
+    def __init__(self, call_sid, conversation_id, messages):
+        self.call_sid = call_sid
+        self.conversation_id = conversation_id
+        self.messages = messages          # LangChain messages, full history
+        self.pending = []                 # serialized messages not yet in Mongo
+        self.last_active = time.time()
+        self.lock = threading.Lock()
+        self.in_flight = 0                # voice turns still being answered
+        self.closed = False               # the call ended; dropped once flushed
+
+
+class CallSessionStore:
+    """
+    Holds call history in memory keyed by CallSid. Twilio sends each webhook of a call
+    to whichever worker picks it up, so Mongo stays the source of truth: every turn is
+    written through with a $push (the flusher retries failed writes), a cached session
+    picks up turns other workers stored before it is used, and a call that ended on
+    another worker is closed here too.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.sessions = {}
+        self.by_conversation = {}
+        self.lock = threading.Lock()
+        self._started = False
+
+    def _start(self):
+        # Index creation and the flusher thread are deferred to first use
+        if self._started:
+            return
+        with self.lock:
+            if self._started:
+                return
+            self.collection.create_index("call_sid", sparse=True)
+            threading.Thread(target=self._flush_loop, name="call-session-flusher", daemon=True).start()
+            self._started = True
+
+    def _add(self, session):
+        with self.lock:
+            self.sessions[session.call_sid] = session
+            self.by_conversation[session.conversation_id] = session
+        return session
+
+    def register(self, call_sid, conversation_id, messages=None):
+        """Track a conversation created before the call connects (make_call)"""
+        self._start()
+        return self._add(CallSession(call_sid, conversation_id, deserialize_messages(messages or [])))
+
+    def open(self, call_sid, create_conversation, initial_messages=None):
+        """
+        Return the session for a call, reusing its conversation if one exists.
+        initial_messages are what create_conversation stores on a new conversation.
+        """
+        self._start()
+        session = self.sessions.get(call_sid)
+        if session:
+            session.last_active = time.time()
+            return session
+
+        conversation = None
+        if call_sid:
+            conversation = self.collection.find_one({'call_sid': call_sid}, {'messages': 1})
+        if conversation:
+            conversation_id = str(conversation['_id'])
+            messages = conversation.get('messages', [])
+        else:
+            # create_conversation is expected to store the call_sid on the new document
+            conversation_id = create_conversation()
+            messages = initial_messages or []
+        return self._add(CallSession(call_sid or conversation_id, conversation_id, deserialize_messages(messages)))
+
+    def get(self, call_sid=None, conversation_id=None):
+        """Look up a live session, loading it from Mongo if this worker has not seen it"""
+        self._start()
+        session = self.sessions.get(call_sid) or self.by_conversation.get(conversation_id)
+        if session:
+            inc("cache_hits_total", cache="call_session")
+            session.last_active = time.time()
+            return self.refresh(session)
+
+        inc("cache_misses_total", cache="call_session")
+        query = {'_id': ObjectId(conversation_id)} if conversation_id else {'call_sid': call_sid}
+        conversation = self.collection.find_one(query, {'messages': 1, 'call_sid': 1, 'call_status': 1})
+        if not conversation:
+            return None
+        session = CallSession(
+            conversation.get('call_sid') or call_sid or str(conversation['_id']),
+            str(conversation['_id']),
+            deserialize_messages(conversation.get('messages', []))
+        )
+        # Dropped again once its turn is saved
+        session.closed = conversation.get('call_status') in TERMINAL_CALL_STATUSES
+        return self._add(session)
+
+    def refresh(self, session):
+        """Append turns other workers stored for this call, and close it if the call has ended"""
+        self.flush([session])
+        with session.lock:
+            if session.pending:
+                return session        # Mongo is unreachable; go on with what this worker has
+            known = len(session.messages)
+        with span("mongo_read", collection="conversations"):
+            conversation = self.collection.find_one(
+                {'_id': ObjectId(session.conversation_id)},
+                {'messages': {'$slice': [known, MAX_CALL_MESSAGES]}, 'call_status': 1}
+            )
+        if not conversation:
+            return session
+        newer = conversation.get('messages') or []
+        with session.lock:
+            if newer and len(session.messages) == known:
+                session.messages.extend(deserialize_messages(newer))
+            if conversation.get('call_status') in TERMINAL_CALL_STATUSES:
+                session.closed = True
+        return session
+
+    def append_turn(self, session, new_messages):
+        """Add messages to the live history and write them through, before the caller can speak again"""
+        with session.lock:
+            session.messages.extend(new_messages)
+            session.pending.extend(serialize_messages(new_messages))
+            session.last_active = time.time()
+        self.flush([session])
+
+    @contextmanager
+    def turn(self, session):
+        """Mark a voice turn in progress, so a call that ends meanwhile waits for it"""
+        with session.lock:
+            session.in_flight += 1
+        try:
+            yield session
+        finally:
+            with session.lock:
+                session.in_flight -= 1
+                done = session.closed and session.in_flight == 0
+            if done:
+                self._finish(session)
+
+    def history(self, session):
+        with session.lock:
+            return list(session.messages)
+
+    def flush(self, sessions=None):
+        """Write pending turns for the given (or all) sessions in one bulk write"""
+        sessions = list(self.sessions.values()) if sessions is None else sessions
+        operations, taken = [], []
+        now = datetime.now().isoformat()
+        for session in sessions:
+            with session.lock:
+                if not session.pending:
+                    continue
+                pending, session.pending = session.pending, []
+            taken.append((session, pending))
+            operations.append(UpdateOne(
+                {'_id': ObjectId(session.conversation_id)},
+                {'$push': {'messages': {'$each': pending}}, '$set': {'updated_at': now}}
+            ))
+
+        if not operations:
+            return 0
+        try:
+            with span("call_session_flush"):
+                self.collection.bulk_write(operations, ordered=False)
+        except Exception as e:
+            logging.error(f"Call session flush failed: {str(e)}")
+            for session, pending in taken:
+                with session.lock:
+                    session.pending[:0] = pending
+            return 0
+        for session, pending in taken:
+            index_messages_later(session.conversation_id, pending)
+        return sum(len(pending) for _, pending in taken)
+
+    def close(self, call_sid, status=None):
+        """
+        Mark a finished call closed. It is flushed and forgotten once its in-flight
+        turns are done; a failed flush keeps it for the flusher to retry.
+        """
+        session = self.sessions.get(call_sid)
+        if session:
+            with session.lock:
+                session.closed = True
+                idle = session.in_flight == 0
+            if idle:
+                self._finish(session)
+        if status:
+            self.collection.update_one({'call_sid': call_sid}, {'$set': {'call_status': status}})
+
+    def _finish(self, session):
+        """Final flush of a closed session; forget it only when nothing is left unwritten"""
+        self.flush([session])
+        with session.lock:
+            if session.pending or session.in_flight:
+                return False
+        with self.lock:
+            if self.sessions.get(session.call_sid) is session:
+                self.sessions.pop(session.call_sid, None)
+            if self.by_conversation.get(session.conversation_id) is session:
+                self.by_conversation.pop(session.conversation_id, None)
+        return True
+
+    def close_ended_calls(self):
+        """Close sessions of calls whose final status callback reached another worker"""
+        live = {session.conversation_id: session for session in list(self.sessions.values()) if not session.closed}
+        if not live:
+            return
+        ended = self.collection.find(
+            {'_id': {'$in': [ObjectId(c) for c in live]}, 'call_status': {'$in': list(TERMINAL_CALL_STATUSES)}},
+            {'_id': 1}
+        )
+        for conversation in ended:
+            self.close(live[str(conversation['_id'])].call_sid)
+
+    def evict_idle(self):
+        cutoff = time.time() - CALL_SESSION_IDLE_SECONDS
+        for session in list(self.sessions.values()):
+            if session.closed and session.in_flight == 0:
+                self._finish(session)        # retry closed calls whose final flush failed
+            elif session.last_active < cutoff:
+                self.close(session.call_sid)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(CALL_SESSION_FLUSH_SECONDS)
+            try:
+                self.flush()
+                self.close_ended_calls()
+                self.evict_idle()
+            except Exception as e:
+                logging.error(f"Call session maintenance failed: {str(e)}")
+
+
+call_sessions = CallSessionStore(conversations_collection)
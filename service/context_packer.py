@@ -0,0 +1,139 @@
+import os
+import re
+import zlib
+import logging
+import numpy as np
+from utils.metrics import span, inc
+
+# Post-retrieval stage between the vector store and the QA prompt: drop weak and
+# near-duplicate chunks, diversify with MMR, then pack what is left into a token budget.
+CONTEXT_PACKING = os.getenv("CONTEXT_PACKING", "1") == "1"
+CHARS_PER_TOKEN = 4          # rough Gemini ratio for English text
+SHINGLE_WORDS = 3
+NUM_PERMUTATIONS = 64
+MIN_TRIMMED_TOKENS = 48      # don't keep a trimmed tail shorter than this
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = np.random.default_rng(1)
+_PERM_A = _rng.integers(1, _MERSENNE_PRIME, size=NUM_PERMUTATIONS, dtype=np.uint64)
+_PERM_B = _rng.integers(0, _MERSENNE_PRIME, size=NUM_PERMUTATIONS, dtype=np.uint64)
+_WORD_RE = re.compile(r"\w+")
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def minhash(text):
+    """MinHash signature over word 3-gram shingles"""
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < SHINGLE_WORDS:
+        words = words + [""] * (SHINGLE_WORDS - len(words))
+    shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+    # (a * h + b) mod p for every permutation; h < 2^32 and a < 2^61 can overflow uint64,
+    # which only changes the permutation, not the min-hash property
+    return ((np.outer(hashes, _PERM_A) + _PERM_B) % _MERSENNE_PRIME).min(axis=0)
+
+
+def similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity of two signatures"""
+    return float(np.count_nonzero(sig_a == sig_b)) / NUM_PERMUTATIONS
+
+
+def trim_to_tokens(text, tokens):
+    """Cut text at a word boundary so it fits in roughly `tokens` tokens"""
+    limit = tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    cut = text.rfind(" ", 0, limit)
+    return text[:cut if cut > 0 else limit].rstrip() + " …"
+
+
+def pack(scored_docs, k, budget_tokens, min_score=0.0, dedup_threshold=0.8, mmr_lambda=0.7):
+    """
+    Select context chunks from (document, score) pairs sorted by score.
+    Returns the packed documents and a stats dict.
+    """
+    from langchain_core.documents import Document
+
+    stats = {"candidates": len(scored_docs)}
+    # What plain top-k retrieval would have sent
+    stats["baseline_tokens"] = sum(estimate_tokens(doc.page_content) for doc, _ in scored_docs[:k])
+
+    candidates = [(doc, score) for doc, score in scored_docs if score >= min_score]
+    if not candidates and scored_docs:
+        # The score assumes unit embeddings, so min_score can misjudge a whole result set;
+        # the best chunk is always kept rather than sending the model no context
+        candidates = [max(scored_docs, key=lambda pair: pair[1])]
+        stats["threshold_fallback"] = True
+    stats["below_threshold"] = len(scored_docs) - len(candidates)
+
+    # Near-duplicate removal, keeping the higher scored copy
+    kept, signatures = [], []
+    for doc, score in candidates:
+        signature = minhash(doc.page_content)
+        if any(similarity(signature, other) >= dedup_threshold for other in signatures):
+            continue
+        kept.append((doc, score))
+        signatures.append(signature)
+    stats["duplicates"] = len(candidates) - len(kept)
+
+    # Maximal marginal relevance over the remaining chunks
+    selected, remaining = [], list(range(len(kept)))
+    while remaining and len(selected) < k:
+        def mmr(i):
+            redundancy = max((similarity(signatures[i], signatures[j]) for j in selected), default=0.0)
+            return mmr_lambda * kept[i][1] - (1 - mmr_lambda) * redundancy
+        best = max(remaining, key=mmr)
+        selected.append(best)
+        remaining.remove(best)
+
+    # Pack in rank order; the lowest ranked chunks are trimmed or dropped first
+    packed, used = [], 0
+    for i in selected:
+        doc = kept[i][0]
+        tokens = estimate_tokens(doc.page_content)
+        room = budget_tokens - used
+        if tokens > room:
+            if room >= MIN_TRIMMED_TOKENS:
+                content = trim_to_tokens(doc.page_content, room)
+                packed.append(Document(page_content=content, metadata=dict(doc.metadata, trimmed=True)))
+                used += estimate_tokens(content)
+            break
+        packed.append(doc)
+        used += tokens
+
+    stats["packed"] = len(packed)
+    stats["packed_tokens"] = used
+    stats["tokens_saved"] = max(0, stats["baseline_tokens"] - used)
+    return packed, stats
+
+
+def make_packing_retriever(vectorstore, profile, k, fetch_k, budget_tokens, min_score=0.0,
+                           dedup_threshold=0.8, mmr_lambda=0.7):
+    """Retriever runnable: fetch_k candidates from the vector store, packed down to the profile's budget"""
+    from langchain_core.runnables import RunnableLambda
+
+    if not CONTEXT_PACKING:
+        return vectorstore.as_retriever(search_kwargs={"k": k})
+
+    def retrieve(query):
+        # Squared L2 distance between unit embeddings -> cosine similarity
+        results = vectorstore.similarity_search_with_score(query, k=fetch_k)
+        scored_docs = [(doc, 1.0 - float(distance) / 2) for doc, distance in results]
+        with span("context_pack", profile=profile):
+            docs, stats = pack(scored_docs, k, budget_tokens, min_score, dedup_threshold, mmr_lambda)
+
+        inc("context_tokens_total", stats["packed_tokens"], profile=profile)
+        inc("context_tokens_saved_total", stats["tokens_saved"], profile=profile)
+        inc("context_chunks_dropped_total", stats["duplicates"], profile=profile, reason="duplicate")
+        inc("context_chunks_dropped_total", stats["below_threshold"], profile=profile, reason="score")
+        if stats.get("threshold_fallback"):
+            inc("context_threshold_fallback_total", profile=profile)
+        logging.info(f"Context for '{profile}': {stats['packed']}/{stats['candidates']} chunks, "
+                     f"{stats['packed_tokens']} tokens ({stats['tokens_saved']} saved vs top-{k}, "
+                     f"{stats['duplicates']} duplicates, {stats['below_threshold']} below threshold)")
+        return docs
+
+    return RunnableLambda(retrieve)
@@ -0,0 +1,264 @@
+"""
+Full-text search over conversation messages.
+
+An inverted index kept in Mongo next to the conversations: one posting per
+(term, conversation) with its term frequency, a document frequency per term and a
+length per conversation. Writes index only the messages they add; queries read the
+highest-tf postings of each query term, so their cost doesn't grow with history.
+
+    python -m service.conversation_search --rebuild    # index existing conversations
+"""
+import os
+import re
+import json
+import math
+import time
+import logging
+import argparse
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from bson import ObjectId
+from pymongo import UpdateOne, DESCENDING
+from config import (conversations_collection, search_postings_collection,
+                    search_terms_collection, search_docs_collection)
+from utils.metrics import inc, span
+
+SEARCH_POSTINGS_LIMIT = int(os.getenv("SEARCH_POSTINGS_LIMIT", "2000"))  # per query term
+SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", "200"))
+SEARCH_PAGE_SIZE = 10
+SNIPPET_CHARS = 160
+BM25_K1 = 1.2
+BM25_B = 0.75
+CORPUS_ID = "$corpus"   # tokens never start with "$"
+
+STOP_WORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "for", "from", "how",
+    "i", "in", "is", "it", "me", "my", "of", "on", "or", "so", "that", "the", "there",
+    "this", "to", "was", "we", "what", "when", "where", "which", "who", "will", "with",
+    "you", "your",
+}
+TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9+#.]*")
+
+_indexes_ready = False
+# One thread per process keeps index writes off the request path and in order
+_indexer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="search-indexer")
+
+
+def ensure_indexes():
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    search_postings_collection.create_index([("term", 1), ("tf", DESCENDING)])
+    search_postings_collection.create_index("conversation_id")
+    _indexes_ready = True
+
+
+def tokenize(text):
+    tokens = (token.rstrip(".") for token in TOKEN_RE.findall((text or "").lower()))
+    return [token for token in tokens if token and token not in STOP_WORDS]
+
+
+def message_text(message):
+    """Searchable text of a stored message; AI turns keep their text and structured content"""
+    content = message.get("content") if isinstance(message, dict) else message
+    if not isinstance(content, str):
+        return ""
+    if message.get("type") != "ai" or not content.startswith("{"):
+        return content
+    try:
+        data = json.loads(content)
+    except ValueError:
+        return content
+    parts = [data.get("text") or ""]
+    structured = data.get("structured") or {}
+    parts.append(structured.get("summary") or "")
+    for section in structured.get("sections") or []:
+        parts.append(section.get("title") or "")
+        parts.extend(str(line) for line in section.get("content") or [])
+    return "\n".join(part for part in parts if part)
+
+
+def index_messages(conversation_id, messages):
+    """Add new messages of a conversation to the index"""
+    counts = Counter()
+    for message in messages:
+        counts.update(tokenize(message_text(message)))
+    if not counts:
+        return
+    ensure_indexes()
+    conversation_id = str(conversation_id)
+    terms = list(counts)
+    with span("search_index"):
+        result = search_postings_collection.bulk_write([
+            UpdateOne({"_id": f"{conversation_id}:{term}"},
+                      {"$inc": {"tf": counts[term]},
+                       "$setOnInsert": {"term": term, "conversation_id": conversation_id}},
+                      upsert=True)
+            for term in terms
+        ], ordered=False)
+        # Terms new to this conversation raise their document frequency
+        new_terms = [terms[i] for i in result.upserted_ids]
+        if new_terms:
+            search_terms_collection.bulk_write(
+                [UpdateOne({"_id": term}, {"$inc": {"df": 1}}, upsert=True) for term in new_terms],
+                ordered=False
+            )
+        length = sum(counts.values())
+        doc = search_docs_collection.update_one({"_id": conversation_id}, {"$inc": {"length": length}}, upsert=True)
+        search_terms_collection.update_one(
+            {"_id": CORPUS_ID},
+            {"$inc": {"docs": 1 if doc.upserted_id is not None else 0, "total_length": length}},
+            upsert=True
+        )
+    inc("search_indexed_messages_total", len(messages))
+
+
+def index_messages_later(conversation_id, messages):
+    """Index in the background; search catches up within milliseconds"""
+    def run():
+        try:
+            index_messages(conversation_id, messages)
+        except Exception as e:
+            logging.error(f"Search indexing failed for {conversation_id}: {str(e)}")
+    _indexer.submit(run)
+
+
+def remove_conversation(conversation_id):
+    """Drop a deleted conversation's postings"""
+    conversation_id = str(conversation_id)
+    postings = list(search_postings_collection.find({"conversation_id": conversation_id}, {"term": 1}))
+    if postings:
+        search_terms_collection.bulk_write(
+            [UpdateOne({"_id": p["term"]}, {"$inc": {"df": -1}}) for p in postings], ordered=False
+        )
+        search_postings_collection.delete_many({"conversation_id": conversation_id})
+    doc = search_docs_collection.find_one({"_id": conversation_id})
+    if doc:
+        search_docs_collection.delete_one({"_id": conversation_id})
+        search_terms_collection.update_one(
+            {"_id": CORPUS_ID}, {"$inc": {"docs": -1, "total_length": -doc.get("length", 0)}}
+        )
+
+
+def _score(query_terms):
+    """BM25 over the top postings of each term; returns [(conversation_id, score)] best first"""
+    stats = {d["_id"]: d for d in search_terms_collection.find({"_id": {"$in": query_terms + [CORPUS_ID]}})}
+    corpus = stats.get(CORPUS_ID) or {}
+    n_docs = max(corpus.get("docs", 0), 1)
+    avg_length = max(corpus.get("total_length", 0), 1) / n_docs
+
+    postings_by_term = {}
+    for term in query_terms:
+        df = (stats.get(term) or {}).get("df", 0)
+        if df <= 0:
+            continue
+        postings_by_term[term] = (df, list(
+            search_postings_collection.find({"term": term}, {"conversation_id": 1, "tf": 1})
+            .sort("tf", DESCENDING).limit(SEARCH_POSTINGS_LIMIT)
+        ))
+    candidates = sorted({p["conversation_id"] for _, postings in postings_by_term.values() for p in postings})
+    if not candidates:
+        return []
+
+    position = {cid: i for i, cid in enumerate(candidates)}
+    lengths = np.full(len(candidates), avg_length, dtype=np.float64)
+    for doc in search_docs_collection.find({"_id": {"$in": candidates}}, {"length": 1}):
+        lengths[position[doc["_id"]]] = doc.get("length", avg_length)
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / avg_length)
+
+    scores = np.zeros(len(candidates), dtype=np.float64)
+    for df, postings in postings_by_term.values():
+        rows = np.fromiter((position[p["conversation_id"]] for p in postings), dtype=np.int64, count=len(postings))
+        tf = np.fromiter((p["tf"] for p in postings), dtype=np.float64, count=len(postings))
+        idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+        scores[rows] += idf * tf * (BM25_K1 + 1) / (tf + norm[rows])
+
+    order = np.argsort(-scores, kind="stable")[:SEARCH_MAX_RESULTS]
+    return [(candidates[i], float(scores[i])) for i in order]
+
+
+def snippet(messages, query_terms):
+    """The message matching most query terms, cut around the first match, with match offsets"""
+    # Token boundaries as TOKEN_RE draws them (\b fails after "c++" or "c#"); a dot only
+    # ends a token when no token character follows it
+    pattern = re.compile(r"(?<![a-z0-9+#])(?<![a-z0-9+#]\.)(" + "|".join(re.escape(t) for t in query_terms)
+                         + r")(?![a-z0-9+#])(?!\.[a-z0-9+#])", re.IGNORECASE)
+    best = None
+    for index, message in enumerate(messages):
+        text = " ".join(message_text(message).split())
+        matches = list(pattern.finditer(text))
+        if not matches:
+            continue
+        distinct = len({m.group(1).lower() for m in matches})
+        if best is None or distinct > best[0]:
+            best = (distinct, index, text, matches)
+    if best is None:
+        return None
+    _, index, text, matches = best
+    start = max(0, matches[0].start() - SNIPPET_CHARS // 3)
+    end = min(len(text), start + SNIPPET_CHARS)
+    prefix = "…" if start > 0 else ""
+    cut = prefix + text[start:end] + ("…" if end < len(text) else "")
+    highlights = [[m.start() - start + len(prefix), m.end() - start + len(prefix)]
+                  for m in matches if m.start() >= start and m.end() <= end]
+    return {"message_index": index, "role": messages[index].get("type"), "text": cut, "highlights": highlights}
+
+
+def search_conversations(query, page=1, page_size=SEARCH_PAGE_SIZE):
+    """Ranked, paginated conversations matching query, with a highlighted snippet each"""
+    query_terms = list(dict.fromkeys(tokenize(query)))
+    if not query_terms:
+        return {"query": query, "page": page, "page_size": page_size, "total": 0, "results": []}
+    with span("search_query"):
+        ranked = _score(query_terms)
+    page_hits = ranked[(page - 1) * page_size: page * page_size]
+
+    ids = [ObjectId(cid) for cid, _ in page_hits if ObjectId.is_valid(cid)]
+    with span("mongo_read", collection="conversations"):
+        conversations = {str(c["_id"]): c for c in conversations_collection.find(
+            {"_id": {"$in": ids}}, {"messages": 1, "updated_at": 1, "call_sid": 1}
+        )}
+    results = []
+    for cid, score in page_hits:
+        conversation = conversations.get(cid)
+        results.append({
+            "conversation_id": cid,
+            "score": round(score, 4),
+            "updated_at": conversation.get("updated_at") if conversation else None,
+            "channel": "voice" if conversation and conversation.get("call_sid") else "chat",
+            # None when the conversation has since been archived
+            "snippet": snippet(conversation.get("messages") or [], query_terms) if conversation else None,
+        })
+    inc("search_queries_total", hit="yes" if ranked else "no")
+    return {"query": query, "page": page, "page_size": page_size, "total": len(ranked), "results": results}
+
+
+def rebuild():
+    """Index every existing conversation from scratch"""
+    ensure_indexes()
+    started = time.perf_counter()
+    for collection in (search_postings_collection, search_terms_collection, search_docs_collection):
+        collection.delete_many({})
+    count = 0
+    for conversation in conversations_collection.find({}, {"messages": 1}).batch_size(500):
+        index_messages(conversation["_id"], conversation.get("messages") or [])
+        count += 1
+    logging.info(f"Search index rebuilt over {count} conversations in {time.perf_counter() - started:.1f} s")
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rebuild", action="store_true", help="index all existing conversations")
+    parser.add_argument("query", nargs="?", help="run a search and print the results")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.rebuild:
+        print(f"✅ Indexed {rebuild()} conversations")
+    if args.query:
+        print(json.dumps(search_conversations(args.query), indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Ownership and listing of conversations.
+
+Conversations carry the user_id of the user who started them (None when anonymous).
+Listings are served by a (user_id, updated_at, _id) index and paged with an opaque
+keyset cursor, so a page costs the same however many conversations exist.
+
+    python -m service.conversation_store --backfill   # set user_id on older conversations
+"""
+import base64
+import logging
+import argparse
+from bson import ObjectId
+from pymongo import UpdateOne, DESCENDING
+from config import conversations_collection, users_collection
+from utils.metrics import span
+
+LIST_PAGE_SIZE = 20
+BACKFILL_BATCH_SIZE = 1000
+
+_indexes_ready = False
+
+
+def ensure_indexes():
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    conversations_collection.create_index(
+        [("user_id", 1), ("updated_at", DESCENDING), ("_id", DESCENDING)], name="user_recent"
+    )
+    # Same spec as the archiver's scan index; read backwards for the all-users listing
+    conversations_collection.create_index([("updated_at", 1), ("_id", 1)])
+    _indexes_ready = True
+
+
+def resolve_user_id(user_id=None, phone=None):
+    """ObjectId of the user a request belongs to: an explicit id, else a match on phone"""
+    if user_id and ObjectId.is_valid(str(user_id)):
+        return ObjectId(str(user_id))
+    if phone:
+        with span("mongo_read", collection="users"):
+            user = users_collection.find_one({"phone": phone}, {"_id": 1})
+        if user:
+            return user["_id"]
+    return None
+
+
+def encode_cursor(conversation):
+    raw = f"{conversation.get('updated_at') or ''}|{conversation['_id']}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor):
+    """(updated_at, _id) of the last conversation on the previous page; ValueError if malformed"""
+    try:
+        updated_at, _, oid = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").rpartition("|")
+        return updated_at, ObjectId(oid)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def list_conversations(user_id=None, cursor=None, limit=LIST_PAGE_SIZE, all_users=False):
+    """
+    Most recent conversations of a user (or of everyone with all_users), without messages.
+    Returns (conversations, next_cursor); next_cursor is None on the last page.
+    """
+    ensure_indexes()
+    query = {} if all_users else {"user_id": user_id}
+    if cursor:
+        updated_at, oid = decode_cursor(cursor)
+        query["$or"] = [
+            {"updated_at": {"$lt": updated_at}},
+            {"updated_at": updated_at, "_id": {"$lt": oid}},
+        ]
+    with span("mongo_read", collection="conversations", operation="list"):
+        page = list(conversations_collection.find(query, {"messages": 0})
+                    .sort([("updated_at", DESCENDING), ("_id", DESCENDING)])
+                    .limit(limit + 1))
+    next_cursor = encode_cursor(page[limit - 1]) if len(page) > limit else None
+    return page[:limit], next_cursor
+
+
+def backfill_user_ids(lookup_calls=False, batch_size=BACKFILL_BATCH_SIZE):
+    """
+    Give every conversation without a user_id field one: the owner of the phone number
+    of voice conversations that recorded it (or, with lookup_calls, whose Twilio call
+    says so), else None. Resumable: finished conversations leave the scan.
+    """
+    ensure_indexes()
+    twilio = None
+    if lookup_calls:
+        from routes.voice_routes import get_twilio_client
+        twilio = get_twilio_client()
+
+    updated = attributed = 0
+    last_id = None
+    while True:
+        query = {"user_id": {"$exists": False}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = list(conversations_collection.find(query, {"call_sid": 1, "phone": 1})
+                     .sort("_id", 1).limit(batch_size))
+        if not batch:
+            break
+        last_id = batch[-1]["_id"]
+
+        operations = []
+        for conversation in batch:
+            phone = conversation.get("phone")
+            if not phone and twilio is not None and conversation.get("call_sid"):
+                try:
+                    call = twilio.calls(conversation["call_sid"]).fetch()
+                    # The user is the caller on inbound calls and the callee on make_call's
+                    phone = call.from_ if call.direction == "inbound" else call.to
+                except Exception as e:
+                    logging.warning(f"Could not look up call {conversation['call_sid']}: {str(e)}")
+            user_id = resolve_user_id(phone=phone)
+            attributed += user_id is not None
+            fields = {"user_id": user_id}
+            if phone and not conversation.get("phone"):
+                fields["phone"] = phone
+            operations.append(UpdateOne({"_id": conversation["_id"], "user_id": {"$exists": False}},
+                                        {"$set": fields}))
+        conversations_collection.bulk_write(operations, ordered=False)
+        updated += len(operations)
+        logging.info(f"Backfill: {updated} conversations updated, {attributed} attributed to a user")
+    return {"updated": updated, "attributed": attributed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backfill", action="store_true", help="set user_id on conversations without one")
+    parser.add_argument("--lookup-calls", action="store_true",
+                        help="ask Twilio for the phone number of voice conversations that didn't record it")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.backfill:
+        print(f"✅ {backfill_user_ids(lookup_calls=args.lookup_calls)}")
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+import os
+import time
+import random
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+from utils.metrics import inc, observe
+
+# Index builds embed the corpus in provider-sized batches, several at a time.
+# Gemini's batchEmbedContents takes up to 100 texts per request.
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "100"))
+EMBED_BATCH_CHARS = int(os.getenv("EMBED_BATCH_CHARS", "200000"))
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "6"))
+EMBED_BACKOFF_SECONDS = float(os.getenv("EMBED_BACKOFF_SECONDS", "1"))
+EMBED_BACKOFF_MAX_SECONDS = 60.0
+
+RATE_LIMIT_ERRORS = {"ResourceExhausted", "TooManyRequests", "RateLimitError"}
+TRANSIENT_ERRORS = {"ServiceUnavailable", "DeadlineExceeded", "InternalServerError", "GatewayTimeout",
+                    "ConnectionError", "Timeout", "TimeoutError", "ReadTimeout", "ConnectTimeout"}
+
+
+def make_batches(texts, batch_size=EMBED_BATCH_SIZE, batch_chars=EMBED_BATCH_CHARS):
+    """Split texts into [(start, end)] ranges under both the count and the payload limit"""
+    batches, start, chars = [], 0, 0
+    for i, text in enumerate(texts):
+        if i > start and (i - start >= batch_size or chars + len(text) > batch_chars):
+            batches.append((start, i))
+            start, chars = i, 0
+        chars += len(text)
+    if start < len(texts):
+        batches.append((start, len(texts)))
+    return batches
+
+
+def classify_error(error):
+    """'rate_limit', 'transient' or None (not worth retrying)"""
+    status = getattr(error, "code", None) or getattr(error, "status_code", None)
+    status = getattr(getattr(error, "response", None), "status_code", status)
+    if callable(status):
+        status = None
+    name = type(error).__name__
+    if status == 429 or name in RATE_LIMIT_ERRORS or "429" in str(error) or "quota" in str(error).lower():
+        return "rate_limit"
+    if status in (500, 502, 503, 504) or name in TRANSIENT_ERRORS:
+        return "transient"
+    return None
+
+
+def retry_after(error):
+    """Seconds the provider asked us to wait, if it said"""
+    headers = getattr(getattr(error, "response", None), "headers", None) or getattr(error, "headers", None) or {}
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+class _Backoff:
+    """Shared pause: one rate-limited batch holds back every worker, not just itself"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.until = 0.0
+
+    def wait(self):
+        delay = self.until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def push(self, seconds):
+        with self.lock:
+            self.until = max(self.until, time.monotonic() + seconds)
+
+
+class _Checkpoint:
+    """Finished batches saved as .npy files named by a hash of their texts"""
+
+    def __init__(self, directory, model):
+        self.directory = directory
+        self.model = model
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def path(self, texts):
+        digest = hashlib.sha1(self.model.encode("utf-8"))
+        for text in texts:
+            digest.update(hashlib.sha1(text.encode("utf-8")).digest())
+        return os.path.join(self.directory, f"{digest.hexdigest()}.npy")
+
+    def load(self, texts):
+        if not self.directory:
+            return None
+        try:
+            vectors = np.load(self.path(texts))
+        except (OSError, ValueError):
+            return None
+        return vectors if len(vectors) == len(texts) else None
+
+    def save(self, texts, vectors):
+        if not self.directory:
+            return
+        path = self.path(texts)
+        with open(path + ".tmp", "wb") as f:
+            np.save(f, vectors)
+        os.replace(path + ".tmp", path)
+
+
+def _embed_batch(embeddings, texts, backoff):
+    for attempt in range(EMBED_MAX_RETRIES + 1):
+        backoff.wait()
+        started = time.perf_counter()
+        try:
+            vectors = embeddings.embed_documents(texts)
+            observe("embed_batch_seconds", time.perf_counter() - started)
+            return np.asarray(vectors, dtype="float32")
+        except Exception as e:
+            kind = classify_error(e)
+            if kind is None or attempt == EMBED_MAX_RETRIES:
+                raise
+            delay = retry_after(e) or min(EMBED_BACKOFF_MAX_SECONDS, EMBED_BACKOFF_SECONDS * 2 ** attempt)
+            delay *= random.uniform(0.8, 1.2)
+            inc("embed_retries_total", reason=kind)
+            logging.warning(f"Embedding batch of {len(texts)} failed ({kind}: {str(e)[:120]}); "
+                            f"retry {attempt + 1}/{EMBED_MAX_RETRIES} in {delay:.1f} s")
+            if kind == "rate_limit":
+                backoff.push(delay)
+            else:
+                time.sleep(delay)
+
+
+def embed_texts(embeddings, texts, checkpoint_dir=None, model="", concurrency=EMBED_CONCURRENCY,
+                batch_size=EMBED_BATCH_SIZE):
+    """
+    Embed texts in batches on a bounded thread pool, retrying rate limits and transient
+    errors with backoff. With checkpoint_dir, finished batches are kept on disk and an
+    interrupted build only embeds what's missing. Returns a float32 array in text order.
+    """
+    started = time.perf_counter()
+    batches = make_batches(texts, batch_size)
+    checkpoint = _Checkpoint(checkpoint_dir, model)
+    results = [None] * len(batches)
+
+    pending = []
+    for i, (start, end) in enumerate(batches):
+        results[i] = checkpoint.load(texts[start:end])
+        if results[i] is None:
+            pending.append(i)
+    resumed = len(batches) - len(pending)
+    if resumed:
+        logging.info(f"Embedding resumed: {resumed} of {len(batches)} batches already checkpointed")
+
+    backoff = _Backoff()
+    done = 0
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="embed") as executor:
+        futures = {executor.submit(_embed_batch, embeddings, texts[batches[i][0]:batches[i][1]], backoff): i
+                   for i in pending}
+        try:
+            for future in as_completed(futures):
+                i = futures[future]
+                start, end = batches[i]
+                results[i] = future.result()
+                checkpoint.save(texts[start:end], results[i])
+                done += end - start
+                inc("embed_chunks_total", end - start)
+        except BaseException:
+            # Finished batches are checkpointed; don't start the rest
+            for future in futures:
+                future.cancel()
+            raise
+
+    elapsed = time.perf_counter() - started
+    rate = done / elapsed if elapsed > 0 else 0.0
+    logging.info(f"Embedded {done} chunks in {len(pending)} batches in {elapsed:.2f} s "
+                 f"({rate:.1f} chunks/s, concurrency {concurrency}, {resumed} batches resumed)")
+    if not results:
+        return np.zeros((0, 0), dtype="float32")
+    return np.concatenate(results)
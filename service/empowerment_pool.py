@@ -0,0 +1,155 @@
+import os
+import re
+import time
+import random
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from config import empowerment_collection
+from service.gemini_service import get_empowering_response
+from utils.metrics import inc, set_gauge
+
+# Empowering messages are generated ahead of time and kept in Mongo, so a user who
+# sounds low gets one instantly instead of waiting on a live Gemini call.
+EMPOWERMENT_TOPICS = ("women empowerment", "career support")
+EMPOWERMENT_POOL_TARGET = int(os.getenv("EMPOWERMENT_POOL_TARGET", "24"))
+EMPOWERMENT_POOL_LOW_WATER = int(os.getenv("EMPOWERMENT_POOL_LOW_WATER", "8"))
+EMPOWERMENT_MAX_USES = int(os.getenv("EMPOWERMENT_MAX_USES", "50"))  # then a fresh message replaces it
+POOL_RELOAD_SECONDS = 60
+
+
+def text_hash(text):
+    """Same message, whatever its spacing or case"""
+    return hashlib.sha1(re.sub(r"\s+", " ", text or "").strip().lower().encode("utf-8")).hexdigest()
+
+
+class EmpowermentPool:
+    """Per-topic pool of pre-generated messages, refilled in the background below the low-water mark"""
+
+    def __init__(self, collection, topics=EMPOWERMENT_TOPICS):
+        self.collection = collection
+        self.cache = {topic: [] for topic in topics}
+        self.loaded_at = {topic: 0.0 for topic in topics}
+        self.lock = threading.Lock()
+        self.refilling = set()
+        self._refiller = None
+        self._refiller_pid = None
+        self._indexes_ready = False
+
+    def _ensure_indexes(self):
+        if self._indexes_ready:
+            return
+        self.collection.create_index("hash", unique=True)
+        self.collection.create_index([("topic", 1), ("uses", 1)])
+        self._indexes_ready = True
+
+    def _messages(self, topic):
+        """Live messages of a topic, re-read from Mongo every POOL_RELOAD_SECONDS (other workers use them too)"""
+        if time.monotonic() - self.loaded_at.get(topic, 0.0) > POOL_RELOAD_SECONDS:
+            self._ensure_indexes()
+            messages = list(self.collection.find({"topic": topic, "uses": {"$lt": EMPOWERMENT_MAX_USES}},
+                                                 {"text": 1, "hash": 1, "uses": 1}))
+            with self.lock:
+                self.cache[topic] = messages
+                self.loaded_at[topic] = time.monotonic()
+            set_gauge("empowerment_pool_size", len(messages), topic=topic)
+        return self.cache.get(topic, [])
+
+    def take(self, topic, history_texts=()):
+        """A message for topic not already sent in this conversation; live generation if none is left"""
+        seen = {text_hash(text) for text in history_texts}
+        try:
+            messages = self._messages(topic)
+        except PyMongoError as e:
+            logging.warning(f"Empowerment pool unavailable: {str(e)}")
+            messages = []
+        if len(messages) < EMPOWERMENT_POOL_LOW_WATER:
+            self.refill_later(topic)
+
+        candidates = [m for m in messages if m["hash"] not in seen]
+        if not candidates:
+            inc("empowerment_pool_total", topic=topic, outcome="live")
+            text = get_empowering_response(topic=topic)
+            self._store(topic, text, uses=1)
+            return text
+
+        message = random.choice(candidates)
+        with self.lock:
+            message["uses"] = message.get("uses", 0) + 1
+            if message["uses"] >= EMPOWERMENT_MAX_USES and message in self.cache.get(topic, []):
+                self.cache[topic].remove(message)
+        try:
+            self.collection.update_one({"_id": message["_id"]}, {"$inc": {"uses": 1}})
+        except PyMongoError as e:
+            logging.warning(f"Could not count empowerment message use: {str(e)}")
+        inc("empowerment_pool_total", topic=topic, outcome="pool")
+        return message["text"]
+
+    def _store(self, topic, text, uses=0):
+        try:
+            self._ensure_indexes()
+            self.collection.insert_one({"topic": topic, "text": text, "hash": text_hash(text), "uses": uses,
+                                        "created_at": datetime.utcnow().isoformat()})
+            return True
+        except DuplicateKeyError:
+            return False
+        except PyMongoError as e:
+            logging.warning(f"Could not store empowerment message: {str(e)}")
+            return False
+
+    def _get_refiller(self):
+        """One refill thread per worker process (threads don't survive gunicorn's fork)"""
+        if self._refiller_pid != os.getpid():
+            self._refiller_pid = os.getpid()
+            self._refiller = ThreadPoolExecutor(max_workers=1, thread_name_prefix="empowerment-refill")
+            self.refilling = set()   # refills the parent had queued don't run here
+        return self._refiller
+
+    def refill_later(self, topic):
+        with self.lock:
+            refiller = self._get_refiller()
+            if topic in self.refilling:
+                return
+            self.refilling.add(topic)
+        refiller.submit(self._refill, topic)
+
+    def _refill(self, topic):
+        """Top the topic up to EMPOWERMENT_POOL_TARGET, re-counting so workers refilling at once don't overshoot"""
+        added = 0
+        started = time.time()
+        try:
+            self._ensure_indexes()
+            for _ in range(EMPOWERMENT_POOL_TARGET * 2):   # bounded, in case Gemini keeps repeating itself
+                live = self.collection.count_documents({"topic": topic, "uses": {"$lt": EMPOWERMENT_MAX_USES}})
+                if live >= EMPOWERMENT_POOL_TARGET:
+                    break
+                if self._store(topic, get_empowering_response(topic=topic, purpose="empowerment_pool")):
+                    added += 1
+        except Exception as e:
+            logging.error(f"Empowerment pool refill for '{topic}' failed: {str(e)}")
+        finally:
+            with self.lock:
+                self.refilling.discard(topic)
+                self.loaded_at[topic] = 0.0   # re-read on next use
+        if added:
+            logging.info(f"Empowerment pool '{topic}' refilled with {added} messages in {time.time() - started:.1f} s")
+
+    def warm(self):
+        """Start filling topics that are below the low-water mark"""
+        for topic in self.cache:
+            try:
+                if len(self._messages(topic)) < EMPOWERMENT_POOL_LOW_WATER:
+                    self.refill_later(topic)
+            except PyMongoError as e:
+                logging.warning(f"Empowerment pool unavailable: {str(e)}")
+
+
+empowerment_pool = EmpowermentPool(empowerment_collection)
+
+
+def get_pooled_empowering_response(topic="women empowerment", history_texts=()):
+    """Drop-in for get_empowering_response that serves from the pool"""
+    return empowerment_pool.take(topic, history_texts)
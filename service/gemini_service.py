@@ -1,9 +1,19 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
+from service.llm_provider import get_chat_model
+from utils.metrics import record_llm_usage
+from utils.admission import llm_call
+from utils.deadline import call_with_deadline
 
-# Initialize Gemini LLM once (you can reuse it)
-gemini_model = ChatGoogleGenerativeAI(model="gemini-1.5-flash", temperature=0.7)
+_gemini_model = None
 
-def get_empowering_response(topic="women empowerment") -> str:
+
+def get_gemini_model():
+    """Initialize Gemini LLM once on first use and reuse it"""
+    global _gemini_model
+    if _gemini_model is None:
+        _gemini_model = get_chat_model("gemini", model="gemini-1.5-flash", temperature=0.7)
+    return _gemini_model
+
+def get_empowering_response(topic="women empowerment", purpose="empowerment") -> str:
     """
     Get an empowering or motivational response from Gemini based on a given topic.
     Ideal for uplifting users when low sentiment is detected.
@@ -13,12 +23,14 @@ def get_empowering_response(topic="women empowerment") -> str:
         "Make sure it feels personal and motivational for a woman who might be feeling low, "
         "underconfident, or demotivated."
     )
-    response = gemini_model.invoke(prompt)
+    response = call_with_deadline(get_gemini_model().invoke, prompt, stage=purpose, hold=llm_call(purpose))
+    record_llm_usage(purpose, response)
     return response.content if hasattr(response, "content") else str(response)
 
-def gemini_prompt_response(prompt: str) -> str:
+def gemini_prompt_response(prompt: str, purpose: str = "general") -> str:
     """
     General-purpose Gemini LLM prompt function.
     """
-    response = gemini_model.invoke(prompt)
+    response = call_with_deadline(get_gemini_model().invoke, prompt, stage=purpose, hold=llm_call(purpose))
+    record_llm_usage(purpose, response)
     return response.content if hasattr(response, "content") else str(response)
\ No newline at end of file
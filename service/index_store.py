@@ -0,0 +1,310 @@
+import os
+import re
+import json
+import mmap
+import time
+import fcntl
+import shutil
+import hashlib
+import logging
+from array import array
+import numpy as np
+
+# The FAISS index and docstore are written once per corpus version and opened
+# read-only with mmap, so every gunicorn worker shares the same physical pages
+# through the page cache instead of holding its own copy. faiss-cpu 1.10 can only
+# map IVF inverted lists, so Flat indexes are also written as a raw vector file
+# that MmapFlatIndex searches in place.
+INDEX_DIR = os.getenv("INDEX_DIR", "data/index")
+FAISS_MMAP = os.getenv("FAISS_MMAP", "1") == "1"
+# A faiss.index_factory string, optionally followed by ";name=value" search parameters:
+# "Flat", "IVF256,Flat;nprobe=16", "HNSW32;efSearch=64", "IVF256,PQ32x8;nprobe=16", "SQfp16"
+FAISS_INDEX_SPEC = os.getenv("FAISS_INDEX_SPEC", "Flat")
+
+INDEX_FILE = "index.faiss"
+DOCSTORE_FILE = "docstore.jsonl"
+OFFSETS_FILE = "docstore.offsets"
+VECTORS_FILE = "vectors.npy"
+COMPLETE_MARKER = "COMPLETE"
+# Part of every version id; bump when the files written per version change
+INDEX_LAYOUT = "2"   # 2: Flat indexes also write VECTORS_FILE
+VERSION_RE = re.compile(r"[0-9a-f]{16}")   # corpus_fingerprint() ids
+
+
+def corpus_fingerprint(paths, extra=""):
+    """Version id for a corpus: changes whenever a file is added, removed or modified"""
+    digest = hashlib.sha1(f"{INDEX_LAYOUT}|{extra}".encode("utf-8"))
+    for path in sorted(paths):
+        stat = os.stat(path)
+        digest.update(f"{path}:{stat.st_size}:{int(stat.st_mtime)}".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def parse_index_spec(spec):
+    """Split an index spec into its factory string and search parameters"""
+    factory, _, params = (spec or "Flat").partition(";")
+    search_params = {}
+    for item in params.split(";"):
+        if not item.strip():
+            continue
+        name, _, value = item.partition("=")
+        search_params[name.strip()] = float(value) if "." in value else int(value)
+    return factory.strip(), search_params
+
+
+def apply_search_params(index, search_params):
+    """Set nprobe, efSearch, ... on an index (also through IDMap/refine wrappers)"""
+    import faiss
+
+    if not search_params:
+        return
+
+    space = faiss.ParameterSpace()
+    for name, value in search_params.items():
+        space.set_index_parameter(index, name, value)
+
+
+def build_faiss_index(vectors, spec):
+    """Build an index from float32 vectors, training it on them first when the type needs it"""
+    import faiss
+
+    factory, search_params = parse_index_spec(spec)
+    index = faiss.index_factory(vectors.shape[1], factory, faiss.METRIC_L2)
+    if not index.is_trained:
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None and len(vectors) < ivf.nlist:
+            raise ValueError(f"Index spec '{factory}' needs at least {ivf.nlist} vectors to train, "
+                             f"the corpus has {len(vectors)}")
+        start_time = time.time()
+        index.train(vectors)
+        logging.info(f"Trained FAISS index '{factory}' on {len(vectors)} vectors in {time.time() - start_time:.2f} s")
+    index.add(vectors)
+    apply_search_params(index, search_params)
+    return index
+
+
+class MmapFlatIndex:
+    """
+    Exact L2 search over a memory-mapped float32 matrix, in place of IndexFlatL2.
+    Implements the part of the faiss Index interface the LangChain FAISS store uses.
+    """
+
+    is_trained = True
+
+    def __init__(self, vectors):
+        import faiss
+
+        self.vectors = vectors
+        self.ntotal, self.d = vectors.shape
+        self.metric_type = faiss.METRIC_L2
+        # Squared norms are the only private copy: 4 bytes per row
+        self.norms = np.einsum("ij,ij->i", vectors, vectors)
+
+    def search(self, x, k, *args, **kwargs):
+        x = np.ascontiguousarray(x, dtype="float32")
+        distances = self.norms[None, :] - 2 * (x @ self.vectors.T) + np.einsum("ij,ij->i", x, x)[:, None]
+        found = min(k, self.ntotal)
+        D = np.full((len(x), k), np.inf, dtype="float32")
+        I = np.full((len(x), k), -1, dtype="int64")
+        if found:
+            top = np.argpartition(distances, found - 1, axis=1)[:, :found]
+            rows = np.arange(len(x))[:, None]
+            order = np.argsort(distances[rows, top], axis=1)
+            I[:, :found] = top[rows, order]
+            D[:, :found] = np.maximum(distances[rows, I[:, :found]], 0)
+        return D, I
+
+    def reconstruct(self, i):
+        return np.array(self.vectors[i])
+
+    def reconstruct_n(self, i0, n):
+        return np.array(self.vectors[i0:i0 + n])
+
+
+def write_flat_vectors(directory, index):
+    """Write a Flat L2 index's rows as VECTORS_FILE; other index types are left alone"""
+    import faiss
+
+    if not isinstance(index, faiss.IndexFlat) or index.metric_type != faiss.METRIC_L2:
+        return
+    path = os.path.join(directory, VECTORS_FILE)
+    with open(path + ".tmp", "wb") as f:
+        np.save(f, index.reconstruct_n(0, index.ntotal))
+    os.replace(path + ".tmp", path)
+
+
+def load_docstore(directory):
+    """The whole docstore in memory, for FAISS_MMAP=0"""
+    from langchain_core.documents import Document
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+
+    mapped = MmapDocstore(directory)
+    documents = {str(i): mapped.search(i) for i in range(len(mapped))}
+    return InMemoryDocstore(documents)
+
+
+class MmapDocstore:
+    """
+    Read-only docstore over a memory-mapped JSONL file.
+    Document i is stored at bytes offsets[i]:offsets[i + 1] and decoded on lookup.
+    """
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, DOCSTORE_FILE), "rb") as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+        with open(os.path.join(directory, OFFSETS_FILE), "rb") as f:
+            self._offsets_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._offsets = memoryview(self._offsets_map).cast("Q")
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def search(self, search):
+        from langchain_core.documents import Document
+
+        i = int(search)
+        if i < 0 or i >= len(self):
+            return f"ID {search} not found."
+        record = json.loads(self._data[self._offsets[i]:self._offsets[i + 1]])
+        return Document(page_content=record["c"], metadata=record["m"])
+
+    def add(self, texts):
+        # FAISS.add_texts / delete land here; a corpus change is a new index version instead
+        raise TypeError("read-only mmap docstore: documents can't be added, rebuild the index for the new corpus")
+
+    def delete(self, ids):
+        raise TypeError("read-only mmap docstore: documents can't be deleted, rebuild the index for the new corpus")
+
+
+class IndexToDocstoreId:
+    """Identity mapping row i -> docstore id "i" without a per-row dict"""
+
+    def __init__(self, size):
+        self.size = size
+
+    def __getitem__(self, i):
+        if 0 <= i < self.size:
+            return str(i)
+        raise KeyError(i)
+
+    def get(self, i, default=None):
+        return str(i) if 0 <= i < self.size else default
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        return iter(range(self.size))
+
+    def items(self):
+        return ((i, str(i)) for i in range(self.size))
+
+    def values(self):
+        return (str(i) for i in range(self.size))
+
+
+def write_index(directory, index, documents):
+    """Write a FAISS index and its documents (row order) into directory"""
+    import faiss
+
+    os.makedirs(directory, exist_ok=True)
+    faiss.write_index(index, os.path.join(directory, INDEX_FILE))
+    write_flat_vectors(directory, index)
+
+    offsets = array("Q", [0])
+    with open(os.path.join(directory, DOCSTORE_FILE), "wb") as f:
+        for doc in documents:
+            payload = json.dumps({"c": doc.page_content, "m": doc.metadata}, ensure_ascii=False).encode("utf-8")
+            f.write(payload)
+            offsets.append(offsets[-1] + len(payload))
+    with open(os.path.join(directory, OFFSETS_FILE), "wb") as f:
+        offsets.tofile(f)
+
+    with open(os.path.join(directory, COMPLETE_MARKER), "w") as f:
+        f.write(str(time.time()))
+
+
+def read_index(directory):
+    """Open a written index, memory-mapped and read-only when FAISS_MMAP is on"""
+    import faiss
+
+    path = os.path.join(directory, INDEX_FILE)
+    if not FAISS_MMAP:
+        return faiss.read_index(path), load_docstore(directory)
+    if os.path.exists(os.path.join(directory, VECTORS_FILE)):
+        vectors = np.load(os.path.join(directory, VECTORS_FILE), mmap_mode="r")
+        return MmapFlatIndex(vectors), MmapDocstore(directory)
+    # IO_FLAG_MMAP maps IVF inverted lists; IO_FLAG_MMAP_IFC (newer builds) maps flat code arrays
+    ifc = getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+    index = faiss.read_index(path, faiss.IO_FLAG_READ_ONLY | faiss.IO_FLAG_MMAP | ifc)
+    if not ifc and faiss.try_extract_index_ivf(index) is None:
+        logging.warning(f"This faiss build can't memory-map a {type(index).__name__}; "
+                        f"each worker holds its own copy of {directory}")
+    return index, MmapDocstore(directory)
+
+
+def vectorstore_from_dir(directory, embeddings, search_params=None):
+    from langchain_community.vectorstores import FAISS
+
+    index, docstore = read_index(directory)
+    # Search parameters are not part of the index version, so they can change without a rebuild
+    apply_search_params(index, search_params or {})
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=IndexToDocstoreId(index.ntotal),
+    )
+
+
+def prune_versions(keep, min_age_seconds=3600):
+    """
+    Delete index versions other than keep that nobody has built or opened for a while.
+    Workers still mapping a deleted version keep reading it until they swap.
+    """
+    if not os.path.isdir(INDEX_DIR):
+        return
+    cutoff = time.time() - min_age_seconds
+    for entry in os.listdir(INDEX_DIR):
+        version = entry.split(".")[0]
+        path = os.path.join(INDEX_DIR, entry)
+        # Only corpus_fingerprint() names; other files (e.g. the force_reload marker) stay
+        if version in keep or not VERSION_RE.fullmatch(version):
+            continue
+        try:
+            if os.path.getmtime(path) > cutoff:
+                continue
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+            logging.info(f"Pruned old FAISS index {entry}")
+        except OSError:
+            continue
+
+
+def load_or_build(version, embeddings, build_index, search_params=None):
+    """
+    Return the shared vector store for a corpus version.
+    build_index() returns (faiss index, documents in row order). The first process
+    to get the lock builds and writes it; every other worker (or a later restart)
+    just maps the files.
+    """
+    directory = os.path.join(INDEX_DIR, version)
+    os.makedirs(INDEX_DIR, exist_ok=True)
+
+    with open(os.path.join(INDEX_DIR, f"{version}.lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            if not os.path.exists(os.path.join(directory, COMPLETE_MARKER)):
+                start_time = time.time()
+                index, documents = build_index()
+                staging = f"{directory}.tmp{os.getpid()}"
+                write_index(staging, index, documents)
+                shutil.rmtree(directory, ignore_errors=True)
+                os.replace(staging, directory)
+                logging.info(f"Wrote FAISS index {version} in {time.time() - start_time:.2f} s")
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    return vectorstore_from_dir(directory, embeddings, search_params)
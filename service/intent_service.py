@@ -1,9 +1,43 @@
+import os
 import json
 import re
-from langchain_google_genai import ChatGoogleGenerativeAI
+from service.llm_provider import get_chat_model
+from utils.metrics import record_llm_usage
+from utils.admission import llm_call
+from utils.deadline import call_with_deadline, deadline_scope, has_budget, remaining, skip_stage, DeadlineExceeded
+
+# Intent detection is optional: it gets at most this long, and only what the answer can spare
+INTENT_MAX_SECONDS = float(os.getenv("INTENT_MAX_SECONDS", "5"))
+INTENT_MIN_SECONDS = 1.0
+
+def general_intent():
+    return {
+        "intent": "general",
+        "data": {
+            "name": None,
+            "email": None,
+            "phone": None,
+            "skills": [],
+            "bio": None
+        }
+    }
+
+def detect_intent_within_budget(user_input, reserve_seconds):
+    """detect_intent_and_data, or the general intent when the request can't spare the time"""
+    if not has_budget(reserve_seconds + INTENT_MIN_SECONDS):
+        skip_stage("intent")
+        return general_intent()
+    left = remaining()
+    budget = INTENT_MAX_SECONDS if left is None else min(INTENT_MAX_SECONDS, left - reserve_seconds)
+    try:
+        with deadline_scope(budget):
+            return detect_intent_and_data(user_input)
+    except DeadlineExceeded:
+        skip_stage("intent", reason="timeout")
+        return general_intent()
 
 def detect_intent_and_data(user_input):
-    model = ChatGoogleGenerativeAI(model="gemini-1.5-flash", temperature=0.2)
+    model = get_chat_model("intent", model="gemini-1.5-flash", temperature=0.2)
 
     prompt = f"""
 You are an intelligent assistant that classifies user intent and extracts structured data.
@@ -25,7 +59,8 @@ Analyze this text and return the result in the format above:
 \"\"\"{user_input}\"\"\"
 """
 
-    response = model.invoke(prompt)
+    response = call_with_deadline(model.invoke, prompt, stage="intent", hold=llm_call("intent"))
+    record_llm_usage("intent", response)
 
     # Extract JSON safely using regex
     try:
@@ -35,13 +70,4 @@ Analyze this text and return the result in the format above:
         else:
             raise ValueError("No JSON found")
     except Exception:
-        return {
-            "intent": "general",
-            "data": {
-                "name": None,
-                "email": None,
-                "phone": None,
-                "skills": [],
-                "bio": None
-            }
-        }
\ No newline at end of file
+        return general_intent()
\ No newline at end of file
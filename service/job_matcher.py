@@ -0,0 +1,321 @@
+import os
+import re
+import math
+import time
+import logging
+import threading
+import numpy as np
+from service.structured_index import JOBS_PATH, load_job_records
+from utils.metrics import inc
+
+# Skill-to-job matching: an inverted index from normalized skill terms to job rows,
+# scored as a sparse dot product between the profile vector and each job vector.
+RECOMMENDED_JOBS_LIMIT = int(os.getenv("RECOMMENDED_JOBS_LIMIT", "10"))
+JOB_FEED_CHECK_SECONDS = float(os.getenv("JOB_FEED_CHECK_SECONDS", "30"))
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "10000"))
+BIO_WEIGHT = 0.3          # bio words count, but less than listed skills
+PHRASE_PART_WEIGHT = 0.5  # "machine learning" also matches "machine" and "learning", weakly
+COMPACT_DEAD_RATIO = 0.5
+
+SKILL_ALIASES = {
+    "js": "javascript",
+    "reactjs": "react",
+    "react.js": "react",
+    "nodejs": "node.js",
+    "node": "node.js",
+    "golang": "go",
+    "py": "python",
+    "ts": "typescript",
+    "k8s": "kubernetes",
+    "postgres": "postgresql",
+    "ml": "machine learning",
+    "ai": "artificial intelligence",
+    "nlp": "natural language processing",
+    "ui": "user interface",
+    "ux": "user experience",
+    "sde": "software development engineer",
+    "swe": "software engineer",
+    "qa": "quality assurance",
+}
+
+# Seniority and filler words that say nothing about the skills a job needs
+STOP_WORDS = {
+    "a", "an", "and", "or", "of", "the", "for", "in", "at", "to", "with", "on", "as",
+    "i", "ii", "iii", "iv", "sr", "jr", "senior", "junior", "lead", "principal", "staff",
+    "associate", "intern", "trainee", "level", "years", "year", "experience", "good",
+    "knowledge", "strong", "skills", "skill", "india", "remote", "hybrid", "team",
+}
+
+TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9+#.]*")
+# Job fields that describe the work; feeds with descriptions or skill lists use them too
+JOB_TEXT_FIELDS = ("job_position", "title", "skills", "job_skills", "job_description", "description")
+
+
+def tokenize(text):
+    """Lowercase skill tokens with aliases expanded; keeps c++, c#, node.js"""
+    tokens = []
+    for token in TOKEN_RE.findall((text or "").lower()):
+        token = token.rstrip(".")
+        token = SKILL_ALIASES.get(token, token)
+        tokens.extend(token.split())
+    return [t for t in tokens if t and t not in STOP_WORDS]
+
+
+def job_key(job):
+    return str(job.get("job_id") or job.get("job_link")
+               or f"{job.get('job_position', '')}|{job.get('company_name', '')}")
+
+
+def job_terms(job):
+    """The set of unigram and bigram terms of a job record"""
+    terms = set()
+    for field in JOB_TEXT_FIELDS:
+        value = job.get(field)
+        if isinstance(value, list):
+            value = ", ".join(str(v) for v in value)
+        if not isinstance(value, str):
+            continue
+        # Split on punctuation first so bigrams never span "Engineer, Data"
+        for part in re.split(r"[,;/|()\-–]+", value):
+            tokens = tokenize(part)
+            terms.update(tokens)
+            terms.update(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+    return terms
+
+
+def profile_terms(skills, bio=""):
+    """{term: weight} for a profile: each skill as a phrase plus its words, bio words weakly"""
+    if isinstance(skills, str):
+        skills = skills.replace(";", ",").split(",")
+    weights = {}
+
+    def add(term, weight):
+        weights[term] = max(weights.get(term, 0.0), weight)
+
+    for skill in skills or []:
+        tokens = tokenize(str(skill))
+        if not tokens:
+            continue
+        if len(tokens) == 1:
+            add(tokens[0], 1.0)
+            continue
+        for a, b in zip(tokens, tokens[1:]):
+            add(f"{a} {b}", 1.0)
+        for token in tokens:
+            add(token, PHRASE_PART_WEIGHT)
+    for token in tokenize(bio):
+        add(token, BIO_WEIGHT)
+    return weights
+
+
+class _Postings:
+    """Rows and weights of one term, appended as Python lists and frozen to arrays on read"""
+
+    __slots__ = ("rows", "weights", "df", "_arrays")
+
+    def __init__(self):
+        self.rows = []
+        self.weights = []
+        self.df = 0           # live rows only; dead rows stay until the next compaction
+        self._arrays = None
+
+    def append(self, row, weight):
+        self.rows.append(row)
+        self.weights.append(weight)
+        self.df += 1
+        self._arrays = None
+
+    def arrays(self):
+        if self._arrays is None:
+            self._arrays = (np.asarray(self.rows, dtype=np.int64),
+                            np.asarray(self.weights, dtype=np.float32))
+        return self._arrays
+
+
+class SkillIndex:
+    """Inverted index from skill terms to job rows, updated job by job"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.jobs = []          # row -> job record
+        self.sources = []       # row -> where the job came from ("file" or "feed")
+        self.row_terms = []     # row -> frozenset of terms
+        self.rows_by_key = {}   # job key -> live row
+        self.alive = np.zeros(0, dtype=bool)
+        self.postings = {}      # term -> _Postings
+        self.dead = 0
+
+    def __len__(self):
+        return len(self.rows_by_key)
+
+    def upsert(self, job, source="feed"):
+        """Add a job, replacing the previous version with the same key"""
+        with self.lock:
+            self._remove(job_key(job))
+            self._add(job, source)
+            self._maybe_compact()
+
+    def remove(self, key):
+        with self.lock:
+            self._remove(key)
+            self._maybe_compact()
+
+    def _add(self, job, source):
+        terms = frozenset(job_terms(job))
+        row = len(self.jobs)
+        self.jobs.append(job)
+        self.sources.append(source)
+        self.row_terms.append(terms)
+        self.rows_by_key[job_key(job)] = row
+        if row >= len(self.alive):
+            grown = np.zeros(max(64, 2 * len(self.alive)), dtype=bool)
+            grown[:len(self.alive)] = self.alive
+            self.alive = grown
+        self.alive[row] = True
+        # Binary term weights, length-normalized so long descriptions don't dominate
+        weight = 1.0 / math.sqrt(len(terms)) if terms else 0.0
+        for term in terms:
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = _Postings()
+            postings.append(row, weight)
+
+    def _remove(self, key):
+        row = self.rows_by_key.pop(key, None)
+        if row is None:
+            return
+        self.alive[row] = False
+        self.dead += 1
+        for term in self.row_terms[row]:
+            self.postings[term].df -= 1
+
+    def _maybe_compact(self):
+        if self.dead and self.dead > COMPACT_DEAD_RATIO * len(self.jobs):
+            live = [(self.jobs[row], self.sources[row]) for row in sorted(self.rows_by_key.values())]
+            self._reset()
+            for job, source in live:
+                self._add(job, source)
+
+    def sync(self, jobs, source="file"):
+        """
+        Make the index hold exactly these jobs from source, touching only the ones that
+        changed. Jobs from other sources are left alone, and win over these on a shared key.
+        """
+        incoming = {job_key(job): job for job in jobs}
+        with self.lock:
+            added = removed = 0
+            for key, row in list(self.rows_by_key.items()):
+                if key not in incoming and self.sources[row] == source:
+                    self._remove(key)
+                    removed += 1
+            for key, job in incoming.items():
+                row = self.rows_by_key.get(key)
+                if row is not None and (self.sources[row] != source or self.jobs[row] == job):
+                    continue
+                self._remove(key)
+                self._add(job, source)
+                added += 1
+            self._maybe_compact()
+        return added, removed
+
+    def score(self, query_weights, limit):
+        """Top jobs by sparse dot product: [(job, score, matched terms)]"""
+        with self.lock:
+            live = len(self.rows_by_key)
+            if not live or not query_weights:
+                return []
+            scores = np.zeros(len(self.jobs), dtype=np.float32)
+            for term, weight in query_weights.items():
+                postings = self.postings.get(term)
+                if postings is None or postings.df <= 0:
+                    continue
+                rows, weights = postings.arrays()
+                # Rare skills say more about fit than ones every job lists
+                idf = math.log(1.0 + live / postings.df)
+                scores[rows] += weights * np.float32(weight * idf)
+            scores[~self.alive[:len(scores)]] = 0.0
+
+            candidates = np.flatnonzero(scores > 0)
+            if len(candidates) > limit:
+                candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+            candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+            return [(self.jobs[row], float(scores[row]),
+                     sorted(t for t in query_weights if t in self.row_terms[row]))
+                    for row in candidates]
+
+
+_index = SkillIndex()
+_feed_mtime = None
+_feed_checked = 0.0
+_feed_lock = threading.Lock()
+_profile_vectors = {}     # user id -> (updated_at, {term: weight})
+
+
+def get_skill_index():
+    """The shared skill index, re-synced with the saved jobs feed when the file changes"""
+    global _feed_mtime, _feed_checked
+    now = time.monotonic()
+    if now - _feed_checked < JOB_FEED_CHECK_SECONDS and _feed_mtime is not None:
+        return _index
+    with _feed_lock:
+        if now - _feed_checked < JOB_FEED_CHECK_SECONDS and _feed_mtime is not None:
+            return _index
+        _feed_checked = now
+        try:
+            mtime = os.path.getmtime(JOBS_PATH)
+        except OSError:
+            mtime = 0.0
+        if mtime != _feed_mtime:
+            start_time = time.time()
+            added, removed = _index.sync(load_job_records(), source="file")
+            _feed_mtime = mtime
+            logging.info(f"Skill index synced in {(time.time() - start_time) * 1000:.1f} ms: "
+                         f"{added} jobs indexed, {removed} removed, {len(_index)} total")
+    return _index
+
+
+def ingest_jobs(jobs):
+    """Index jobs from a live feed as they arrive, without rebuilding"""
+    index = get_skill_index()
+    for job in jobs or []:
+        if isinstance(job, dict):
+            index.upsert(job, source="feed")
+    inc("jobs_indexed_total", len(jobs or []), source="feed")
+
+
+def profile_vector(user):
+    """Profile term weights, cached until the profile's updated_at changes"""
+    user_id = str(user["_id"])
+    updated_at = user.get("updated_at")
+    cached = _profile_vectors.get(user_id)
+    if cached is not None and cached[0] == updated_at:
+        return cached[1]
+    weights = profile_terms(user.get("skills", []), user.get("bio", ""))
+    if len(_profile_vectors) >= PROFILE_CACHE_SIZE:
+        _profile_vectors.clear()
+    _profile_vectors[user_id] = (updated_at, weights)
+    return weights
+
+
+def recommend_jobs(user, extra_skills=None, limit=RECOMMENDED_JOBS_LIMIT):
+    """Rank indexed jobs against a user profile; no LLM involved"""
+    weights = profile_vector(user)
+    if extra_skills:
+        weights = dict(weights)
+        for term, weight in profile_terms(extra_skills).items():
+            weights[term] = max(weights.get(term, 0.0), weight)
+    matches = get_skill_index().score(weights, limit)
+    inc("job_recommendations_total", hit="yes" if matches else "no")
+    return [{
+        "job_id": job.get("job_id"),
+        "position": job.get("job_position", ""),
+        "company": job.get("company_name", ""),
+        "location": job.get("job_location", ""),
+        "posted": job.get("job_posting_date", ""),
+        "link": job.get("job_link", ""),
+        "score": round(score, 4),
+        "matched_skills": matched
+    } for job, score, matched in matches]
@@ -0,0 +1,182 @@
+import os
+import gzip
+import json
+import time
+import atexit
+import random
+import hashlib
+import logging
+import threading
+from functools import lru_cache
+from typing import Any, Optional
+from utils.metrics import inc
+
+# live: call Gemini. record: call Gemini and store prompt-hash -> response.
+# replay: serve stored responses only, optionally with simulated latency.
+LLM_MODE = os.getenv("LLM_MODE", "live")
+LLM_RECORDINGS_PATH = os.getenv("LLM_RECORDINGS_PATH", "data/llm_recordings.jsonl.gz")
+# "recorded", "fixed:<ms>", "normal:<mean_ms>:<stddev_ms>" or "lognormal:<median_ms>:<sigma>"
+LLM_REPLAY_LATENCY = os.getenv("LLM_REPLAY_LATENCY", "")
+# What a replay miss does: "empty" returns an empty answer, "live" calls Gemini instead
+LLM_REPLAY_MISS = os.getenv("LLM_REPLAY_MISS", "empty")
+DEFAULT_MODEL = "gemini-1.5-flash"
+
+
+class RecordingStore:
+    """Append-only gzip JSONL of recorded responses, loaded into a dict on first use"""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = None
+        self.lock = threading.Lock()
+        self.misses = {}
+
+    def load(self):
+        if self.entries is not None:
+            return self.entries
+        with self.lock:
+            if self.entries is None:
+                entries = {}
+                if os.path.exists(self.path):
+                    start_time = time.time()
+                    with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                        for line in f:
+                            try:
+                                record = json.loads(line)
+                            except ValueError:
+                                continue  # tolerate a torn last line from an interrupted recording
+                            entries[record["k"]] = record
+                    logging.info(f"Loaded {len(entries)} LLM recordings in {(time.time() - start_time) * 1000:.0f} ms")
+                self.entries = entries
+        return self.entries
+
+    def get(self, key):
+        return self.load().get(key)
+
+    def put(self, key, purpose, content, usage, latency_ms):
+        record = {"k": key, "p": purpose, "r": content, "u": usage, "ms": round(latency_ms)}
+        with self.lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Each append is its own gzip member, which gzip readers concatenate transparently
+            with gzip.open(self.path, "at", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+            if self.entries is not None:
+                self.entries[key] = record
+
+    def record_miss(self, purpose, key):
+        with self.lock:
+            self.misses[purpose] = self.misses.get(purpose, 0) + 1
+        inc("llm_replay_misses_total", purpose=purpose)
+        logging.warning(f"LLM replay miss for purpose '{purpose}' (key {key[:12]})")
+
+
+_store = RecordingStore(LLM_RECORDINGS_PATH)
+_rng = random.Random(int(os.getenv("LLM_REPLAY_SEED", "0")))
+
+
+def prompt_key(model_id, messages, stop=None):
+    """Stable hash of everything that determines the model's answer"""
+    payload = json.dumps({
+        "model": model_id,
+        "messages": [[m.type, m.content] for m in messages],
+        "stop": stop or [],
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def simulated_latency(record):
+    """Seconds to sleep before serving a replayed response"""
+    spec = LLM_REPLAY_LATENCY.split(":") if LLM_REPLAY_LATENCY else []
+    if not spec:
+        return 0.0
+    kind = spec[0]
+    if kind == "recorded":
+        return (record.get("ms") or 0) / 1000
+    if kind == "fixed":
+        return float(spec[1]) / 1000
+    if kind == "normal":
+        return max(0.0, _rng.gauss(float(spec[1]), float(spec[2]))) / 1000
+    if kind == "lognormal":
+        return _rng.lognormvariate(0.0, float(spec[2])) * float(spec[1]) / 1000
+    return 0.0
+
+
+@lru_cache(maxsize=None)
+def record_replay_model_class():
+    """Build the record/replay model class on first use so LangChain loads lazily"""
+    from langchain_core.language_models.chat_models import BaseChatModel
+    from langchain_core.messages import AIMessage
+    from langchain_core.outputs import ChatGeneration, ChatResult
+
+    class RecordReplayChatModel(BaseChatModel):
+        """Chat model that records live Gemini responses or replays stored ones"""
+
+        purpose: str
+        model_id: str = DEFAULT_MODEL
+        mode: str = "replay"
+        inner: Optional[Any] = None
+
+        @property
+        def _llm_type(self):
+            return f"record-replay-{self.mode}"
+
+        def _live(self, messages, stop):
+            start_time = time.perf_counter()
+            response = self.inner.invoke(messages, stop=stop)
+            return response, (time.perf_counter() - start_time) * 1000
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+            key = prompt_key(self.model_id, messages, stop)
+
+            if self.mode == "record":
+                response, latency_ms = self._live(messages, stop)
+                usage = getattr(response, "usage_metadata", None)
+                _store.put(key, self.purpose, response.content, usage, latency_ms)
+                message = AIMessage(content=response.content, usage_metadata=usage)
+                return ChatResult(generations=[ChatGeneration(message=message)])
+
+            record = _store.get(key)
+            if record is None:
+                _store.record_miss(self.purpose, key)
+                if LLM_REPLAY_MISS == "live" and self.inner is not None:
+                    response, _ = self._live(messages, stop)
+                    return ChatResult(generations=[ChatGeneration(message=AIMessage(content=response.content))])
+                return ChatResult(generations=[ChatGeneration(message=AIMessage(content=""))])
+
+            delay = simulated_latency(record)
+            if delay:
+                time.sleep(delay)
+            message = AIMessage(content=record["r"], usage_metadata=record.get("u"))
+            return ChatResult(generations=[ChatGeneration(message=message)])
+
+    return RecordReplayChatModel
+
+
+def get_chat_model(purpose, model=DEFAULT_MODEL, callbacks=None, **settings):
+    """
+    Return the chat model every LLM call site should use.
+    In record/replay mode the Gemini model is wrapped so responses are stored or served locally.
+    """
+    if LLM_MODE == "live":
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        return ChatGoogleGenerativeAI(model=model, callbacks=callbacks, **settings)
+
+    inner = None
+    if LLM_MODE == "record" or LLM_REPLAY_MISS == "live":
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        inner = ChatGoogleGenerativeAI(model=model, **settings)
+    return record_replay_model_class()(purpose=purpose, model_id=model, mode=LLM_MODE, inner=inner,
+                                       callbacks=callbacks)
+
+
+def replay_misses():
+    """Replay misses per purpose since the process started"""
+    return dict(_store.misses)
+
+
+@atexit.register
+def _report_misses():
+    if _store.misses:
+        logging.warning(f"LLM replay misses by purpose: {json.dumps(_store.misses, sort_keys=True)}")
@@ -0,0 +1,72 @@
+import os
+import re
+import time
+import logging
+from utils.metrics import span, inc
+
+# Picks the QA prompt variant for a chat question from its keywords and the
+# sources of the retrieved documents, so only the relevant JSON template is sent.
+
+# Keywords also match their plural ("conference" matches "conferences")
+KEYWORDS = {
+    "events": ["event", "conference", "summit", "hackathon", "webinar", "meetup", "workshop", "expo"],
+    "jobs": ["job", "role", "position", "opening", "vacancy", "vacancies", "hiring", "apply", "internship", "salary"],
+    "news": ["news", "latest", "announced", "announcement", "headline", "article", "update"],
+    "jobsforher": ["jobsforher", "jobs for her", "foundation"],
+}
+# Corpus file -> variant its documents belong to
+SOURCE_VARIANTS = {
+    "tech_event.pdf": "events",
+    "job1.pdf": "jobs",
+    "news.pdf": "news",
+    "jobsForHer.pdf": "jobsforher",
+    "faqs.pdf": "faq",
+}
+KEYWORD_WEIGHT = 2.0
+MIN_SCORE = 1.5
+AMBIGUITY_RATIO = 0.75       # runner-up this close to the winner -> generic prompt
+FALLBACK_VARIANT = "generic"
+
+_KEYWORD_RES = {variant: re.compile(r"\b(" + "|".join(re.escape(w) for w in words) + r")s?\b")
+                for variant, words in KEYWORDS.items()}
+
+
+def route_query(question, docs):
+    """Return the prompt variant for a question and its retrieved documents"""
+    text = (question or "").lower()
+    scores = {}
+    for variant, pattern in _KEYWORD_RES.items():
+        if pattern.search(text):
+            scores[variant] = scores.get(variant, 0.0) + KEYWORD_WEIGHT
+    # JobsForHer questions always get the foundation template, even when they mention jobs
+    if "jobsforher" in scores:
+        return "jobsforher"
+
+    for rank, doc in enumerate(docs or []):
+        variant = SOURCE_VARIANTS.get(os.path.basename(doc.metadata.get("source", "")))
+        if variant:
+            scores[variant] = scores.get(variant, 0.0) + (1.0 if rank == 0 else 0.5)
+
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    if not ranked or ranked[0][1] < MIN_SCORE:
+        return FALLBACK_VARIANT
+    if len(ranked) > 1 and ranked[1][1] >= ranked[0][1] * AMBIGUITY_RATIO:
+        return FALLBACK_VARIANT
+    return ranked[0][0]
+
+
+def make_routed_qa_chain(chains, profile):
+    """Runnable that sends {input, context, chat_history} to the chain of the routed variant"""
+    from langchain_core.runnables import RunnableLambda
+
+    def run(inputs, config):
+        variant = route_query(inputs.get("input"), inputs.get("context"))
+        inc("qa_variant_total", profile=profile, variant=variant)
+        start_time = time.perf_counter()
+        with span(metric="qa_variant_seconds", profile=profile, variant=variant):
+            answer = chains[variant].invoke(inputs, config)
+        logging.info(f"QA variant '{variant}' for '{profile}' answered in "
+                     f"{(time.perf_counter() - start_time) * 1000:.0f} ms")
+        return answer
+
+    return RunnableLambda(run)
@@ -1,40 +1,29 @@
+import os
 import time
-from langchain_community.vectorstores import FAISS
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.chains import create_history_aware_retriever, create_retrieval_chain
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
-from langchain_core.messages import AIMessage, HumanMessage
-from utils.document_loader import load_documents_from_pdf
-
-
-def initialize_rag_system():
-    """Initialize the RAG system with real data"""
-    print("🔧 Initializing RAG system with real data...")
-    start_time = time.time()
-
-    docs = load_documents_from_pdf()
+import shutil
+import logging
+import threading
+from collections import deque
+from contextvars import ContextVar
+from contextlib import contextmanager
+from service.llm_provider import get_chat_model
+from utils.metrics import span, observe, inc, record_llm_usage
+from utils.admission import llm_slot
+from utils.deadline import call_with_deadline, has_budget, skip_stage, DeadlineExceeded
 
-    embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
-    vectorstore = FAISS.from_documents(docs, embedding=embeddings)
-    retriever = vectorstore.as_retriever()
+# LangChain, FAISS and the Google client are imported inside the builders below so
+# that importing this module (and the blueprints using it) stays cheap.
 
-    # LLM setup
-    model = ChatGoogleGenerativeAI(model="gemini-1.5-flash", temperature=0.3)
+EMBEDDING_MODEL = "models/embedding-001"
+# Each worker polls the corpus fingerprint this often and swaps in a rebuilt index when
+# the PDFs change; 0 disables the watcher (POST /chat/rag/reload still works).
+CORPUS_WATCH_SECONDS = float(os.getenv("CORPUS_WATCH_SECONDS", "30"))
 
-    # Rephrasing prompt
-    contextualize_q_prompt = ChatPromptTemplate.from_messages([
-        ("system", "Given chat history and a new user question, rephrase it as a standalone question."),
-        MessagesPlaceholder("chat_history"),
-        ("human", "{input}")
-    ])
-    history_aware_retriever = create_history_aware_retriever(model, retriever, contextualize_q_prompt)
+CONTEXTUALIZE_Q_PROMPT = "Given chat history and a new user question, rephrase it as a standalone question."
 
-    # QA prompt (corrected version)
-    qa_prompt =ChatPromptTemplate.from_messages([
-    ("system", """For event, job, or news-related queries, ALWAYS respond with JSON using this structure and only from context provided:
+CHAT_QA_HEADER = "For event, job, or news-related queries, ALWAYS respond with JSON using this structure and only from context provided:"
 
-For Event Queries:
+EVENT_TEMPLATE = """For Event Queries:
 {{
     "summary": "Brief overview",
     "sections": [
@@ -63,9 +52,9 @@ For Event Queries:
             "url": "[registration_url]"
         }}
     ]
-}}
+}}"""
 
-For Job Queries:
+JOB_TEMPLATE = """For Job Queries:
 {{
     "summary": "Brief overview",
     "sections": [
@@ -95,9 +84,9 @@ For Job Queries:
             "url": "[application_url]"
         }}
     ]
-}}
+}}"""
 
-For News Queries:
+NEWS_TEMPLATE = """For News Queries:
 {{
     "summary": "[news_title]",
     "sections": [
@@ -119,9 +108,9 @@ For News Queries:
             "type": "news"
         }}
     ]
-}}
+}}"""
 
-Special Instructions for JobsForHer Foundation:
+JOBSFORHER_TEMPLATE = """Special Instructions for JobsForHer Foundation:
 - If the user query asks about **jobs** at **JobsForHer Foundation**, DO NOT provide job-related JSON.
 - Instead, retrieve  information about JobsForHer Foundation based ONLY on the context.
 - Format the response in this structure:
@@ -147,22 +136,534 @@ Special Instructions for JobsForHer Foundation:
             }}
         ]
     }}
-- If the user asks any other question about JobsForHer Foundation (not job-related), also answer based ONLY on context and using the same structure.
+- If the user asks any other question about JobsForHer Foundation (not job-related), also answer based ONLY on context and using the same structure."""
 
-IMPORTANT RULES:
+QA_RULES = """IMPORTANT RULES:
 - Only use information strictly from the provided context.
-- Never invent or assume missing information.
+- Never invent or assume missing information."""
+
+QA_CONTEXT = """
 
 
 Context: {context}
-    """),
-    MessagesPlaceholder("chat_history"),
-    ("human", "{input}")
-])
-    question_answer_chain = create_stuff_documents_chain(model, qa_prompt)
-    
+"""
+
+# The full prompt is the generic fallback; the variants carry only the template they need
+CHAT_QA_PROMPT = "\n\n".join([CHAT_QA_HEADER, EVENT_TEMPLATE, JOB_TEMPLATE, NEWS_TEMPLATE,
+                               JOBSFORHER_TEMPLATE, QA_RULES]) + QA_CONTEXT
+
+FAQ_QA_PROMPT = """You are a career support assistant for women. Answer the question in a few clear sentences of plain text.
+
+""" + QA_RULES + QA_CONTEXT
+
+CHAT_QA_PROMPTS = {
+    "events": "\n\n".join([CHAT_QA_HEADER, EVENT_TEMPLATE, QA_RULES]) + QA_CONTEXT,
+    "jobs": "\n\n".join([CHAT_QA_HEADER, JOB_TEMPLATE, QA_RULES]) + QA_CONTEXT,
+    "news": "\n\n".join([CHAT_QA_HEADER, NEWS_TEMPLATE, QA_RULES]) + QA_CONTEXT,
+    "jobsforher": "\n\n".join([JOBSFORHER_TEMPLATE, QA_RULES]) + QA_CONTEXT,
+    "faq": FAQ_QA_PROMPT,
+    "generic": CHAT_QA_PROMPT,
+}
+
+VOICE_QA_PROMPT = """You are a voice assistant for women's career support, answering a caller on the phone.
+Reply in two or three short spoken sentences of plain text. Do not use JSON, markdown, lists, URLs or emojis.
+If the caller asks about jobs or events, mention at most two, with their name and where or when they are.
+
+IMPORTANT RULES:
+- Only use information strictly from the provided context.
+- Never invent or assume missing information. If the context does not cover the question, say so briefly.
+
+Context: {context}
+"""
+
+# Each channel picks a profile; chains are built once per process and shared.
+RAG_PROFILES = {
+    "chat": {
+        "prompt": CHAT_QA_PROMPT,
+        "prompt_variants": CHAT_QA_PROMPTS,
+        "k": 4,
+        "fetch_k": 12,
+        "context_tokens": 3000,
+        "min_score": 0.4,
+        "model": "gemini-1.5-flash",
+        "temperature": 0.3,
+        "max_output_tokens": 2048,
+        "timeout": 30,
+        "rephrase_min_seconds": 8,     # less left than this: retrieve with the raw question
+        "degraded_chunks": 3,          # out of time: answer with this many retrieved chunks
+        "degraded_chars": 400,
+    },
+    "voice": {
+        "prompt": VOICE_QA_PROMPT,
+        "k": 2,
+        "fetch_k": 8,
+        "context_tokens": 800,
+        "min_score": 0.4,
+        "model": "gemini-1.5-flash",
+        "temperature": 0.3,
+        "max_output_tokens": 160,
+        "timeout": 8,
+        "rephrase_min_seconds": 4,
+        "degraded_chunks": 1,
+        "degraded_chars": 240,
+    },
+}
+
+_index_spec = None
+_current = None           # CorpusGeneration serving new requests
+_build_lock = threading.Lock()
+_swap_lock = threading.Lock()
+_watcher_pid = None
+_reload_running = threading.Lock()   # held while a requested reload runs on this worker
+_force_seen = None        # last force-reload request this worker has acted on
+FORCE_RELOAD_FILE = "force_reload"   # in INDEX_DIR, so every worker's watcher sees it
+_latencies = {name: deque(maxlen=500) for name in RAG_PROFILES}
+# Documents retrieved by the current invoke_rag call, kept for a degraded answer
+_retrieved = ContextVar("rag_retrieved", default=None)
+# Reserved after generation for structuring and saving the answer
+GENERATION_RESERVE_SECONDS = float(os.getenv("GENERATION_RESERVE_SECONDS", "1.5"))
+DEGRADED_ANSWER_INTRO = "I couldn't put together a full answer in time. Here is what I found that looks relevant:"
+VOICE_DEGRADED_INTRO = "I'm short on time, but here is what I found."
+
+
+class CorpusGeneration:
+    """One corpus version's vector store and chains, kept alive while requests use it"""
+
+    def __init__(self, version, vectorstore):
+        self.version = version
+        self.vectorstore = vectorstore
+        self.chains = {}
+        self.in_flight = 0
+        self.retired = False
+        self.lock = threading.Lock()
+
+    def chain(self, profile):
+        if profile not in self.chains:
+            with self.lock:
+                if profile not in self.chains:
+                    self.chains[profile] = build_rag_chain(profile, self.vectorstore)
+        return self.chains[profile]
+
+    def close(self):
+        logging.info(f"RAG corpus {self.version} retired; its last request finished")
+        self.chains = {}
+        self.vectorstore = None
+
+
+def make_usage_callback(purpose, metric="llm_tokens_total", **labels):
+    """Callback that counts tokens for LLM calls made inside a chain"""
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class LLMUsageCallback(BaseCallbackHandler):
+        def on_llm_end(self, response, **kwargs):
+            for generations in response.generations:
+                for generation in generations:
+                    record_llm_usage(purpose, getattr(generation, "message", None), metric, **labels)
+
+    return LLMUsageCallback()
+
+
+def timed_runnable(runnable, stage, profile):
+    """Wrap a runnable so each invocation is recorded as a stage span"""
+    from langchain_core.runnables import RunnableLambda
+
+    def run(inputs, config):
+        with span(stage, profile=profile):
+            result = runnable.invoke(inputs, config)
+        retrieved = _retrieved.get()
+        if stage == "retrieval" and retrieved is not None:
+            retrieved.extend(result)
+        return result
+    return RunnableLambda(run)
+
+
+def make_history_retriever(model, retriever, prompt, profile):
+    """
+    create_history_aware_retriever, except that the rephrasing call is skipped (and the
+    raw question retrieved with) when the request hasn't got time for it.
+    """
+    from langchain_core.output_parsers import StrOutputParser
+    from langchain_core.runnables import RunnableBranch
+
+    min_seconds = RAG_PROFILES[profile]["rephrase_min_seconds"]
+
+    def short_of_time(inputs):
+        if has_budget(min_seconds):
+            return False
+        skip_stage("rephrase")
+        return True
+
+    return RunnableBranch(
+        (lambda inputs: not inputs.get("chat_history"), (lambda inputs: inputs["input"]) | retriever),
+        (short_of_time, (lambda inputs: inputs["input"]) | retriever),
+        prompt | model | StrOutputParser() | retriever,
+    ).with_config(run_name="chat_retriever_chain")
+
+
+def degraded_answer(profile, docs):
+    """An answer made of the top retrieved chunks, for when generation ran out of time"""
+    settings = RAG_PROFILES[profile]
+    excerpts = []
+    for doc in docs[:settings["degraded_chunks"]]:
+        text = " ".join(doc.page_content.split())
+        if len(text) > settings["degraded_chars"]:
+            text = text[:settings["degraded_chars"]].rsplit(" ", 1)[0] + "..."
+        excerpts.append(text)
+    if profile == "voice":
+        return " ".join([VOICE_DEGRADED_INTRO] + excerpts) if excerpts else ""
+    if not excerpts:
+        return ""
+    return "\n\n".join([DEGRADED_ANSWER_INTRO] + [f"- {text}" for text in excerpts])
+
+
+def corpus_version():
+    """Fingerprint of the corpus files, embedding model and index type"""
+    from utils.document_loader import corpus_files
+    from service.index_store import FAISS_INDEX_SPEC, corpus_fingerprint, parse_index_spec
+    factory, _ = parse_index_spec(_index_spec or FAISS_INDEX_SPEC)
+    return corpus_fingerprint(corpus_files(), extra=f"{EMBEDDING_MODEL}|{factory}")
+
+
+def build_generation(version=None):
+    """Open (or build, if no worker has yet) the vector store for a corpus version"""
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+    from utils.document_loader import load_documents_from_pdf
+    from service.index_store import (INDEX_DIR, FAISS_INDEX_SPEC, parse_index_spec, build_faiss_index,
+                                     load_or_build)
+    from service.embedding_builder import embed_texts
+
+    spec = _index_spec or FAISS_INDEX_SPEC
+    _, search_params = parse_index_spec(spec)
+    version = version or corpus_version()
+    print(f"🔧 Initializing RAG system with real data ({spec}, corpus {version})...")
+    start_time = time.time()
+
+    embeddings = GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL)
+
+    # Embedded batches survive an interrupted build until the index is written
+    checkpoint_dir = os.path.join(INDEX_DIR, f"{version}.embeddings")
+
+    def build():
+        docs = load_documents_from_pdf()
+        vectors = embed_texts(embeddings, [doc.page_content for doc in docs],
+                              checkpoint_dir=checkpoint_dir, model=EMBEDDING_MODEL)
+        return build_faiss_index(vectors, spec), docs
+
+    vectorstore = load_or_build(version, embeddings, build, search_params)
+    shutil.rmtree(checkpoint_dir, ignore_errors=True)
+    print(f"✅ RAG ready in {time.time() - start_time:.2f} seconds with {vectorstore.index.ntotal} documents.")
+    return CorpusGeneration(version, vectorstore)
+
+
+def _swap(generation):
+    """Serve new requests from generation; the old one closes when its last request ends"""
+    global _current
+    with _swap_lock:
+        old, _current = _current, generation
+        idle = False
+        if old is not None:
+            old.retired = True
+            idle = old.in_flight == 0
+            in_flight = old.in_flight
+    if old is not None:
+        logging.info(f"RAG corpus swapped {old.version} -> {generation.version if generation else None} "
+                     f"({in_flight} requests finishing on the old one)")
+        if idle:
+            old.close()
+    return old
+
+
+def get_generation():
+    """The live corpus generation, built on first use"""
+    _start_watcher()
+    if _current is None:
+        with _build_lock:
+            if _current is None:
+                _swap(build_generation())
+    return _current
+
+
+def acquire_generation():
+    """Pin the live generation for one request; pair with release_generation()"""
+    while True:
+        generation = get_generation()
+        with _swap_lock:
+            if generation is _current:
+                generation.in_flight += 1
+                return generation
+
+
+def release_generation(generation):
+    with _swap_lock:
+        generation.in_flight -= 1
+        finished = generation.retired and generation.in_flight == 0
+    if finished:
+        generation.close()
+
+
+def get_vectorstore():
+    """The live generation's FAISS vector store, shared between profiles"""
+    return get_generation().vectorstore
+
+
+def reload_corpus(force=False):
+    """
+    Build the index for the current corpus files next to the live one and swap it in.
+    Returns the new version, or None when nothing changed. Requests keep running on the
+    old generation until they finish.
+    """
+    with _build_lock:
+        current = _current
+        version = corpus_version()
+        if current is not None and current.version == version and not force:
+            return None
+        start_time = time.time()
+        generation = build_generation(version)
+        # Warm the profiles already in use so the first request after the swap isn't slow
+        for profile in list(current.chains) if current is not None else []:
+            generation.chain(profile)
+        elapsed = time.time() - start_time
+        old = _swap(generation)
+    from service.index_store import prune_versions
+    prune_versions({version, old.version if old is not None else version})
+    observe("corpus_build_seconds", elapsed)
+    inc("corpus_swaps_total")
+    logging.info(f"RAG corpus {version} built in {elapsed:.2f} s and swapped in")
+    return version
+
+
+def request_reload(force=False):
+    """
+    Reload the corpus in a background thread; False when this worker is already
+    reloading. force also asks the other workers' watchers to reload.
+    """
+    global _force_seen
+    if force:
+        _force_seen = _write_force_request()
+    return _reload_in_background(force)
+
+
+def _reload_in_background(force):
+    if not _reload_running.acquire(blocking=False):
+        return False
+
+    def run():
+        try:
+            reload_corpus(force=force)
+        except Exception as e:
+            logging.error(f"RAG corpus reload failed: {str(e)}", exc_info=True)
+        finally:
+            _reload_running.release()
+
+    threading.Thread(target=run, name="corpus-reload", daemon=True).start()
+    return True
+
+
+def _write_force_request():
+    import uuid
+    from service.index_store import INDEX_DIR
+    marker = uuid.uuid4().hex
+    path = os.path.join(INDEX_DIR, FORCE_RELOAD_FILE)
+    os.makedirs(INDEX_DIR, exist_ok=True)
+    with open(path + f".{os.getpid()}.tmp", "w") as f:
+        f.write(marker)
+    os.replace(path + f".{os.getpid()}.tmp", path)
+    return marker
+
+
+def _read_force_request():
+    from service.index_store import INDEX_DIR
+    try:
+        with open(os.path.join(INDEX_DIR, FORCE_RELOAD_FILE)) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def _start_watcher():
+    """One watcher thread per worker process (threads don't survive gunicorn's fork)"""
+    global _watcher_pid
+    if CORPUS_WATCH_SECONDS <= 0 or _watcher_pid == os.getpid():
+        return
+    _watcher_pid = os.getpid()
+    threading.Thread(target=_watch_corpus, name="corpus-watcher", daemon=True).start()
+
+
+def _watch_corpus():
+    global _force_seen
+    seen, failed = None, None
+    # Force requests made before this worker started are already in its first build
+    _force_seen = _force_seen or _read_force_request()
+    while True:
+        time.sleep(CORPUS_WATCH_SECONDS)
+        forced = _read_force_request()
+        if forced is not None and forced != _force_seen and _current is not None:
+            _force_seen = forced
+            if _reload_in_background(force=True):
+                logging.info("Corpus watcher: forced reload requested by another worker")
+            continue
+        try:
+            version = corpus_version()
+        except OSError as e:
+            logging.warning(f"Corpus watcher could not read the corpus files: {str(e)}")
+            continue
+        # A version must hold for two polls, so half-copied PDFs aren't indexed
+        settled = version == seen
+        seen = version
+        if not settled or _current is None or version in (_current.version, failed):
+            continue
+        try:
+            reload_corpus()
+        except Exception as e:
+            failed = version
+            logging.error(f"RAG corpus {version} failed to build; still serving {_current.version}: {str(e)}")
+
+
+def corpus_status():
+    """Which corpus version this worker serves, and whether the files have moved on"""
+    with _swap_lock:
+        current = _current
+        status = {"version": current.version if current else None,
+                  "in_flight": current.in_flight if current else 0}
+    try:
+        status["latest"] = corpus_version()
+    except OSError:
+        status["latest"] = None
+    status["pid"] = os.getpid()
+    return status
+
+
+def configure_index(index_spec):
+    """Switch the index spec (see FAISS_INDEX_SPEC); chains are rebuilt on next use"""
+    global _index_spec
+    with _build_lock:
+        if index_spec != _index_spec:
+            _index_spec = index_spec
+            _swap(None)
+
+
+def build_rag_chain(profile, vectorstore=None):
+    """Build the retrieval chain for a named profile"""
+    from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+    from langchain.chains import create_retrieval_chain
+    from langchain.chains.combine_documents import create_stuff_documents_chain
+    from service.context_packer import make_packing_retriever
+    from service.query_router import make_routed_qa_chain
+
+    settings = RAG_PROFILES[profile]
+    retriever = make_packing_retriever(
+        vectorstore or get_vectorstore(), profile,
+        k=settings["k"],
+        fetch_k=settings["fetch_k"],
+        budget_tokens=settings["context_tokens"],
+        min_score=settings["min_score"],
+    )
+
+    # LLM setup
+    model = get_chat_model(
+        f"rag_{profile}",
+        model=settings["model"],
+        temperature=settings["temperature"],
+        max_output_tokens=settings["max_output_tokens"],
+        timeout=settings["timeout"],
+        callbacks=[make_usage_callback(f"rag_{profile}")],
+    )
+
+    # Rephrasing prompt
+    contextualize_q_prompt = ChatPromptTemplate.from_messages([
+        ("system", CONTEXTUALIZE_Q_PROMPT),
+        MessagesPlaceholder("chat_history"),
+        ("human", "{input}")
+    ])
+    history_aware_retriever = make_history_retriever(model, retriever, contextualize_q_prompt, profile)
+
+    def qa_prompt(system_prompt):
+        return ChatPromptTemplate.from_messages([
+            ("system", system_prompt),
+            MessagesPlaceholder("chat_history"),
+            ("human", "{input}")
+        ])
+
+    if settings.get("prompt_variants"):
+        # One prebuilt chain per variant; the router picks one after retrieval
+        variant_chains = {}
+        for variant, system_prompt in settings["prompt_variants"].items():
+            variant_model = model.with_config(callbacks=[
+                make_usage_callback(f"rag_{profile}", metric="qa_variant_tokens_total", variant=variant)
+            ])
+            variant_chains[variant] = create_stuff_documents_chain(variant_model, qa_prompt(system_prompt))
+        question_answer_chain = make_routed_qa_chain(variant_chains, profile)
+    else:
+        question_answer_chain = create_stuff_documents_chain(model, qa_prompt(settings["prompt"]))
+
     # Final RAG chain
-    rag_chain = create_retrieval_chain(history_aware_retriever, question_answer_chain)
+    return create_retrieval_chain(
+        timed_runnable(history_aware_retriever, "retrieval", profile),
+        timed_runnable(question_answer_chain, "generation", profile)
+    )
+
+
+def get_rag_chain(profile="chat"):
+    """Return the live generation's chain for a profile, building it on first use"""
+    return get_generation().chain(profile)
+
+
+def initialize_rag_system(profile="chat", index_spec=None):
+    """Initialize the RAG system with real data, optionally with a specific FAISS index spec"""
+    if index_spec:
+        configure_index(index_spec)
+    return get_rag_chain(profile)
+
+
+@contextmanager
+def _pinned_call(generation, profile):
+    """Hold a slot for the chain call; release the acquired generation when it's over"""
+    try:
+        with llm_slot(f"rag_{profile}"):
+            yield
+    finally:
+        release_generation(generation)
+
+
+def invoke_rag(profile, inputs):
+    """
+    Run a profile's chain and record how long it took. When the request's deadline
+    would pass first, answer from the retrieved chunks instead ("degraded": True).
+    """
+    generation = acquire_generation()
+    start_time = time.perf_counter()
+    retrieved = []
+    token = _retrieved.set(retrieved)
+    try:
+        # The generation stays pinned until the chain returns, even after we stop waiting
+        return call_with_deadline(lambda inputs: generation.chain(profile).invoke(inputs), inputs,
+                                  stage=f"rag_{profile}", reserve=GENERATION_RESERVE_SECONDS,
+                                  hold=_pinned_call(generation, profile))
+    except DeadlineExceeded:
+        skip_stage("generation")
+        inc("degraded_answers_total", profile=profile, source="chunks" if retrieved else "none")
+        return {"input": inputs.get("input"), "context": list(retrieved),
+                "answer": degraded_answer(profile, retrieved), "degraded": True}
+    finally:
+        _retrieved.reset(token)
+        elapsed = time.perf_counter() - start_time
+        _latencies[profile].append(elapsed)
+        observe("rag_seconds", elapsed, profile=profile)
+        logging.info(f"RAG profile '{profile}' answered in {elapsed * 1000:.0f} ms")
+
 
-    print(f"✅ RAG ready in {time.time() - start_time:.2f} seconds with {len(docs)} documents.")
-    return rag_chain
\ No newline at end of file
+def get_profile_latency_stats():
+    """Latency percentiles per profile over the most recent calls"""
+    stats = {}
+    for profile, samples in _latencies.items():
+        ordered = sorted(samples)
+        if not ordered:
+            stats[profile] = {"count": 0}
+            continue
+        stats[profile] = {
+            "count": len(ordered),
+            "p50_ms": round(ordered[len(ordered) // 2] * 1000, 1),
+            "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 1),
+            "max_ms": round(ordered[-1] * 1000, 1),
+        }
+    return stats
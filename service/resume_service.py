@@ -1,9 +1,9 @@
-import fitz  # PyMuPDF
 import re  # Regular expressions
 import json  # JSON parsing
 from service.gemini_service import gemini_prompt_response
 
 def extract_text_from_resume(pdf_file) -> str:
+    import fitz  # PyMuPDF, imported on first upload
     text = ""
     with fitz.open(stream=pdf_file.read(), filetype="pdf") as doc:
         for page in doc:
@@ -32,7 +32,7 @@ Respond in structured JSON like:
   "improvement_tips": [...]
 }}
     """
-    response = gemini_prompt_response(prompt)
+    response = gemini_prompt_response(prompt, purpose="resume_analysis")
 
     # Remove Markdown-style code block (```json ... ```)
     cleaned = re.sub(r"```json|```", "", response).strip()
@@ -1,5 +1,3 @@
-from textblob import TextBlob
-
 # Custom negative patterns for better detection
 NEGATIVE_PHRASES = [
     "i can't", "i cannot", "i'm not good enough", "i give up", "i won't make it",
@@ -15,7 +13,8 @@ def detect_sentiment(text):
         if phrase in text_lower:
             return "negative"
 
-    # Fallback to TextBlob
+    # Fallback to TextBlob (imported here; it pulls in NLTK)
+    from textblob import TextBlob
     blob = TextBlob(text)
     polarity = blob.sentiment.polarity
 
@@ -25,6 +24,3 @@ def detect_sentiment(text):
         return "positive"
     else:
         return "neutral"
-
-# Example usage
-print(detect_sentiment("i cannot do this work"))  # Will now return 'negative'
@@ -0,0 +1,294 @@
+import json
+import re
+import time
+import logging
+from datetime import date
+from utils.metrics import inc
+
+JOBS_PATH = "data/linkedin_jobs.json"
+EVENTS_PATH = "data/event_data.json"
+MAX_RESULTS = 5
+
+MONTHS = ["january", "february", "march", "april", "may", "june", "july",
+          "august", "september", "october", "november", "december"]
+
+LOCATION_ALIASES = {
+    "bangalore": "bengaluru",
+    "bombay": "mumbai",
+    "gurgaon": "gurugram",
+    "delhi": "new delhi",
+    "madras": "chennai",
+    "goa": "panaji",
+}
+
+JOB_WORDS = r"jobs?|openings?|vacanc(?:y|ies)|positions?|roles?|opportunit(?:y|ies)"
+EVENT_WORDS = r"events?|conferences?|summits?|expos?|meetups?|hackathons?|workshops?"
+
+# Words a filter query may contain besides the recognised filter values.
+FILLER_WORDS = {
+    "show", "me", "list", "find", "get", "give", "search", "any", "all", "the", "a",
+    "are", "there", "is", "what", "which", "please", "tech", "technology", "it",
+    "software", "latest", "upcoming", "available", "open", "at", "in", "from",
+    "by", "for", "on", "near", "around", "of", "happening", "with", "during",
+    "this", "next", "month", "some", "can", "you", "i", "want", "looking",
+    "to", "see", "current", "new", "and",
+}
+
+
+class Column:
+    """Dictionary-encoded column with one sorted posting list per value"""
+
+    def __init__(self, name):
+        self.name = name
+        self.codes = {}       # value -> code
+        self.values = []      # code -> value
+        self.postings = []    # code -> row ids
+
+    def add(self, row_id, values):
+        for value in values:
+            if not value:
+                continue
+            code = self.codes.get(value)
+            if code is None:
+                code = len(self.values)
+                self.codes[value] = code
+                self.values.append(value)
+                self.postings.append([])
+            postings = self.postings[code]
+            if not postings or postings[-1] != row_id:
+                postings.append(row_id)
+
+    def rows(self, value):
+        code = self.codes.get(value)
+        return set(self.postings[code]) if code is not None else set()
+
+    def rows_any(self, values):
+        rows = set()
+        for value in values:
+            rows |= self.rows(value)
+        return rows
+
+
+class StructuredIndex:
+    """Columnar in-memory index over job and event records"""
+
+    def __init__(self):
+        self.records = []
+        self.columns = {name: Column(name) for name in ("type", "company", "location", "date")}
+        self._matchers = {}
+
+    def add_record(self, record_type, record, company, locations, day):
+        row_id = len(self.records)
+        self.records.append((record_type, record))
+        self.columns["type"].add(row_id, [record_type])
+        self.columns["company"].add(row_id, [_normalize(company)])
+        self.columns["location"].add(row_id, [_normalize(loc) for loc in locations])
+        self.columns["date"].add(row_id, [day[:7] if day else None])
+        self._matchers.clear()
+
+    def matcher(self, column):
+        """Regex matching any dictionary value of a column, longest value first"""
+        if column not in self._matchers:
+            values = sorted(self.columns[column].values, key=len, reverse=True)
+            pattern = "|".join(re.escape(v) for v in values) or r"(?!x)x"
+            self._matchers[column] = re.compile(rf"\b({pattern})\b")
+        return self._matchers[column]
+
+    def search(self, filters):
+        """Intersect posting lists for the given {column: [values]} filters"""
+        candidate_sets = [self.columns[col].rows_any(values) for col, values in filters.items()]
+        candidate_sets.sort(key=len)
+        rows = candidate_sets[0]
+        for other in candidate_sets[1:]:
+            rows = rows & other
+        return [self.records[row_id] for row_id in sorted(rows)]
+
+
+def _normalize(value):
+    return re.sub(r"\s+", " ", value or "").strip().lower()
+
+
+def _load_json(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logging.warning(f"Structured index could not load {path}: {str(e)}")
+        return None
+
+
+def load_job_records(path=JOBS_PATH):
+    """Load job records from the saved LinkedIn jobs feed"""
+    data = _load_json(path)
+    if isinstance(data, dict):
+        data = data.get("jobs", [])
+    return data or []
+
+
+def load_event_records(path=EVENTS_PATH):
+    """Load event records from the saved events feed"""
+    data = _load_json(path)
+    if isinstance(data, dict):
+        data = data.get("data", [])
+    return data or []
+
+
+def build_index(jobs=None, events=None):
+    """Build the structured index from job and event records"""
+    index = StructuredIndex()
+    for job in load_job_records() if jobs is None else jobs:
+        location_parts = [part.strip() for part in job.get("job_location", "").split(",")]
+        index.add_record("job", job, job.get("company_name"), location_parts, job.get("job_posting_date"))
+
+    for event in load_event_records() if events is None else events:
+        venue = event.get("venue") or {}
+        locations = [venue.get("city"), venue.get("state")]
+        day = (event.get("start_time") or "")[:10]
+        index.add_record("event", event, event.get("publisher"), locations, day)
+    return index
+
+
+_index = None
+
+
+def get_index():
+    global _index
+    if _index is None:
+        start_time = time.time()
+        _index = build_index()
+        logging.info(f"Structured index ready in {(time.time() - start_time) * 1000:.1f} ms "
+                     f"with {len(_index.records)} records")
+    return _index
+
+
+def parse_query(question, index, today=None):
+    """Parse a filter-style question into column filters, or None if unparseable"""
+    text = _normalize(question)
+    text = re.sub(r"[?!.,]", " ", text)
+    for alias, canonical in LOCATION_ALIASES.items():
+        text = re.sub(rf"\b{alias}\b", canonical, text)
+
+    filters = {}
+    has_job = re.search(rf"\b({JOB_WORDS})\b", text)
+    has_event = re.search(rf"\b({EVENT_WORDS})\b", text)
+    if bool(has_job) == bool(has_event):
+        return None
+    filters["type"] = ["job" if has_job else "event"]
+    text = re.sub(rf"\b({JOB_WORDS}|{EVENT_WORDS})\b", " ", text)
+
+    for column in ("company", "location"):
+        matches = index.matcher(column).findall(text)
+        if matches:
+            filters[column] = _expand_location(matches, index) if column == "location" else matches
+            text = index.matcher(column).sub(" ", text)
+
+    months = _parse_months(text, today or date.today())
+    if months:
+        filters["date"] = months
+        text = re.sub(rf"\b(this month|next month|{'|'.join(MONTHS)})\b|\b20\d\d\b", " ", text)
+
+    leftover = [word for word in text.split() if word not in FILLER_WORDS]
+    if leftover:
+        return None
+    return filters
+
+
+def _expand_location(matches, index):
+    """Match a location against every dictionary value containing it, e.g. Bengaluru East"""
+    values = []
+    for match in matches:
+        values.extend(v for v in index.columns["location"].values if re.search(rf"\b{re.escape(match)}\b", v))
+    return values
+
+
+def _parse_months(text, today):
+    months = []
+    if "this month" in text:
+        months.append(f"{today.year}-{today.month:02d}")
+    if "next month" in text:
+        year, month = (today.year + 1, 1) if today.month == 12 else (today.year, today.month + 1)
+        months.append(f"{year}-{month:02d}")
+    year_match = re.search(r"\b(20\d\d)\b", text)
+    for number, name in enumerate(MONTHS, start=1):
+        if re.search(rf"\b{name}\b", text):
+            year = int(year_match.group(1)) if year_match else today.year
+            months.append(f"{year}-{number:02d}")
+    return months
+
+
+def _describe(filters):
+    parts = []
+    if filters.get("company"):
+        parts.append("at " + ", ".join(v.title() for v in filters["company"]))
+    if filters.get("location"):
+        locations = set(filters["location"])
+        # "bengaluru" also matched "bengaluru east"; only name the broadest value
+        broadest = [v for v in locations if not any(o != v and o in v for o in locations)]
+        parts.append("in " + ", ".join(sorted(v.title() for v in broadest)))
+    if filters.get("date"):
+        parts.append("during " + ", ".join(filters["date"]))
+    return " ".join(parts)
+
+
+def _job_response(records, filters):
+    sections, links, actions = [], [], []
+    for job in records[:MAX_RESULTS]:
+        sections.append({
+            "title": job.get("job_position", "Job Details"),
+            "content": [
+                f"Position: {job.get('job_position', '')}",
+                f"Company: {job.get('company_name', '')}",
+                f"Location: {job.get('job_location', '')}",
+                f"Posted: {job.get('job_posting_date', '')}"
+            ],
+            "icon": "briefcase"
+        })
+        if job.get("company_profile"):
+            links.append({"text": f"{job.get('company_name', 'Company')} Page",
+                          "url": job["company_profile"], "type": "career"})
+        if job.get("job_link"):
+            actions.append({"type": "apply", "text": "Apply Now", "url": job["job_link"]})
+    summary = f"Found {len(records)} job{'s' if len(records) != 1 else ''} {_describe(filters)}".strip()
+    return {"summary": summary, "sections": sections, "links": links, "actions": actions}
+
+
+def _event_response(records, filters):
+    sections, links, actions = [], [], []
+    for event in records[:MAX_RESULTS]:
+        venue = event.get("venue") or {}
+        sections.append({
+            "title": event.get("name", "Event Details"),
+            "content": [
+                f"Dates: {event.get('date_human_readable', event.get('start_time', ''))}",
+                f"Location: {', '.join(p for p in (venue.get('name'), venue.get('city')) if p)}",
+                f"Type: {'Virtual' if event.get('is_virtual') else 'In-person'}",
+                f"Focus: {event.get('description', '')}"
+            ],
+            "icon": "calendar"
+        })
+        if event.get("link"):
+            links.append({"text": "Official Website", "url": event["link"], "type": "event"})
+        ticket_links = event.get("ticket_links") or []
+        if ticket_links:
+            actions.append({"type": "register", "text": "Register Now", "url": ticket_links[0]["link"]})
+    summary = f"Found {len(records)} event{'s' if len(records) != 1 else ''} {_describe(filters)}".strip()
+    return {"summary": summary, "sections": sections, "links": links, "actions": actions}
+
+
+def answer_structured_query(question, today=None):
+    """
+    Answer filter-style job/event questions straight from the structured index.
+    Returns a structured_response dict, or None when the question should go to RAG.
+    """
+    index = get_index()
+    filters = parse_query(question, index, today=today)
+    matches = index.search(filters) if filters else []
+    if not matches:
+        inc("cache_misses_total", cache="structured_index")
+        return None
+    inc("cache_hits_total", cache="structured_index")
+
+    records = [record for _, record in matches]
+    if filters["type"] == ["job"]:
+        return _job_response(records, filters)
+    return _event_response(records, filters)
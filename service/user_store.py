@@ -0,0 +1,272 @@
+import io
+import os
+import csv
+import json
+import time
+import logging
+from datetime import datetime
+from bson import ObjectId
+from pymongo import UpdateOne, ReturnDocument
+from pymongo.errors import DuplicateKeyError, BulkWriteError, PyMongoError
+from config import users_collection
+from utils.metrics import span, inc
+
+# Email is unique; phone is unique when present (many users have no phone)
+PHONE_INDEX_FILTER = {"phone": {"$type": "string", "$gt": ""}}
+BULK_IMPORT_BATCH_SIZE = int(os.getenv("BULK_IMPORT_BATCH_SIZE", "500"))
+BULK_IMPORT_MAX_ERRORS = int(os.getenv("BULK_IMPORT_MAX_ERRORS", "1000"))
+PROFILE_FIELDS = ["name", "phone", "skills", "bio"]
+INDEX_RETRY_SECONDS = 60
+
+_indexes_ready = False
+_index_retry_at = 0.0
+
+
+class PhoneInUse(Exception):
+    """The phone number belongs to another user"""
+
+
+def ensure_indexes():
+    """
+    Create the unique user indexes once per process, on first use. Returns whether
+    they exist; until they do, callers check phone numbers themselves and creation
+    is retried every INDEX_RETRY_SECONDS.
+    """
+    global _indexes_ready, _index_retry_at
+    if _indexes_ready:
+        return True
+    if time.monotonic() < _index_retry_at:
+        return False
+    try:
+        users_collection.create_index("email", unique=True, name="email_unique")
+        users_collection.create_index("phone", unique=True, name="phone_unique",
+                                      partialFilterExpression=PHONE_INDEX_FILTER)
+    except PyMongoError as e:
+        # Existing duplicates block the index; phone numbers are checked by query until it exists
+        logging.error(f"Could not create unique user indexes, checking phone numbers by query: {str(e)}")
+        _index_retry_at = time.monotonic() + INDEX_RETRY_SECONDS
+        return False
+    _indexes_ready = True
+    return True
+
+
+def phone_taken(phone, email):
+    """Whether a user other than email already has this phone (only needed without the unique index)"""
+    if not isinstance(phone, str) or not phone:
+        return False
+    with span("mongo_read", collection="users"):
+        return users_collection.find_one({"phone": phone, "email": {"$ne": email}}, {"_id": 1}) is not None
+
+
+def duplicate_field(details, message=""):
+    """Which unique field a duplicate key error (or bulk write error entry) is about"""
+    key_pattern = (details or {}).get("keyPattern") or (details or {}).get("keyValue") or {}
+    if key_pattern:
+        return next(iter(key_pattern))
+    return "phone" if "phone" in message else "email"
+
+
+def normalize_profile(data):
+    """Strip strings and split comma/semicolon separated skills"""
+    profile = {}
+    for field in PROFILE_FIELDS:
+        if field not in data:
+            continue
+        value = data[field]
+        if field == "skills" and isinstance(value, str):
+            value = [s.strip() for s in value.replace(";", ",").split(",") if s.strip()]
+        profile[field] = value.strip() if isinstance(value, str) else value
+    return profile
+
+
+def sign_up_user(email, data):
+    """
+    Create the user with this email, or return the existing one, in one round trip.
+    Returns (user, created). Raises PhoneInUse when another user has the phone.
+    """
+    indexed = ensure_indexes()
+    now = datetime.utcnow().isoformat()
+    new_id = ObjectId()
+    new_user = {
+        "_id": new_id,
+        "name": data["name"].strip(),
+        "email": email,
+        "phone": data.get("phone", "").strip(),
+        "skills": data.get("skills", []),
+        "bio": data.get("bio", "").strip(),
+        "created_at": now,
+        "updated_at": now
+    }
+    if not indexed and phone_taken(new_user["phone"], email):
+        raise PhoneInUse()
+    for attempt in range(2):
+        try:
+            with span("mongo_write", collection="users"):
+                user = users_collection.find_one_and_update(
+                    {"email": email},
+                    {"$setOnInsert": new_user},
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER
+                )
+            return user, user["_id"] == new_id
+        except DuplicateKeyError as e:
+            if duplicate_field(e.details, str(e)) == "phone":
+                raise PhoneInUse()
+            # Two signups for the same email raced; the retry finds the winner's document
+            if attempt:
+                raise
+
+
+def update_user_profile(email, update_fields):
+    """Apply update_fields to the user with this email; returns the updated user or None"""
+    if not ensure_indexes() and phone_taken(update_fields.get("phone"), email):
+        raise PhoneInUse()
+    try:
+        with span("mongo_write", collection="users"):
+            return users_collection.find_one_and_update(
+                {"email": email},
+                {"$set": update_fields},
+                return_document=ReturnDocument.AFTER
+            )
+    except DuplicateKeyError as e:
+        if duplicate_field(e.details, str(e)) == "phone":
+            raise PhoneInUse()
+        raise
+
+
+def read_rows(stream, fmt):
+    """Yield (row_number, dict or error string) from a CSV or JSONL byte stream"""
+    text = io.TextIOWrapper(stream, encoding="utf-8", errors="replace", newline="")
+    if fmt == "csv":
+        for number, row in enumerate(csv.DictReader(text), start=1):
+            yield number, {(k or "").strip().lower(): v for k, v in row.items()}
+        return
+    number = 0
+    for line in text:
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield number, "Invalid JSON"
+            continue
+        yield number, row if isinstance(row, dict) else "Each line must be a JSON object"
+
+
+def validate_row(row, is_valid_email):
+    """Return (email, profile) for a valid candidate row, or raise ValueError"""
+    email = str(row.get("email") or "").strip()
+    if not email or not is_valid_email(email):
+        raise ValueError("Valid email is required")
+    name = str(row.get("name") or "").strip()
+    if not name:
+        raise ValueError("Missing required field: name")
+    profile = normalize_profile({field: row[field] for field in PROFILE_FIELDS if row.get(field) is not None})
+    profile["name"] = name
+    if not isinstance(profile.get("skills", []), list):
+        raise ValueError("skills must be a list or a comma separated string")
+    return email, profile
+
+
+class BulkImport:
+    """Validates candidate rows as they stream in and upserts them in unordered batches"""
+
+    def __init__(self, source, update_existing=False, check_phones=False):
+        self.source = source
+        self.check_phones = check_phones   # no unique phone index to reject duplicates
+        self.update_existing = update_existing
+        self.batch = []            # (row_number, UpdateOne)
+        self.seen_emails = set()
+        self.seen_phones = set()
+        self.rows = 0
+        self.inserted = 0
+        self.existing = 0
+        self.errors = []
+        self.failed = 0
+        self.started = time.perf_counter()
+
+    def error(self, row_number, message):
+        self.failed += 1
+        if len(self.errors) < BULK_IMPORT_MAX_ERRORS:
+            self.errors.append({"row": row_number, "error": message})
+
+    def add(self, row_number, email, profile):
+        if email in self.seen_emails:
+            self.error(row_number, "Duplicate email in this import")
+            return
+        self.seen_emails.add(email)
+        phone = profile.get("phone")
+        if self.check_phones and phone:
+            if phone in self.seen_phones or phone_taken(phone, email):
+                self.error(row_number, "Phone number already in use")
+                return
+            self.seen_phones.add(phone)
+
+        now = datetime.utcnow().isoformat()
+        on_insert = {"email": email, "created_at": now, "source": self.source}
+        if self.update_existing:
+            update = {"$setOnInsert": on_insert, "$set": dict(profile, updated_at=now)}
+        else:
+            # Partner data never overwrites a profile the candidate entered themselves
+            update = {"$setOnInsert": dict(on_insert, **profile, updated_at=now)}
+        self.batch.append((row_number, UpdateOne({"email": email}, update, upsert=True)))
+        if len(self.batch) >= BULK_IMPORT_BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if not self.batch:
+            return
+        batch, self.batch = self.batch, []
+        try:
+            with span("mongo_write", collection="users", operation="bulk_import"):
+                result = users_collection.bulk_write([op for _, op in batch], ordered=False)
+            details = result.bulk_api_result
+        except BulkWriteError as e:
+            details = e.details
+            for write_error in details.get("writeErrors", []):
+                row_number = batch[write_error["index"]][0]
+                if write_error.get("code") == 11000:
+                    field = duplicate_field(write_error, write_error.get("errmsg", ""))
+                    self.error(row_number, "Phone number already in use" if field == "phone"
+                               else "Email already in use")
+                else:
+                    self.error(row_number, write_error.get("errmsg", "Write failed"))
+        upserted = details.get("nUpserted", 0)
+        self.inserted += upserted
+        self.existing += details.get("nMatched", 0)
+        inc("users_imported_total", upserted, source=self.source)
+
+    def report(self):
+        seconds = time.perf_counter() - self.started
+        return {
+            "rows": self.rows,
+            "inserted": self.inserted,
+            "existing": self.existing,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+            "seconds": round(seconds, 3),
+            "rows_per_second": round(self.rows / seconds, 1) if seconds > 0 else None
+        }
+
+
+def import_users(stream, fmt, is_valid_email, source="bulk_import", update_existing=False):
+    """Stream CSV/JSONL candidate rows into the users collection and return a report"""
+    job = BulkImport(source, update_existing, check_phones=not ensure_indexes())
+    for row_number, row in read_rows(stream, fmt):
+        job.rows += 1
+        if isinstance(row, str):
+            job.error(row_number, row)
+            continue
+        try:
+            email, profile = validate_row(row, is_valid_email)
+        except ValueError as e:
+            job.error(row_number, str(e))
+            continue
+        job.add(row_number, email, profile)
+    job.flush()
+    report = job.report()
+    logging.info(f"Imported {report['inserted']} of {report['rows']} users from {source} "
+                 f"({report['rows_per_second']} rows/s, {report['failed']} failed)")
+    return report
@@ -0,0 +1,98 @@
+import os
+import time
+import uuid
+import logging
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from pymongo.errors import PyMongoError
+from config import voice_turns_collection
+from utils.deadline import deadline_scope
+from utils.admission import LoadShed
+
+# Twilio gives up on a webhook after ~15 s, so each caller turn gets its own budget
+# and the webhook only ever enqueues work and answers with hold/redirect TwiML.
+VOICE_TURN_BUDGET_SECONDS = float(os.getenv("VOICE_TURN_BUDGET_SECONDS", "12"))
+VOICE_POLL_INTERVAL_SECONDS = int(os.getenv("VOICE_POLL_INTERVAL_SECONDS", "2"))
+VOICE_WORKERS = int(os.getenv("VOICE_WORKERS", "8"))
+TURN_RETENTION_SECONDS = 600
+
+# Twilio's poll_answer redirect can land on any gunicorn worker, so turn state and
+# answers live in Mongo (voice_turns, keyed by turn id) rather than in this process.
+_executor = ThreadPoolExecutor(max_workers=VOICE_WORKERS, thread_name_prefix="voice-turn")
+_indexes_ready = False
+
+
+def _ensure_indexes():
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    voice_turns_collection.create_index("created_at", expireAfterSeconds=TURN_RETENTION_SECONDS)
+    _indexes_ready = True
+
+
+def submit_turn(process_fn, conversation_id, transcription, budget=None):
+    """Queue a caller turn for background processing and return its turn id"""
+    _ensure_indexes()
+    turn_id = uuid.uuid4().hex
+    budget = budget or VOICE_TURN_BUDGET_SECONDS
+    deadline = time.monotonic() + budget
+    future = _executor.submit(_run_turn, deadline, process_fn, conversation_id, transcription)
+    voice_turns_collection.insert_one({
+        "_id": turn_id,
+        "conversation_id": conversation_id,
+        "transcription": transcription,
+        "status": "pending",
+        "created_at": datetime.utcnow(),
+        "deadline": time.time() + budget,
+    })
+    # Added once the turn is published, so the result always lands on its document
+    future.add_done_callback(lambda f: _store_result(turn_id, f))
+    return turn_id
+
+
+def _run_turn(deadline, process_fn, conversation_id, transcription):
+    # The turn's budget starts when it is queued, so LLM admission sees what is left
+    with deadline_scope(at=deadline):
+        return process_fn(conversation_id, transcription)
+
+
+def _store_result(turn_id, future):
+    error = future.exception()
+    if isinstance(error, LoadShed):
+        # Shed before reaching Gemini: the caller gets the degraded answer
+        result = {"status": "shed"}
+    elif error:
+        logging.error(f"Voice turn {turn_id} failed: {str(error)}")
+        result = {"status": "failed", "error": str(error)[:200]}
+    else:
+        result = {"status": "done", "answer": future.result()}
+    try:
+        voice_turns_collection.update_one({"_id": turn_id}, {"$set": result})
+    except PyMongoError as e:
+        logging.error(f"Could not store voice turn {turn_id}: {str(e)}")
+
+
+def poll_turn(turn_id):
+    """
+    Check on a queued turn, whichever worker process it runs on.
+    Returns (status, turn, answer) where status is one of
+    "ready", "pending", "expired", "failed" or "unknown".
+    """
+    turn = voice_turns_collection.find_one({"_id": turn_id})
+    if not turn:
+        return "unknown", turn, None
+
+    status = turn.get("status")
+    if status == "done":
+        return "ready", turn, turn.get("answer")
+    if status == "shed":
+        return "expired", turn, None
+    if status == "failed":
+        return "failed", turn, None
+
+    if time.time() >= turn["deadline"]:
+        # The worker still finishes and persists its answer; the caller moves on now.
+        logging.warning(f"Voice turn {turn_id} exceeded its {VOICE_TURN_BUDGET_SECONDS:.0f}s budget")
+        return "expired", turn, None
+
+    return "pending", turn, None
@@ -0,0 +1,231 @@
+import os
+import math
+import time
+import logging
+import threading
+from functools import wraps
+from contextlib import contextmanager
+from utils.deadline import deadline_scope, remaining
+from utils.metrics import inc, set_gauge
+
+# Admission control for LLM-bound work. Every limit is per worker process.
+#  - each LLM purpose gets a concurrency limit and a bounded wait queue; a call is
+#    shed at once when the queue is full or its predicted wait exceeds the deadline
+#  - each client IP gets a token bucket on the LLM-bound endpoints
+# "purpose=limit:queue,..." e.g. "rag_chat=8:16,resume_analysis=2:4"
+ADMISSION_LIMITS = os.getenv("ADMISSION_LIMITS", "")
+ADMISSION_DEFAULT_LIMIT = int(os.getenv("ADMISSION_DEFAULT_LIMIT", "8"))
+ADMISSION_DEFAULT_QUEUE = int(os.getenv("ADMISSION_DEFAULT_QUEUE", "16"))
+RATE_LIMIT_PER_MINUTE = float(os.getenv("RATE_LIMIT_PER_MINUTE", "30"))
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "10"))
+SERVICE_TIME_ALPHA = 0.2        # EWMA weight of the newest call
+INITIAL_SERVICE_SECONDS = 2.0
+BUCKET_IDLE_SECONDS = 600
+# Reverse proxies in front of the app (e.g. 1 behind a load balancer). Only that many
+# X-Forwarded-For hops are trusted; with 0 the header is ignored.
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))
+
+
+class LoadShed(Exception):
+    """Request refused before doing the work; maps to 429/503 with Retry-After"""
+
+    def __init__(self, message, status=503, retry_after=1.0, reason="overloaded"):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class ConcurrencyLimiter:
+    """At most `limit` calls at a time, with up to `max_queue` callers waiting"""
+
+    def __init__(self, purpose, limit, max_queue):
+        self.purpose = purpose
+        self.limit = limit
+        self.max_queue = max_queue
+        self.active = 0
+        self.waiting = 0
+        self.service_seconds = INITIAL_SERVICE_SECONDS
+        self.condition = threading.Condition()
+
+    def predicted_wait(self):
+        """Expected queueing time for a caller arriving now"""
+        if self.active < self.limit and self.waiting == 0:
+            return 0.0
+        return (self.waiting + 1) * self.service_seconds / self.limit
+
+    def _update_gauges(self):
+        set_gauge("admission_in_flight", self.active, purpose=self.purpose)
+        set_gauge("admission_queue_depth", self.waiting, purpose=self.purpose)
+
+    def _shed(self, reason, message):
+        inc("admission_shed_total", purpose=self.purpose, reason=reason)
+        logging.warning(f"Shedding '{self.purpose}' call: {message}")
+        raise LoadShed(message, status=503, retry_after=max(1.0, self.predicted_wait()), reason=reason)
+
+    def check(self, budget=None):
+        """Fail fast if a call with `budget` seconds left would be shed"""
+        with self.condition:
+            if self.active >= self.limit and self.waiting >= self.max_queue:
+                self._shed("queue_full", f"{self.waiting} calls already waiting")
+            wait = self.predicted_wait()
+            if budget is not None and wait > budget:
+                self._shed("deadline", f"predicted wait {wait:.1f}s exceeds the {max(budget, 0):.1f}s left")
+
+    def acquire(self):
+        budget = remaining()
+        with self.condition:
+            self.check(budget)
+            if self.active < self.limit and self.waiting == 0:
+                self.active += 1
+                self._update_gauges()
+                return
+            self.waiting += 1
+            self._update_gauges()
+            try:
+                give_up_at = None if budget is None else time.monotonic() + budget
+                while self.active >= self.limit:
+                    timeout = None if give_up_at is None else give_up_at - time.monotonic()
+                    if timeout is not None and timeout <= 0:
+                        self.condition.notify()  # pass on a wake-up this caller won't use
+                        self._shed("deadline", "deadline passed while queued")
+                    self.condition.wait(timeout)
+                self.active += 1
+            finally:
+                self.waiting -= 1
+                self._update_gauges()
+
+    def release(self, elapsed):
+        with self.condition:
+            self.active -= 1
+            self.service_seconds += SERVICE_TIME_ALPHA * (elapsed - self.service_seconds)
+            self._update_gauges()
+            self.condition.notify()
+
+
+class TokenBucket:
+    """Per-key token buckets refilled at `rate` tokens per second up to `burst`"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}   # key -> [tokens, last refill]
+        self.lock = threading.Lock()
+        self.last_sweep = time.monotonic()
+
+    def take(self, key):
+        """Take one token; returns 0 when allowed, else the seconds until one is available"""
+        now = time.monotonic()
+        with self.lock:
+            if now - self.last_sweep > BUCKET_IDLE_SECONDS:
+                self._sweep(now)
+            tokens, last = self.buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens >= 1:
+                self.buckets[key] = [tokens - 1, now]
+                return 0.0
+            self.buckets[key] = [tokens, now]
+            return (1 - tokens) / self.rate
+
+    def _sweep(self, now):
+        # A bucket idle this long is full again, so forgetting it changes nothing
+        self.buckets = {k: v for k, v in self.buckets.items() if now - v[1] < BUCKET_IDLE_SECONDS}
+        self.last_sweep = now
+
+
+def _parse_limits(spec):
+    limits = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        purpose, _, values = item.partition("=")
+        limit, _, queue = values.partition(":")
+        limits[purpose.strip()] = (int(limit), int(queue or ADMISSION_DEFAULT_QUEUE))
+    return limits
+
+
+_configured_limits = _parse_limits(ADMISSION_LIMITS)
+_limiters = {}
+_limiters_lock = threading.Lock()
+_client_buckets = TokenBucket(RATE_LIMIT_PER_MINUTE / 60.0, RATE_LIMIT_BURST)
+
+
+def get_limiter(purpose):
+    limiter = _limiters.get(purpose)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(purpose)
+            if limiter is None:
+                limit, queue = _configured_limits.get(purpose, (ADMISSION_DEFAULT_LIMIT, ADMISSION_DEFAULT_QUEUE))
+                limiter = _limiters[purpose] = ConcurrencyLimiter(purpose, limit, queue)
+    return limiter
+
+
+@contextmanager
+def llm_slot(purpose):
+    """Hold one of the purpose's concurrency slots around an LLM call"""
+    limiter = get_limiter(purpose)
+    limiter.acquire()
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        limiter.release(time.perf_counter() - start_time)
+
+
+@contextmanager
+def llm_call(purpose):
+    """llm_slot and llm_span together; pass as call_with_deadline(..., hold=llm_call(purpose))"""
+    from utils.metrics import llm_span
+    with llm_slot(purpose), llm_span(purpose):
+        yield
+
+
+def check_rate_limit(client_key, endpoint):
+    """Raise a 429 LoadShed when the client has used up its token bucket"""
+    wait = _client_buckets.take(client_key)
+    if wait:
+        inc("rate_limited_total", endpoint=endpoint)
+        raise LoadShed("Too many requests", status=429, retry_after=wait, reason="rate_limit")
+
+
+def client_key(request):
+    """
+    The caller's IP. Headers a client controls (X-User-Id, X-Forwarded-For) would let
+    it pick a fresh bucket per request; init_app sets remote_addr from the trusted
+    proxy hops instead.
+    """
+    return f"ip:{request.remote_addr}"
+
+
+def admission_controlled(endpoint, purpose, deadline_seconds):
+    """
+    Decorator for LLM-bound views: rate limit the client, shed at once when the
+    purpose's predicted wait exceeds the request deadline, then run the view
+    under that deadline.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            from flask import request
+            check_rate_limit(client_key(request), endpoint)
+            get_limiter(purpose).check(deadline_seconds)
+            with deadline_scope(deadline_seconds):
+                return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def load_shed_response(error):
+    from flask import jsonify
+    response = jsonify({"error": str(error), "reason": error.reason})
+    response.status_code = error.status
+    response.headers["Retry-After"] = str(math.ceil(error.retry_after))
+    return response
+
+
+def init_app(app):
+    if TRUSTED_PROXY_HOPS:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_HOPS)
+    app.register_error_handler(LoadShed, load_shed_response)
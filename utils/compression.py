@@ -0,0 +1,85 @@
+import os
+import gzip
+from utils.metrics import inc
+
+# Compress text responses above a size threshold with the best encoding the client accepts
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "6"))
+COMPRESS_BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", "4"))
+COMPRESSIBLE_MIMETYPES = {
+    "application/json",
+    "application/xml",
+    "application/javascript",
+    "text/html",
+    "text/plain",
+    "text/xml",
+    "text/css",
+}
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+SUPPORTED_ENCODINGS = ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def choose_encoding(accept_encoding):
+    """Pick br or gzip from an Accept-Encoding header, honouring q-values; None if neither"""
+    weights = {}
+    for item in (accept_encoding or "").split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[coding] = q
+
+    best, best_q = None, 0.0
+    for coding in SUPPORTED_ENCODINGS:  # server preference breaks ties
+        q = weights.get(coding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compress(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=COMPRESS_BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=COMPRESS_GZIP_LEVEL)
+
+
+def compress_response(response):
+    from flask import request
+
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code in (204, 304)
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return response
+    encoding = choose_encoding(request.headers.get("Accept-Encoding"))
+    if encoding is None:
+        return response
+
+    compressed = compress(data, encoding)
+    response.set_data(compressed)
+    response.headers["Content-Encoding"] = encoding
+    inc("response_bytes_total", len(data), kind="raw")
+    inc("response_bytes_total", len(compressed), kind="wire", encoding=encoding)
+    return response
+
+
+def init_app(app):
+    app.after_request(compress_response)
@@ -0,0 +1,169 @@
+import os
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from utils.metrics import inc, set_gauge
+
+try:
+    import pymongo
+except ImportError:  # optional: Mongo calls just run without a timeout
+    pymongo = None
+
+# Absolute time.monotonic() by which the current request (or voice turn) must answer.
+# Context variables don't follow work into other threads: code that hands work to a
+# pool opens its own deadline_scope() there.
+_deadline = ContextVar("request_deadline", default=None)
+# Optional stages the current request skipped to stay inside its deadline
+_skipped = ContextVar("skipped_stages", default=None)
+
+# Calls made with call_with_deadline run here so the caller can stop waiting; a call
+# that overruns finishes in the background and its result is dropped.
+DEADLINE_CALL_WORKERS = int(os.getenv("DEADLINE_CALL_WORKERS", "64"))
+# Abandoned calls still occupy a worker; past this many, new calls are refused so
+# the pool always has threads for calls someone is waiting on
+MAX_ABANDONED_CALLS = int(os.getenv("MAX_ABANDONED_CALLS", str(DEADLINE_CALL_WORKERS // 2)))
+# Mongo calls get at least this long, so a degraded answer can still be saved
+MONGO_MIN_TIMEOUT_SECONDS = float(os.getenv("MONGO_MIN_TIMEOUT_SECONDS", "1"))
+
+_executor = ThreadPoolExecutor(max_workers=DEADLINE_CALL_WORKERS, thread_name_prefix="deadline-call")
+_abandoned = 0
+_abandoned_lock = threading.Lock()
+
+
+class DeadlineExceeded(Exception):
+    """A call was abandoned because the request ran out of time"""
+
+    def __init__(self, message="Deadline exceeded", stage=None):
+        super().__init__(message)
+        self.stage = stage
+
+
+@contextmanager
+def deadline_scope(seconds=None, at=None):
+    """
+    Run a block with a deadline `seconds` from now (or at a monotonic time). A nested
+    scope can only shorten the deadline, and shares its request's skipped stages.
+    """
+    if at is None and seconds is not None:
+        at = time.monotonic() + seconds
+    outer = _deadline.get()
+    if outer is not None:
+        at = outer if at is None else min(at, outer)
+    token = _deadline.set(at)
+    skipped = _skipped.get()
+    skipped_token = _skipped.set([] if skipped is None else skipped)
+    try:
+        yield at
+    finally:
+        _skipped.reset(skipped_token)
+        _deadline.reset(token)
+
+
+def get_deadline():
+    return _deadline.get()
+
+
+def remaining():
+    """Seconds left before the current deadline, or None when there is none"""
+    at = _deadline.get()
+    return None if at is None else at - time.monotonic()
+
+
+def expired():
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def has_budget(seconds):
+    """Whether at least `seconds` are left (always true without a deadline)"""
+    left = remaining()
+    return left is None or left >= seconds
+
+
+def skip_stage(stage, reason="deadline"):
+    """Record that an optional stage was left out of the current request"""
+    skipped = _skipped.get()
+    if skipped is not None and stage not in skipped:
+        skipped.append(stage)
+    inc("stages_skipped_total", stage=stage, reason=reason)
+    logging.info(f"Skipping stage '{stage}' ({reason}; {remaining() or 0:.1f}s left)")
+
+
+def skipped_stages():
+    return list(_skipped.get() or [])
+
+
+def call_with_deadline(fn, *args, stage=None, reserve=0.0, hold=None):
+    """
+    Call fn(*args), giving up `reserve` seconds before the deadline with DeadlineExceeded.
+    Without a deadline it is a plain call. The deadline and skipped stages follow fn
+    into the worker thread.
+
+    hold is a context manager for what the call occupies (an admission slot, a pinned
+    corpus generation). It is entered here and exited when fn really finishes, so a
+    call the caller gave up on keeps holding it until it returns.
+    """
+    global _abandoned
+    hold = hold or nullcontext()
+    hold.__enter__()
+    left = remaining()
+    if left is None:
+        with _exit_after(hold):
+            return fn(*args)
+    budget = left - reserve
+    if budget <= 0 or _abandoned >= MAX_ABANDONED_CALLS:
+        hold.__exit__(None, None, None)
+        reason = "no time left" if budget <= 0 else f"{_abandoned} abandoned calls still running"
+        inc("deadline_exceeded_total", stage=stage or "call")
+        raise DeadlineExceeded(f"{stage or 'call'} not started: {reason}", stage)
+
+    state = {"done": False, "abandoned": False}
+
+    def finished(future):
+        global _abandoned
+        with _abandoned_lock:
+            state["done"] = True
+            if state["abandoned"]:
+                _abandoned -= 1
+                set_gauge("deadline_abandoned_calls", _abandoned)
+        error = None if future.cancelled() else future.exception()
+        hold.__exit__(type(error) if error else None, error, error.__traceback__ if error else None)
+
+    future = _executor.submit(contextvars.copy_context().run, fn, *args)
+    future.add_done_callback(finished)
+    try:
+        return future.result(timeout=budget)
+    except FutureTimeout:
+        with _abandoned_lock:
+            if not state["done"]:
+                state["abandoned"] = True
+                _abandoned += 1
+                set_gauge("deadline_abandoned_calls", _abandoned)
+        inc("deadline_exceeded_total", stage=stage or "call")
+        raise DeadlineExceeded(f"{stage or 'call'} did not finish in {budget:.1f}s", stage) from None
+
+
+@contextmanager
+def _exit_after(hold):
+    try:
+        yield
+    except BaseException as e:
+        if not hold.__exit__(type(e), e, e.__traceback__):
+            raise
+    else:
+        hold.__exit__(None, None, None)
+
+
+@contextmanager
+def mongo_timeout(floor=MONGO_MIN_TIMEOUT_SECONDS):
+    """pymongo.timeout() for what is left of the deadline, never less than floor"""
+    left = remaining()
+    if left is None or pymongo is None or not hasattr(pymongo, "timeout"):
+        yield
+        return
+    with pymongo.timeout(max(left, floor)):
+        yield
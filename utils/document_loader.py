@@ -1,28 +1,33 @@
+import os
+import glob
 from langchain_core.documents import Document
 from langchain_community.document_loaders import PyPDFLoader
 
+# PDFs that make up the RAG corpus, in load order
+CORPUS_FILES = [
+    "data/faqs.pdf",        # FAQs
+    "data/jobsForHer.pdf",  # JobsForHer Foundation
+    "data/news.pdf",        # tech news
+    "data/tech_event.pdf",  # events
+    "data/job1.pdf",        # job listings
+]
+# Other PDFs dropped into the corpus directory are picked up too (see corpus_files)
+CORPUS_DIR = os.getenv("CORPUS_DIR", "data")
+CORPUS_EXCLUDE = {"data/job.pdf"}  # never part of the corpus; stays out
+
+def corpus_files():
+    """CORPUS_FILES, then any other PDF in CORPUS_DIR in name order"""
+    extra = sorted(
+        path for path in glob.glob(os.path.join(CORPUS_DIR, "*.pdf"))
+        if path not in CORPUS_FILES and path not in CORPUS_EXCLUDE
+    )
+    return [path for path in CORPUS_FILES if os.path.exists(path)] + extra
+
 def load_documents_from_pdf():
     """Load documents from PDF files only"""
     docs = []
 
-    # Load job listings PDF
-    faqs_pdf_loader = PyPDFLoader("data/faqs.pdf")
-    docs.extend(faqs_pdf_loader.load())
-
-    # Load events PDF
-    jobsforher_pdf_loader = PyPDFLoader("data/jobsForHer.pdf")  # Add your event PDF
-    docs.extend(jobsforher_pdf_loader.load())
-
-    # Load tech news PDF
-    tech_pdf_loader = PyPDFLoader("data/news.pdf")
-    docs.extend(tech_pdf_loader.load())
-
-    events_pdf_loader = PyPDFLoader("data/tech_event.pdf")
-    docs.extend(events_pdf_loader.load())
-
-    job_pdf_loader = PyPDFLoader("data/job1.pdf")
-    docs.extend(job_pdf_loader.load())
-
-
+    for path in corpus_files():
+        docs.extend(PyPDFLoader(path).load())
 
-    return docs
\ No newline at end of file
+    return docs
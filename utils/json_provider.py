@@ -0,0 +1,58 @@
+import os
+from flask.json.provider import JSONProvider, DefaultJSONProvider
+from bson import ObjectId
+
+# "orjson" (default) or "default" for Flask's stdlib provider
+JSON_PROVIDER = os.getenv("JSON_PROVIDER", "orjson")
+
+try:
+    import orjson
+except ImportError:  # optional: falls back to Flask's provider
+    orjson = None
+
+
+def _default(obj):
+    """Types orjson doesn't serialize by itself"""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps_bytes(obj):
+    """Serialize to UTF-8 JSON bytes; ObjectId becomes its hex string, datetime ISO 8601"""
+    return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by orjson, with native ObjectId and datetime support"""
+
+    mimetype = "application/json"
+
+    def dumps(self, obj, **kwargs):
+        return dumps_bytes(obj).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj), mimetype=self.mimetype)
+
+
+class BsonAwareJSONProvider(DefaultJSONProvider):
+    """Flask's stdlib provider, taught to serialize ObjectId"""
+
+    @staticmethod
+    def default(obj):
+        if isinstance(obj, ObjectId):
+            return str(obj)
+        return DefaultJSONProvider.default(obj)
+
+
+def init_app(app):
+    if JSON_PROVIDER == "orjson" and orjson is not None:
+        app.json = OrjsonProvider(app)
+    else:
+        app.json = BsonAwareJSONProvider(app)
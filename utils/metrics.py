@@ -0,0 +1,348 @@
+import os
+import glob
+import json
+import time
+import logging
+import threading
+from bisect import bisect_left
+from functools import wraps
+
+# Set METRICS_MULTIPROC_DIR to a directory shared by all gunicorn workers so that
+# /metrics on any worker reports the sum over every worker. gunicorn.conf.py calls
+# mark_process_dead when a worker exits.
+METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR") or os.getenv("PROMETHEUS_MULTIPROC_DIR")
+METRICS_PREFIX = "asha_"
+SNAPSHOT_INTERVAL_SECONDS = 5.0
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+HELP = {
+    "stage_seconds": "Time spent in each request stage",
+    "route_seconds": "Time spent serving each route",
+    "llm_seconds": "Time spent in LLM calls by purpose",
+    "rag_seconds": "Time spent in RAG chains by profile",
+    "errors_total": "Errors by stage",
+    "cache_hits_total": "Cache hits by cache",
+    "cache_misses_total": "Cache misses by cache",
+    "llm_tokens_total": "LLM tokens by purpose and direction",
+    "llm_replay_misses_total": "LLM calls with no recorded response in replay mode by purpose",
+    "context_tokens_total": "Estimated context tokens sent to the QA prompt by profile",
+    "context_tokens_saved_total": "Estimated context tokens saved by packing vs plain top-k",
+    "context_chunks_dropped_total": "Retrieved chunks dropped before the QA prompt by reason",
+    "context_threshold_fallback_total": "Retrievals where every chunk was below min_score and the best one was kept anyway",
+    "admission_in_flight": "LLM calls holding a concurrency slot by purpose",
+    "admission_queue_depth": "LLM calls waiting for a concurrency slot by purpose",
+    "admission_shed_total": "LLM calls shed before reaching the provider by purpose and reason",
+    "rate_limited_total": "Requests refused by the per-client rate limit by endpoint",
+    "response_bytes_total": "Bytes of compressed responses before (raw) and after (wire) compression",
+    "single_flight_total": "Coalesced calls by flight and role (leader computes, followers share)",
+    "qa_variant_total": "QA answers by routed prompt variant",
+    "qa_variant_seconds": "Time spent generating answers by prompt variant",
+    "qa_variant_tokens_total": "LLM tokens of QA answers by prompt variant and direction",
+    "embed_chunks_total": "Corpus chunks embedded during index builds",
+    "embed_batch_seconds": "Time per embedding batch request",
+    "embed_retries_total": "Embedding batches retried by reason (rate_limit or transient)",
+    "corpus_swaps_total": "RAG corpus generations swapped in after the PDFs changed",
+    "corpus_build_seconds": "Time to build (or open) a new RAG corpus generation and warm its chains",
+    "conversations_archived_total": "Cold conversations moved into compressed archive batches",
+    "conversations_rehydrated_total": "Archived conversations restored on access",
+    "archive_bytes_total": "Bytes of archived conversations before (raw) and after (stored) compression",
+    "search_indexed_messages_total": "Messages added to the conversation search index",
+    "search_queries_total": "Conversation searches by whether anything matched",
+    "jobs_indexed_total": "Jobs added to the skill index from live feeds",
+    "users_imported_total": "Users created by bulk imports by source",
+    "job_recommendations_total": "Skill-matched job recommendations served, by whether any job matched",
+    "empowerment_pool_total": "Empowering messages served by topic and outcome (pool or live generation)",
+    "empowerment_pool_size": "Unretired pre-generated empowering messages by topic",
+    "bias_jobs_total": "Deferred Gemini bias analyses by outcome (queued, done, failed, dropped) and drop reason",
+    "bias_queue_depth": "Bias analyses waiting for a worker",
+    "bias_queue_wait_seconds": "Time bias analyses waited in the queue",
+    "stages_skipped_total": "Request stages left out to stay inside the deadline, by stage and reason",
+    "deadline_exceeded_total": "Calls abandoned when the request deadline passed, by stage",
+    "deadline_abandoned_calls": "Abandoned calls still running in the background",
+    "degraded_answers_total": "RAG answers built from retrieved chunks after generation ran out of time",
+}
+
+# Label tuples are the dict keys; values are mutated in place without a lock.
+# A lost increment under a rare race is an acceptable trade for cheap spans.
+_histograms = {}   # (name, labels) -> [bucket counts..., +Inf count, sum]
+_counters = {}     # (name, labels) -> float
+_gauges = {}       # (name, labels) -> float
+_last_snapshot = 0.0
+_snapshot_thread_pid = None
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items())) if labels else ()
+
+
+def observe(name, value, **labels):
+    """Record one observation in a histogram"""
+    _observe(_key(name, labels), value)
+
+
+def _observe(key, value):
+    hist = _histograms.get(key)
+    if hist is None:
+        hist = _histograms.setdefault(key, [0] * (len(BUCKETS) + 1) + [0.0])
+    hist[bisect_left(BUCKETS, value)] += 1
+    hist[-1] += value
+
+
+def inc(name, amount=1, **labels):
+    """Increase a counter"""
+    key = _key(name, labels)
+    _counters[key] = _counters.get(key, 0) + amount
+
+
+def set_gauge(name, value, **labels):
+    """Set a gauge to the current value"""
+    _gauges[_key(name, labels)] = value
+
+
+class span:
+    """Context manager timing a block into a histogram (default: stage_seconds{stage=...})"""
+
+    __slots__ = ("key", "labels", "start")
+
+    def __init__(self, stage=None, metric="stage_seconds", **labels):
+        if stage is not None:
+            labels["stage"] = stage
+        self.key = _key(metric, labels)
+        self.labels = labels
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _observe(self.key, time.perf_counter() - self.start)
+        if exc_type is not None:
+            inc("errors_total", stage=self.labels.get("stage") or self.labels.get("purpose") or self.key[0])
+        return False
+
+
+def llm_span(purpose):
+    """Time an LLM call for the given purpose"""
+    return span(metric="llm_seconds", purpose=purpose)
+
+
+def timed(stage=None, metric="stage_seconds", **labels):
+    """Decorator version of span(); the stage defaults to the function name"""
+    def decorator(fn):
+        stage_name = stage or fn.__name__
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage_name, metric=metric, **labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_llm_usage(purpose, response, metric="llm_tokens_total", **labels):
+    """Count tokens from a LangChain AIMessage's usage metadata, when present"""
+    usage = getattr(response, "usage_metadata", None) or {}
+    if usage.get("input_tokens"):
+        inc(metric, usage["input_tokens"], purpose=purpose, kind="input", **labels)
+    if usage.get("output_tokens"):
+        inc(metric, usage["output_tokens"], purpose=purpose, kind="output", **labels)
+
+
+def _snapshot():
+    return {
+        "histograms": [[name, list(labels), list(values)] for (name, labels), values in list(_histograms.items())],
+        "counters": [[name, list(labels), value] for (name, labels), value in list(_counters.items())],
+        "gauges": [[name, list(labels), value] for (name, labels), value in list(_gauges.items())],
+    }
+
+
+def write_snapshot(force=False):
+    """Write this process' metrics to the multiprocess directory (rate limited)"""
+    global _last_snapshot
+    if not METRICS_MULTIPROC_DIR:
+        return
+    _start_snapshot_thread()
+    now = time.time()
+    if not force and now - _last_snapshot < SNAPSHOT_INTERVAL_SECONDS:
+        return
+    _last_snapshot = now
+    path = os.path.join(METRICS_MULTIPROC_DIR, f"metrics_{os.getpid()}.json")
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"   # request threads and the snapshot thread both write
+    try:
+        os.makedirs(METRICS_MULTIPROC_DIR, exist_ok=True)
+        with open(tmp_path, "w") as f:
+            json.dump(_snapshot(), f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logging.warning(f"Could not write metrics snapshot: {str(e)}")
+
+
+def _start_snapshot_thread():
+    """
+    One snapshot thread per worker process (threads don't survive gunicorn's fork), so
+    metrics from background threads stay current while the worker serves no requests
+    """
+    global _snapshot_thread_pid
+    if _snapshot_thread_pid == os.getpid():
+        return
+    _snapshot_thread_pid = os.getpid()
+    threading.Thread(target=_snapshot_loop, name="metrics-snapshot", daemon=True).start()
+
+
+def _snapshot_loop():
+    while True:
+        time.sleep(SNAPSHOT_INTERVAL_SECONDS)
+        write_snapshot(force=True)
+
+
+def _read_snapshot(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _snapshot_pid(path):
+    """Worker pid of a metrics_<pid>.json file, None for the archive of exited workers"""
+    try:
+        return int(os.path.basename(path)[len("metrics_"):-len(".json")])
+    except ValueError:
+        return None
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass   # alive, just owned by another user
+    return True
+
+
+def _merge(snapshots):
+    histograms, counters, gauges = {}, {}, {}
+    for snap in snapshots:
+        for name, labels, values in snap["histograms"]:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            merged = histograms.setdefault(key, [0] * len(values))
+            for i, value in enumerate(values):
+                merged[i] += value
+        for target, kind in ((counters, "counters"), (gauges, "gauges")):
+            for name, labels, value in snap.get(kind, []):
+                key = (name, tuple(tuple(pair) for pair in labels))
+                target[key] = target.get(key, 0) + value
+    return histograms, counters, gauges
+
+
+def mark_process_dead(pid):
+    """
+    Fold an exited worker's counters and histograms into metrics_archived.json and
+    delete its snapshot, so its gauges stop counting. Call from gunicorn's child_exit.
+    """
+    if not METRICS_MULTIPROC_DIR:
+        return
+    path = os.path.join(METRICS_MULTIPROC_DIR, f"metrics_{pid}.json")
+    dead = _read_snapshot(path)
+    if dead is not None:
+        archive_path = os.path.join(METRICS_MULTIPROC_DIR, "metrics_archived.json")
+        archived = _read_snapshot(archive_path) or {"histograms": [], "counters": []}
+        histograms, counters, _ = _merge([archived, dict(dead, gauges=[])])
+        try:
+            with open(archive_path + ".tmp", "w") as f:
+                json.dump({
+                    "histograms": [[name, list(labels), values] for (name, labels), values in histograms.items()],
+                    "counters": [[name, list(labels), value] for (name, labels), value in counters.items()],
+                }, f)
+            os.replace(archive_path + ".tmp", archive_path)
+        except OSError as e:
+            logging.warning(f"Could not archive metrics of worker {pid}: {str(e)}")
+            return
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _collect():
+    """
+    Merge this process' live metrics with snapshots from other workers. Gauges only
+    count from workers that are still alive; counters of exited ones are kept.
+    """
+    snapshots = [_snapshot()]
+    if METRICS_MULTIPROC_DIR:
+        own = f"metrics_{os.getpid()}.json"
+        for path in glob.glob(os.path.join(METRICS_MULTIPROC_DIR, "metrics_*.json")):
+            if os.path.basename(path) == own:
+                continue
+            snap = _read_snapshot(path)
+            if snap is None:
+                continue
+            pid = _snapshot_pid(path)
+            if pid is not None and not _pid_alive(pid):
+                snap["gauges"] = []
+            snapshots.append(snap)
+    return _merge(snapshots)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels, extra=None):
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    body = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+    return "{" + body + "}"
+
+
+def render_prometheus():
+    """Render all metrics in the Prometheus text exposition format"""
+    histograms, counters, gauges = _collect()
+    lines = []
+    typed = set()
+
+    def header(name, kind):
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# HELP {METRICS_PREFIX}{name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {METRICS_PREFIX}{name} {kind}")
+
+    for (name, labels), values in sorted(histograms.items()):
+        header(name, "histogram")
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ("+Inf",), values[:-1]):
+            cumulative += count
+            lines.append(f"{METRICS_PREFIX}{name}_bucket{_format_labels(labels, ('le', bound))} {cumulative}")
+        lines.append(f"{METRICS_PREFIX}{name}_sum{_format_labels(labels)} {values[-1]}")
+        lines.append(f"{METRICS_PREFIX}{name}_count{_format_labels(labels)} {cumulative}")
+
+    for kind, series in (("counter", counters), ("gauge", gauges)):
+        for (name, labels), value in sorted(series.items()):
+            header(name, kind)
+            lines.append(f"{METRICS_PREFIX}{name}{_format_labels(labels)} {value}")
+
+    return "\n".join(lines) + "\n"
+
+
+def init_app(app):
+    """Time every request by route and flush snapshots for multiprocess mode"""
+    from flask import request, g
+
+    @app.before_request
+    def _start_route_timer():
+        g._metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _stop_route_timer(response):
+        start = g.pop("_metrics_start", None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            observe("route_seconds", time.perf_counter() - start, route=route, method=request.method)
+            if response.status_code >= 500:
+                inc("errors_total", stage="route", route=route)
+        write_snapshot()
+        return response
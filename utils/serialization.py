@@ -1,6 +1,3 @@
-from langchain_core.messages import AIMessage, HumanMessage
-
-
 def serialize_messages(messages):
     """Serialize messages to store in MongoDB"""
     serialized = []
@@ -14,6 +11,7 @@ def serialize_messages(messages):
 
 def deserialize_messages(messages):
     """Deserialize messages from MongoDB format to LangChain format"""
+    from langchain_core.messages import AIMessage, HumanMessage
     deserialized = []
     for msg in messages:
         if msg['type'] == 'human':
@@ -0,0 +1,174 @@
+import os
+import json
+import time
+import fcntl
+import hashlib
+import logging
+import threading
+from utils.deadline import remaining
+from utils.admission import LoadShed
+from utils.metrics import inc
+
+# Set SINGLE_FLIGHT_DIR to a directory shared by the gunicorn workers (local disk)
+# to also coalesce across workers; without it calls are coalesced per process.
+SINGLE_FLIGHT_DIR = os.getenv("SINGLE_FLIGHT_DIR")
+LOCK_POLL_SECONDS = 0.02
+RESULT_RETENTION_SECONDS = 60
+_MISSING = object()
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Run fn once per key among concurrent callers; the others wait and share its result.
+    do() returns (result, shared) where shared is True when another caller computed it.
+    """
+
+    def __init__(self, name, shared_dir=SINGLE_FLIGHT_DIR):
+        self.name = name
+        self.shared_dir = os.path.join(shared_dir, name) if shared_dir else None
+        self.calls = {}
+        self.lock = threading.Lock()
+        self.last_sweep = 0.0
+
+    def do(self, key, fn):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _Call()
+
+        if not leader:
+            inc("single_flight_total", flight=self.name, role="follower")
+            if not call.done.wait(remaining()):
+                raise LoadShed("Deadline passed waiting for an identical request", reason="deadline")
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result, shared = self._lead(key, fn)
+            return call.result, shared
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                self.calls.pop(key, None)
+            call.done.set()
+
+    def _lead(self, key, fn):
+        if not self.shared_dir:
+            inc("single_flight_total", flight=self.name, role="leader")
+            return fn(), False
+
+        os.makedirs(self.shared_dir, exist_ok=True)
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        result_path = os.path.join(self.shared_dir, f"{digest}.json")
+        started = time.time()
+
+        lock_path = os.path.join(self.shared_dir, f"{digest}.lock")
+        lock_file, waited = self._acquire(lock_path)
+        if lock_file is None:
+            raise LoadShed("Deadline passed waiting for an identical request", reason="deadline")
+        try:
+            if waited:
+                # Another worker ran this call while we waited: take its result
+                result = self._read_result(result_path, started)
+                if result is not _MISSING:
+                    inc("single_flight_total", flight=self.name, role="remote_follower")
+                    return result, True
+            # We hold the lock (first in, or the other worker failed): compute it here
+            inc("single_flight_total", flight=self.name, role="leader")
+            result = fn()
+            self._write_result(result_path, result)
+            return result, False
+        finally:
+            # Unlinked while still locked, so no lock files pile up; _acquire makes
+            # whoever locked the old file meanwhile retry on the new one
+            try:
+                os.remove(lock_path)
+            except OSError:
+                pass
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+
+    def _acquire(self, lock_path):
+        """
+        Lock lock_path. Returns (open locked file, whether we had to wait), or
+        (None, True) when the deadline passes first.
+        """
+        waited = False
+        while True:
+            lock_file = open(lock_path, "a")
+            if not self._try_lock(lock_file):
+                waited = True
+                if not self._wait_for_lock(lock_file):
+                    lock_file.close()
+                    return None, True
+            try:
+                current = os.stat(lock_path)
+            except FileNotFoundError:
+                current = None
+            opened = os.fstat(lock_file.fileno())
+            if current and (current.st_dev, current.st_ino) == (opened.st_dev, opened.st_ino):
+                return lock_file, waited
+            # The previous holder removed this file after we opened it
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+
+    def _try_lock(self, lock_file):
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+
+    def _wait_for_lock(self, lock_file):
+        while not self._try_lock(lock_file):
+            left = remaining()
+            if left is not None and left <= 0:
+                return False
+            time.sleep(LOCK_POLL_SECONDS)
+        return True
+
+    def _read_result(self, path, started):
+        """The result written by the worker we waited on, if it finished after we arrived"""
+        try:
+            if os.path.getmtime(path) < started:
+                return _MISSING
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return _MISSING
+
+    def _write_result(self, path, result):
+        try:
+            with open(path + ".tmp", "w") as f:
+                json.dump(result, f)
+            os.replace(path + ".tmp", path)
+        except (OSError, TypeError, ValueError) as e:
+            logging.warning(f"Could not share single-flight result for '{self.name}': {str(e)}")
+        self._sweep()
+
+    def _sweep(self):
+        now = time.time()
+        if now - self.last_sweep < RESULT_RETENTION_SECONDS:
+            return
+        self.last_sweep = now
+        for entry in os.listdir(self.shared_dir):
+            path = os.path.join(self.shared_dir, entry)
+            try:
+                # .lock files only outlive their call when a worker died holding one
+                if entry.endswith((".json", ".lock")) and now - os.path.getmtime(path) > RESULT_RETENTION_SECONDS:
+                    os.remove(path)
+            except OSError:
+                continue